@@ -3,35 +3,111 @@ import streamlit as st  # Moved to top as st.set_page_config must be the first S
 # ✅ Streamlit Page Config (must come before any other Streamlit command)
 st.set_page_config(page_title="JobMatchAI", layout="wide")
 
-import firebase_admin
-from firebase_admin import credentials, firestore
-import pdfplumber
-import logging
-import warnings
-import ollama
 import os
-import json
-import pandas as pd
-import numpy as np
 import datetime
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from collections import Counter
 from dotenv import load_dotenv
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from flask_cors import CORS
-from flask import Flask
-from firebase_config import auth
+from bulk_upload import BulkMatcher, iter_upload_files
+from cv_index import CVIndex
+from cv_ingest import parse_bytes
+from dedup import DEFAULT_THRESHOLD, DedupIndex
+from extraction_cache import ExtractionCache
+from firestore_writer import BatchWriter
+from matching import JDMatcher
+import metrics
+from outbox import Dispatcher, Outbox, SendGridTransport, invite_key
+from skills import from_bitset, skill_names
+import stats
 
 # Load environment variables
 load_dotenv()
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 
-# Initialize Firebase
-if not firebase_admin._apps:
-    cred = credentials.Certificate("firebase_credentials.json")
-    firebase_admin.initialize_app(cred)
-db_firestore = firestore.client()
+JD_SUMMARIES_FILE = "data/jd_summaries.json"
+MATCH_SCORER = os.getenv("MATCH_SCORER", "tfidf")  # tfidf, embedding or hybrid
+DEDUP_MODE = os.getenv("DEDUP_MODE", "flag")  # flag, merge or off
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", DEFAULT_THRESHOLD))
+
+
+# ✅ Process-wide clients and data, shared across reruns and sessions; each is created on first use
+@st.cache_resource
+def get_firestore():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        cred = credentials.Certificate("firebase_credentials.json")
+        firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+
+def server_timestamp():
+    from firebase_admin import firestore
+    return firestore.SERVER_TIMESTAMP
+
+
+@st.cache_resource
+def get_auth():
+    from firebase_config import get_auth
+    return get_auth()
+
+
+@st.cache_resource
+def get_outbox():
+    """Invite queue plus the background thread that sends it through SendGrid."""
+    outbox = Outbox()
+    Dispatcher(outbox, SendGridTransport(SENDGRID_API_KEY)).start()
+    return outbox
+
+
+@st.cache_resource
+def get_extraction_cache():
+    return ExtractionCache()
+
+
+@st.cache_resource
+def get_cv_index():
+    return CVIndex()
+
+
+@st.cache_resource
+def get_dedup_index():
+    return DedupIndex(threshold=DEDUP_THRESHOLD)
+
+
+@st.cache_resource(max_entries=2)
+def load_jd_matcher(path, mtime):
+    # mtime is only part of the cache key: editing the file refits the matcher
+    if MATCH_SCORER == "tfidf":
+        return JDMatcher.from_file(path)
+    from embeddings import SCORERS, Embedder
+    return JDMatcher.from_file(path, embedder=Embedder(), alpha=SCORERS[MATCH_SCORER])
+
+
+def get_jd_matcher():
+    return load_jd_matcher(JD_SUMMARIES_FILE, os.path.getmtime(JD_SUMMARIES_FILE))
+
+
+@st.cache_resource
+def get_bulk_matcher():
+    # Background parse pool and job registry, shared by every session
+    workers = int(os.getenv("BULK_WORKERS", "0")) or None
+    return BulkMatcher(cv_index=get_cv_index(), cache=get_extraction_cache(), workers=workers,
+                       dedup=get_dedup_index(), dedup_mode=DEDUP_MODE)
+
+
+@st.cache_resource
+def start_metrics_server(port):
+    # One /metrics endpoint per server process, not per rerun
+    return metrics.start_http_server(port)
+
+
+if os.getenv("METRICS_PORT"):
+    start_metrics_server(int(os.getenv("METRICS_PORT")))
+
+
+extraction_cache = get_extraction_cache()
+cv_index = get_cv_index()
 
 # Title after page config
 st.title("🚀 AI-Powered Job Screening Platform")
@@ -64,7 +140,7 @@ else:
             st.sidebar.warning("Please enter both email and password.")
         else:
             try:
-                user = auth.sign_in_with_email_and_password(email, password)
+                user = get_auth().sign_in_with_email_and_password(email, password)
                 st.session_state.user = user
                 st.success("✅ Login successful!")
                 st.experimental_rerun()
@@ -86,47 +162,57 @@ st.write("This is your job screening and AI matching platform.")
 
 def parse_cv(file):
     try:
-        pdf = pdfplumber.open(file)
-        text = " ".join([page.extract_text() or "" for page in pdf.pages])
-        pdf.close()
+        text, _ = parse_bytes(file.getvalue(), cache=extraction_cache)
         return text
     except Exception as e:
         st.error(f"Error parsing PDF: {e}")
         return None
 
-def match_candidate(jd_summary, cv_text):
+def match_jobs(matcher, cv_text):
     try:
-        vectorizer = TfidfVectorizer(stop_words='english')
-        tfidf_matrix = vectorizer.fit_transform([jd_summary, cv_text])
-        score = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0] * 100
-        return round(score, 2)
+        return matcher.ranked(cv_text)
     except Exception as e:
-        st.error(f"Error matching CV with JD: {e}")
-        return 0.0
+        st.error(f"Error matching CV with JDs: {e}")
+        return [(jd_id, 0.0) for jd_id in matcher.jd_ids]
 
-def save_candidate(name, email, cv_text):
+def save_candidate(name, email, cv_text, duplicate=None):
     try:
-        doc_ref = db_firestore.collection("candidates").document(email)
-        doc_ref.set({
+        doc_ref = get_firestore().collection("candidates").document(email)
+        is_new = not doc_ref.get().exists
+        candidate = {
             "name": name,
             "email": email,
             "cv_text": cv_text,
-            "upload_date": firestore.SERVER_TIMESTAMP
-        })
+            "upload_date": server_timestamp()
+        }
+        if duplicate is not None:
+            candidate["duplicate_of"] = duplicate.original
+        with BatchWriter(get_firestore()) as writer:
+            writer.set("candidates", email, candidate)
+            if is_new:
+                stats.record_counts(writer, candidates=1)
         return True
     except Exception as e:
         st.error(f"Error saving candidate to Firebase: {e}")
         return False
 
-def save_matches(email, matches):
+def forget_upload(email):
+    # A CV that failed to save must not count as already saved when it is uploaded again
+    if DEDUP_MODE != "off":
+        get_dedup_index().remove(email)
+
+def save_matches(email, matches, skill_coverage):
     try:
-        for jd_id, score in matches:
-            db_firestore.collection("matches").add({
-                "candidate_email": email,
-                "jd_id": jd_id,
-                "score": score,
-                "match_date": firestore.SERVER_TIMESTAMP
-            })
+        with BatchWriter(get_firestore()) as writer:
+            for jd_id, score in matches:
+                writer.add("matches", {
+                    "candidate_email": email,
+                    "jd_id": jd_id,
+                    "score": score,
+                    "skill_coverage": skill_coverage[jd_id],
+                    "match_date": server_timestamp()
+                })
+            stats.record_matches(writer, matches)
         return True
     except Exception as e:
         st.error(f"Error saving matches to Firebase: {e}")
@@ -134,58 +220,101 @@ def save_matches(email, matches):
 
 def save_interview(email, jd_id, date, time, notes):
     try:
-        db_firestore.collection("interviews").add({
-            "candidate_email": email,
-            "jd_id": jd_id,
-            "scheduled_date": date.isoformat(),
-            "scheduled_time": time.strftime("%H:%M"),
-            "notes": notes,
-            "created_at": firestore.SERVER_TIMESTAMP
-        })
+        with BatchWriter(get_firestore()) as writer:
+            writer.add("interviews", {
+                "candidate_email": email,
+                "jd_id": jd_id,
+                "scheduled_date": date.isoformat(),
+                "scheduled_time": time.strftime("%H:%M"),
+                "notes": notes,
+                "created_at": server_timestamp()
+            })
+            stats.record_counts(writer, interviews=1)
         return True
     except Exception as e:
         st.error(f"Error saving interview to Firebase: {e}")
         return False
 
-def send_interview_invite(email, name, jd_title, date, time, notes):
-    try:
-        sg = SendGridAPIClient(SENDGRID_API_KEY)
-        from_email = os.getenv("EMAIL_USER")
-        subject = f"Interview Invitation: {jd_title} Position"
-        
-        body = f"""
-        <p>Dear {name},</p>
-        <p>We are pleased to inform you that you have been shortlisted for an interview for the position of <b>{jd_title}</b> at JobMatchAI.</p>
-        <p><b>Date:</b> {date.strftime('%A, %B %d, %Y')}<br>
-        <b>Time:</b> {time.strftime('%I:%M %p')}<br>
-        <b>Notes:</b> {notes}</p>
-        <p>Best regards,<br>JobMatchAI Team</p>
-        """
-
-        message = Mail(from_email=from_email, to_emails=email, subject=subject, html_content=body)
-        sg.send(message)
-        return True
-    except Exception as e:
-        st.warning(f"SendGrid Email failed: {e}")
-        return False
+def send_interview_invite(email, name, jd_id, jd_title, date, time, notes):
+    """Queue the invite; returns False if this candidate was already invited for the job."""
+    subject = f"Interview Invitation: {jd_title} Position"
+    body = f"""
+    <p>Dear {name},</p>
+    <p>We are pleased to inform you that you have been shortlisted for an interview for the position of <b>{jd_title}</b> at JobMatchAI.</p>
+    <p><b>Date:</b> {date.strftime('%A, %B %d, %Y')}<br>
+    <b>Time:</b> {time.strftime('%I:%M %p')}<br>
+    <b>Notes:</b> {notes}</p>
+    <p>Best regards,<br>JobMatchAI Team</p>
+    """
+    return get_outbox().enqueue(invite_key(email, jd_id), body, recipient=email,
+                                subject=subject, content_type="text/html")
 
 def get_stats():
     try:
-        candidates = [doc.to_dict() for doc in db_firestore.collection("candidates").stream()]
-        matches = [doc.to_dict() for doc in db_firestore.collection("matches").stream()]
-        interviews = [doc.to_dict() for doc in db_firestore.collection("interviews").stream()]
-        avg_score = np.mean([m['score'] for m in matches]) if matches else 0
-        return len(candidates), len(matches), avg_score, len(interviews)
+        return stats.get_stats(get_firestore())
     except Exception as e:
         st.error(f"Error fetching stats: {e}")
         return 0, 0, 0, 0
 
+# Dashboard statistics
+total_candidates, total_matches, avg_score, total_interviews = get_stats()
+stat_cols = st.columns(4)
+stat_cols[0].metric("Candidates", total_candidates)
+stat_cols[1].metric("Matches", total_matches)
+stat_cols[2].metric("Average Score", f"{avg_score:.2f}%")
+stat_cols[3].metric("Interviews", total_interviews)
+
 # Navigation
 st.sidebar.title("Navigation")
-section = st.sidebar.radio("Go to", ["Upload & Match", "Schedule Interview"])
+section = st.sidebar.radio("Go to", ["Upload & Match", "Find Candidates", "Schedule Interview"])
 
 # Upload & Match
-if section == "Upload & Match":
+if section == "Upload & Match" and st.radio("Upload", ["Single CV", "Bulk (many PDFs or a zip)"],
+                                            horizontal=True) == "Bulk (many PDFs or a zip)":
+    st.header("📦 Bulk Upload CVs")
+    uploads = st.file_uploader("📎 Upload PDF CVs or zip archives", type=["pdf", "zip"], accept_multiple_files=True)
+
+    if st.button("🚀 Match All") and uploads:
+        try:
+            matcher = get_jd_matcher()
+        except Exception as e:
+            st.error(f"Could not load JD summaries: {e}")
+            st.stop()
+        try:
+            files = [item for upload in uploads for item in iter_upload_files(upload.name, upload.getvalue())]
+        except Exception as e:
+            st.error(f"Could not read upload: {e}")
+            st.stop()
+        st.session_state.bulk_job = get_bulk_matcher().submit(files, matcher, get_firestore()).id
+
+    job = get_bulk_matcher().job(st.session_state.get("bulk_job"))
+    if job is not None:
+        st.progress(job.progress, text=f"{job.parsed + job.failed} of {job.total} CVs processed "
+                                       f"({job.saved} saved, {job.failed} failed)")
+        if not job.done:
+            # Poll: the work happens in the background, this only refreshes the page
+            job.wait(timeout=1.0)
+            st.experimental_rerun()
+        if job.status == "done":
+            st.success(f"🎯 Bulk matching complete: {job.saved} candidates saved.")
+        else:
+            st.error("❌ Bulk matching stopped early.")
+        if job.results:
+            st.dataframe([{
+                "File": r["file"],
+                "Candidate": r["candidate"],
+                **{f"Match {rank}": f"{title} ({score:.2f}%, skills {cov:.0f}%)"
+                   for rank, (_, title, score, cov) in enumerate(r["matches"], 1)}
+            } for r in job.results], use_container_width=True)
+        if job.duplicates:
+            actions = Counter(d["action"] for d in job.duplicates)
+            st.info(f"🧬 {actions['flagged']} near-duplicate CV(s) saved and flagged, {actions['skipped']} skipped; "
+                    f"{actions['unchanged']} already-saved CV(s) not saved again.")
+            st.dataframe(job.duplicates, use_container_width=True)
+        for error in job.errors[:50]:
+            st.warning(error)
+
+elif section == "Upload & Match":
     st.header("📄 Upload Candidate CV")
     name = st.text_input("👤 Candidate Name")
     email = st.text_input("📧 Email Address")
@@ -200,27 +329,74 @@ if section == "Upload & Match":
         if not cv_text:
             st.stop()
 
-        if save_candidate(name, email, cv_text):
+        duplicate = None
+        if DEDUP_MODE != "off":
+            duplicate = get_dedup_index().check(email, cv_text, "upload", resubmissions=True)
+        unchanged = duplicate is not None and duplicate.original == email
+        if unchanged:
+            st.info("📄 This CV is already saved for this email; showing its matches without saving it again.")
+        elif duplicate is not None:
+            st.warning(f"🧬 This CV is a near-duplicate of {duplicate.original}'s "
+                       f"({duplicate.similarity:.0%} similar).")
+            if DEDUP_MODE == "merge":
+                st.info("Not saved again; the earlier candidate's matches still apply.")
+                st.stop()
+
+        if unchanged or save_candidate(name, email, cv_text, duplicate):
+            if not unchanged:
+                cv_index.add_documents([(email, cv_text)])
             try:
-                with open("data/jd_summaries.json") as f:
-                    jds = json.load(f)
+                matcher = get_jd_matcher()
             except Exception as e:
+                if not unchanged:
+                    forget_upload(email)
                 st.error(f"Could not load JD summaries: {e}")
                 st.stop()
 
-            results = [(jd_id, match_candidate(jd.get("summary", ""), cv_text)) for jd_id, jd in jds.items()]
-            results.sort(key=lambda x: x[1], reverse=True)
+            results = match_jobs(matcher, cv_text)
+            skill_coverage = dict(zip(matcher.jd_ids, matcher.coverage([cv_text])[0].round(1).tolist()))
 
-            if save_matches(email, results):
+            if unchanged or save_matches(email, results, skill_coverage):
                 st.success("🎯 Matching Complete! Top 3 Matches:")
                 for jd_id, score in results[:3]:
-                    title = jds[jd_id].get("title", jd_id)
+                    title = matcher.title(jd_id)
                     st.markdown(f"""
                         <div style='background-color:#E75E5B;padding:10px;border-radius:8px;margin-bottom:10px;'>
-                        <b>{title}</b><br>Match Score: {score:.2f}%</div>
+                        <b>{title}</b><br>Match Score: {score:.2f}%<br>Skill Coverage: {skill_coverage[jd_id]:.0f}%</div>
                     """, unsafe_allow_html=True)
             else:
+                forget_upload(email)
                 st.error("❌ Failed to save matches to Firebase.")
+        else:
+            forget_upload(email)
+
+# Find Candidates
+elif section == "Find Candidates":
+    st.header("🔎 Find Candidates for a Job")
+    try:
+        matcher = get_jd_matcher()
+    except Exception as e:
+        st.error(f"Could not load JD summaries: {e}")
+        st.stop()
+
+    jds = matcher.jds
+    jd_id = st.selectbox("Job", matcher.jd_ids, format_func=lambda i: f"{i} - {matcher.title(i)}")
+    jd_hist = stats.get_jd_histograms(get_firestore()).get(jd_id)
+    if jd_hist and jd_hist["count"]:
+        st.caption(f"{jd_hist['count']} scored candidates, average {jd_hist['avg']:.2f}%")
+        st.bar_chart({"candidates": jd_hist["hist"]})
+    top_n = st.slider("Number of candidates", 5, 50, 10)
+    required = matcher.skill_bits[matcher.jd_ids.index(jd_id)]
+    st.caption("Key skills: " + (", ".join(skill_names(from_bitset(required))) or "none recognised"))
+    min_coverage = st.slider("Minimum skill coverage (%)", 0, 100, 0, step=10)
+    if st.button("🔍 Search"):
+        cv_index.reload()  # only reads what other processes appended since the last search
+        results = cv_index.search(jds[jd_id].get("summary", ""), top_n, required=required, min_coverage=min_coverage)
+        if not results:
+            st.info("No matching candidates in the index yet.")
+        coverages = cv_index.coverage([candidate for candidate, _ in results], required)
+        for rank, ((candidate, score), cov) in enumerate(zip(results, coverages), 1):
+            st.markdown(f"**#{rank}** {candidate} — relevance {score:.3f} · skills {cov:.0f}%")
 
 # Schedule Interview
 elif section == "Schedule Interview":
@@ -236,10 +412,13 @@ elif section == "Schedule Interview":
         submit_btn = st.form_submit_button("📨 Send Interview Invite")
         if submit_btn:
             if save_interview(email, jd_id, date, time, notes):
-                success = send_interview_invite(email, email.split("@")[0], jd_title, date, time, notes)
-                if success:
-                    st.success("✅ Interview scheduled and email sent!")
-                else:
-                    st.warning("⚠️ Interview saved, but email failed to send.")
+                try:
+                    queued = send_interview_invite(email, email.split("@")[0], jd_id, jd_title, date, time, notes)
+                    if queued:
+                        st.success("✅ Interview scheduled and email queued!")
+                    else:
+                        st.info("ℹ️ Interview saved; an invite for this job was already sent.")
+                except Exception as e:
+                    st.warning(f"⚠️ Interview saved, but email could not be queued: {e}")
             else:
                 st.error("❌ Failed to save interview details.")
@@ -0,0 +1,455 @@
+import argparse
+import ast
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = ROOT_DIR / "data"
+RESULTS_DIR = ROOT_DIR / "output" / "benchmarks"
+STAGES = ["parse", "summarize", "match", "persist", "startup"]
+
+# Modules behind each entry point; "app" is app.py's imports (the script itself needs a Streamlit server)
+ENTRY_POINTS = ["app", "job_screening", "sharding", "service", "result_store", "outbox", "firebase_config"]
+
+
+# ------------------- 🧪 FIXTURES -------------------
+
+class _StubOllama(BaseHTTPRequestHandler):
+    """Answers /api/chat after ``delay`` seconds, like a model with fixed latency."""
+
+    delay = 0.05
+    fail = None
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.delay)
+        prompt = body["messages"][-1]["content"]
+        if self.fail is not None and self.fail(prompt):
+            self.send_error(500, "stub failure")
+            return
+        out = json.dumps({
+            "model": body["model"],
+            "created_at": "1970-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": "Key skills: " + prompt[-400:]},
+            "done": True
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_ollama(delay, fail=None):
+    """Serve the stub on a free local port; returns its base URL.
+
+    ``fail(prompt)`` is called for every request after the delay; when it
+    returns True the request is answered with a 500.
+    """
+    handler = type("StubOllama", (_StubOllama,), {"delay": delay, "fail": staticmethod(fail) if fail else None})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class FakeFirestore:
+    """In-memory stand-in for the Firestore client surface BatchWriter uses.
+
+    Only write counts and payload sizes are kept, so 100k-CV runs measure
+    the client-side cost of building and committing batches rather than
+    the memory of a fake server. ``commit_latency`` adds a fixed round trip.
+    """
+
+    def __init__(self, commit_latency=0.0):
+        self.commit_latency = commit_latency
+        self.writes = 0
+        self.bytes = 0
+
+    def collection(self, name):
+        return _FakeCollection(name)
+
+    def batch(self):
+        return _FakeBatch(self)
+
+
+class _FakeCollection:
+    _auto_id = 0
+
+    def __init__(self, name):
+        self.name = name
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            _FakeCollection._auto_id += 1
+            doc_id = f"auto{_FakeCollection._auto_id}"
+        return f"{self.name}/{doc_id}"
+
+
+class _FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.ops = []
+
+    def set(self, ref, data, merge=False):
+        self.ops.append((ref, data))
+
+    def delete(self, ref):
+        self.ops.append((ref, None))
+
+    def commit(self):
+        # Serialising the payload stands in for the client encoding it.
+        size = sum(len(json.dumps(data, default=str)) for _, data in self.ops if data is not None)
+        if self.db.commit_latency:
+            time.sleep(self.db.commit_latency)
+        self.db.writes += len(self.ops)
+        self.db.bytes += size
+
+
+class TimedDB:
+    """Wraps a Firestore client so every batch commit is timed."""
+
+    def __init__(self, db):
+        self.db = db
+        self.commit_times = []
+
+    def collection(self, name):
+        return self.db.collection(name)
+
+    def batch(self):
+        batch = self.db.batch()
+        commit = batch.commit
+
+        def timed_commit():
+            start = time.perf_counter()
+            result = commit()
+            self.commit_times.append(time.perf_counter() - start)
+            return result
+        batch.commit = timed_commit
+        return batch
+
+
+def open_firestore(kind, commit_latency):
+    if kind == "emulator":
+        # Needs FIRESTORE_EMULATOR_HOST; the emulator accepts any project id.
+        from google.cloud import firestore
+        return firestore.Client(project=os.getenv("GCLOUD_PROJECT", "intelliscreen-bench"))
+    return FakeFirestore(commit_latency)
+
+
+def load_sample_cvs(cv_dir):
+    """Texts of the sample PDFs, from the extraction cache after the first run."""
+    from cv_ingest import iter_parse, list_cv_files
+    from extraction_cache import ExtractionCache
+
+    results = iter_parse(list_cv_files(cv_dir), cache=ExtractionCache())
+    texts = [result.text for result in sorted(results) if result.ok and result.text.strip()]
+    if not texts:
+        raise RuntimeError(f"No readable CVs in {cv_dir}")
+    return texts
+
+
+def synthetic_cvs(sample_texts, n, seed=0):
+    """Yield ``n`` (cv_id, text) pairs built by shuffling lines of sample CVs.
+
+    Each synthetic CV mixes the lines of three random sample CVs, so the
+    vocabulary and length follow the real data while every text differs.
+    """
+    rng = np.random.default_rng(seed)
+    sample_lines = [[line for line in text.splitlines() if line.strip()] for text in sample_texts]
+    for i in range(n):
+        picks = rng.choice(len(sample_lines), size=3)
+        lines = [line for p in picks for line in sample_lines[p]]
+        keep = rng.permutation(len(lines))[:max(1, len(lines) // 3)]
+        yield f"S{i:06d}", "\n".join(lines[j] for j in keep)
+
+
+def load_jds():
+    with open(DATA_DIR / "jd_summaries.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ------------------- ⏱️ STAGES -------------------
+
+def _result(items, seconds, latencies, unit, **extra):
+    latencies_ms = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        "items": items,
+        "seconds": round(seconds, 4),
+        "throughput": round(items / seconds, 2) if seconds else None,
+        "latency_unit": unit,
+        "latency_ms": {
+            name: round(float(np.percentile(latencies_ms, q)), 3)
+            for name, q in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))
+        } if len(latencies_ms) else {},
+        **extra
+    }
+
+
+def bench_parse(args, scale):
+    """Parallel throughput over the sample PDFs, serial per-file latency."""
+    from cv_ingest import extract_text, iter_parse, list_cv_files
+
+    files = list_cv_files(args.cv_dir)
+    files = [files[i % len(files)] for i in range(scale or len(files))]
+    latencies = []
+    for path in files[:args.latency_sample]:
+        start = time.perf_counter()
+        extract_text(path)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    failures = sum(not result.ok for result in iter_parse(files, workers=args.workers, timeout=args.parse_timeout))
+    return _result(len(files), time.perf_counter() - start, latencies, "file", failures=failures)
+
+
+def bench_summarize(args, scale):
+    """summarize_all throughput at --concurrency, serial per-request latency."""
+    import pandas as pd
+    from jd_summarizer import make_client, summarize, summarize_all
+    from job_screening import SUMMARY_PROMPT
+
+    host = args.ollama_host or start_stub_ollama(args.ollama_delay)
+    jd_df = pd.read_csv(DATA_DIR / "job_description.csv", encoding="ISO-8859-1")
+    rows = list(zip(jd_df["Job Title"], jd_df["Job Description"]))
+    n = scale or len(rows)
+    jobs = [(str(i), *rows[i % len(rows)]) for i in range(n)]
+
+    client = make_client(host)
+    latencies = []
+    for _, job_title, jd_text in jobs[:args.latency_sample]:
+        start = time.perf_counter()
+        summarize(client, SUMMARY_PROMPT.format(job_title=job_title, jd_text=jd_text), retries=0)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    errors = sum(error is not None for _, _, error in summarize_all(
+        jobs, SUMMARY_PROMPT, concurrency=args.concurrency, host=host, retries=0))
+    return _result(n, time.perf_counter() - start, latencies, "request", errors=errors,
+                   concurrency=args.concurrency, stub_delay=None if args.ollama_host else args.ollama_delay)
+
+
+def bench_match(args, scale):
+    """Score ``scale`` synthetic CVs against the JD summaries in chunks."""
+    from matching import MatchEngine, top_k
+
+    jds = load_jds()
+    sample = load_sample_cvs(args.cv_dir)
+    start = time.perf_counter()
+    engine = MatchEngine().fit([jd.get("summary", "") for jd in jds.values()])
+    fit_seconds = time.perf_counter() - start
+
+    cvs = synthetic_cvs(sample, scale, args.seed)
+    latencies, elapsed = [], 0.0
+    while True:
+        chunk = [text for _, text in islice(cvs, args.chunk)]
+        if not chunk:
+            break
+        start = time.perf_counter()
+        top_k(engine.score_texts(chunk), args.top_k)
+        latencies.append(time.perf_counter() - start)
+        elapsed += latencies[-1]
+    return _result(scale, elapsed, latencies, f"chunk of {args.chunk} CVs",
+                   jds=len(jds), fit_seconds=round(fit_seconds, 4))
+
+
+def bench_persist(args, scale):
+    """Write one candidate and --top-k match documents per synthetic CV."""
+    from firestore_writer import BatchWriter
+    from job_screening import save_candidate, save_match
+
+    sample = load_sample_cvs(args.cv_dir)
+    jd_ids = list(load_jds())
+    rng = np.random.default_rng(args.seed)
+    db = TimedDB(open_firestore(args.firestore, args.commit_latency))
+
+    start = time.perf_counter()
+    with BatchWriter(db) as writer:
+        for cv_id, text in synthetic_cvs(sample, scale, args.seed):
+            save_candidate(writer, cv_id, f"{cv_id}.pdf", text)
+            for col in rng.choice(len(jd_ids), size=min(args.top_k, len(jd_ids)), replace=False):
+                save_match(writer, jd_ids[col], cv_id, rng.uniform(0, 100))
+    seconds = time.perf_counter() - start
+    return _result(writer.written, seconds, db.commit_times, "batch commit",
+                   cvs=scale, commits=len(db.commit_times), backend=args.firestore)
+
+
+def app_imports():
+    """``import`` statement covering app.py's top-level imports, minus Streamlit."""
+    tree = ast.parse((ROOT_DIR / "scripts" / "app.py").read_text(encoding="utf-8"))
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names.append(node.module)
+    return "import " + ", ".join(dict.fromkeys(n for n in names if n.split(".")[0] != "streamlit"))
+
+
+def import_seconds(code):
+    """Seconds a fresh interpreter spends importing for ``code`` (from ``-X importtime``)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT_DIR / "scripts",
+                          capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not name[1:].startswith(" "):  # top-level imports only; nested ones are inside these
+            total += int(cumulative)
+    return total / 1e6
+
+
+def bench_startup(args, scale):
+    """Cold import time of every entry point against ``--import-budget``."""
+    imports, latencies = {}, []
+    start = time.perf_counter()
+    for entry in ENTRY_POINTS:
+        code = app_imports() if entry == "app" else f"import {entry}"
+        runs = [import_seconds(code) for _ in range(args.startup_runs)]
+        imports[entry] = round(statistics.median(runs), 4)
+        latencies += runs
+    over = {entry: seconds for entry, seconds in imports.items() if seconds > args.import_budget}
+    return _result(len(ENTRY_POINTS) * args.startup_runs, time.perf_counter() - start, latencies, "import",
+                   imports=imports, budget=args.import_budget, over_budget=over)
+
+
+BENCHMARKS = {"parse": bench_parse, "summarize": bench_summarize, "match": bench_match, "persist": bench_persist,
+              "startup": bench_startup}
+
+
+def _run_stage(name, scale, args, conn):
+    """Child process entry point, so each stage reports its own peak RSS."""
+    try:
+        result = BENCHMARKS[name](args, scale)
+        result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        if children:
+            result["peak_child_rss_mb"] = round(children / 1024, 1)
+        conn.send(result)
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_stage(name, scale, args):
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_run_stage, args=(name, scale, args, child))
+    process.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = {"error": "benchmark process died"}
+    process.join()
+    return {"stage": name, "scale": scale, **result}
+
+
+# ------------------- 📈 REPORTING -------------------
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_result(result, baseline=None):
+    label = f"{result['stage']:<10} {result['scale'] or 'all':>7}"
+    if "error" in result:
+        print(f"{label}  ❌ {result['error']}")
+        return
+    latency = result["latency_ms"]
+    line = (f"{label}  {result['throughput']:>10,.1f}/s  p50 {latency.get('p50', 0):>9.2f} ms  "
+            f"p99 {latency.get('p99', 0):>9.2f} ms  rss {result['peak_rss_mb']:>7.1f} MB")
+    if baseline and baseline.get("throughput"):
+        line += f"  ({(result['throughput'] / baseline['throughput'] - 1) * 100:+.1f}% vs baseline)"
+    print(line)
+    for entry, seconds in result.get("imports", {}).items():
+        flag = "❌ over budget" if entry in result["over_budget"] else "✅"
+        print(f"    import {entry:<18} {seconds * 1000:>8.1f} ms  {flag}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the parse, summarize, match and persist stages and startup time.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--scales", nargs="+", type=int, default=[1000, 10000],
+                        help="Synthetic CV counts for the match and persist stages")
+    parser.add_argument("--parse-files", type=int, default=0, help="PDFs to parse (default: each sample CV once)")
+    parser.add_argument("--jds", type=int, default=0, help="JDs to summarize (default: each sample JD once)")
+    parser.add_argument("--cv-dir", default=str(DATA_DIR / "CVs1"))
+    parser.add_argument("--workers", type=int, default=None, help="PDF parsing processes")
+    parser.add_argument("--parse-timeout", type=float, default=60)
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel summarization requests")
+    parser.add_argument("--ollama-host", help="Benchmark a real Ollama server instead of the built-in stub")
+    parser.add_argument("--ollama-delay", type=float, default=0.05, help="Stub response time in seconds")
+    parser.add_argument("--firestore", choices=["fake", "emulator"], default="fake")
+    parser.add_argument("--commit-latency", type=float, default=0.0, help="Fake Firestore commit time in seconds")
+    parser.add_argument("--chunk", type=int, default=1000, help="CVs scored per batch in the match stage")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--latency-sample", type=int, default=20, help="Items timed one by one for latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--import-budget", type=float, default=0.5, help="Seconds allowed to import an entry point")
+    parser.add_argument("--startup-runs", type=int, default=5, help="Cold imports per entry point (median kept)")
+    parser.add_argument("--output", help="Results file (default: output/benchmarks/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare throughput against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {(r["stage"], r["scale"]): r for r in json.load(f)["results"]}
+
+    fixed_scales = {"parse": args.parse_files, "summarize": args.jds, "startup": 0}
+    results = []
+    for name in args.stages:
+        for scale in [fixed_scales[name]] if name in fixed_scales else args.scales:
+            result = run_stage(name, scale, args)
+            print_result(result, baseline.get((name, scale)))
+            results.append(result)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "results": results
+    }
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"📝 Results saved to {output}")
+    return 1 if any("error" in r or r.get("over_budget") for r in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,289 @@
+import io
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from cv_ingest import ParsedCV, find_email, iter_parse_bytes
+from firestore_writer import BatchWriter, NullWriter
+from matching import top_k
+import metrics
+import stats
+from streaming import chunked
+
+MAX_PDF_BYTES = 20 * 1024 * 1024  # larger "CVs" are almost certainly scans or mistakes
+MAX_ZIP_FILES = 5000
+DEFAULT_CHUNK_SIZE = 50  # CVs scored and written together
+MAX_KEPT_JOBS = 200  # finished jobs kept for polling
+
+BULK_FILES = metrics.counter("intelliscreen_bulk_files_total", "Files handled by bulk upload, by outcome", ["result"])
+
+
+# ------------------- 📦 UPLOADS -------------------
+
+def iter_upload_files(name, data):
+    """(file name, PDF bytes) for a PDF upload, or for every PDF inside a zip.
+
+    Members over ``MAX_PDF_BYTES`` come out with ``None`` bytes so they are
+    reported as failures instead of being inflated into memory.
+    """
+    if not name.lower().endswith(".zip"):
+        yield name, data if len(data) <= MAX_PDF_BYTES else None
+        return
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        members = [m for m in archive.infolist()
+                   if not m.is_dir() and m.filename.lower().endswith(".pdf")
+                   and "__MACOSX" not in m.filename and not os.path.basename(m.filename).startswith(".")]
+        for member in members[:MAX_ZIP_FILES]:
+            member_name = os.path.basename(member.filename)
+            if member.file_size > MAX_PDF_BYTES:
+                yield member_name, None
+            else:
+                yield member_name, archive.read(member)
+
+
+def candidate_identity(text, file_name):
+    """(candidate key, display name) for a bulk CV: the first email in it, else the file name."""
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    key = find_email(text) or stem
+    return key, re.sub(r"[_\-]+", " ", stem).strip().title()
+
+
+# ------------------- ⚙️ BACKGROUND JOBS -------------------
+
+class BulkJob:
+    """Progress and results of one bulk upload, updated by the worker thread."""
+
+    def __init__(self, total):
+        self.id = uuid.uuid4().hex[:12]
+        self.total = total
+        self.parsed = 0
+        self.failed = 0
+        self.saved = 0
+        self.status = "queued"
+        self.errors = []
+        self.results = []
+        self.duplicates = []
+        self.started = time.time()
+        self.finished = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def progress(self):
+        return (self.parsed + self.failed) / self.total if self.total else 1.0
+
+    def wait(self, timeout=None):
+        """Block until the job finishes or ``timeout`` passes; True if it finished."""
+        return self._done.wait(timeout)
+
+    def _finish(self, status):
+        self.status = status
+        self.finished = time.time()
+        self._done.set()
+
+
+class BulkMatcher:
+    """Parses, scores and stores bulk CV uploads off the request path.
+
+    One process pool parses PDFs for every job and stays warm between
+    uploads; jobs themselves run on a small thread pool, so the Streamlit
+    script only submits and polls. Parsed CVs are scored ``chunk_size`` at
+    a time in one vectorized call against the already fitted JD matrix,
+    and each chunk's candidates, matches and counters go out in one
+    Firestore ``BatchWriter``. With a ``DedupIndex``, near-duplicates of
+    CVs already seen are stored with a ``duplicate_of`` field
+    (``dedup_mode="flag"``) or dropped before scoring (``"merge"``), and
+    a candidate re-sent with unchanged text is not stored again.
+    """
+
+    def __init__(self, cv_index=None, cache=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, parse_timeout=60,
+                 max_jobs=2, dedup=None, dedup_mode="flag", top_k=3):
+        self.cv_index = cv_index
+        self.cache = cache
+        self.dedup = dedup if dedup_mode != "off" else None
+        self.dedup_mode = dedup_mode
+        self.top_k = top_k
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.parse_timeout = parse_timeout
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._runner = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="bulk-upload")
+
+    def _parse_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a threaded server process is not safe
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _renew_pool(self, broken):
+        """The pool to use after a worker crash broke ``broken``; another job may already have replaced it."""
+        with self._lock:
+            if self._pool is broken:
+                self._pool = None
+        broken.shutdown(wait=False, cancel_futures=True)
+        return self._parse_pool()
+
+    def submit(self, files, matcher, db):
+        """Start matching ``[(file name, pdf bytes)]``; returns the ``BulkJob`` to poll.
+
+        ``db`` may be None to match and index without writing to Firestore.
+        """
+        files = list(files)
+        job = self._new_job(len(files))
+        self._runner.submit(self._run, job, self._parse(job, files), matcher, db, candidate_identity)
+        return job
+
+    def submit_texts(self, texts, matcher, db):
+        """Like ``submit`` for ``[(candidate key, cv text)]``; the keys are used as given."""
+        texts = list(texts)
+        job = self._new_job(len(texts))
+        parsed = (ParsedCV(key, text, 0, None if (text or "").strip() else "empty CV text") for key, text in texts)
+        self._runner.submit(self._run, job, parsed, matcher, db, lambda text, key: (key, key))
+        return job
+
+    def parse(self, name, data):
+        """Parse one PDF on the shared pool and wait for it, e.g. inside a request; returns a ``ParsedCV``."""
+        return next(iter_parse_bytes([(name, data)], self._parse_pool(), self.parse_timeout, cache=self.cache,
+                                     renew_pool=self._renew_pool))
+
+    def job(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _new_job(self, total):
+        job = BulkJob(total)
+        with self._lock:
+            finished = [old.id for old in self.jobs.values() if old.done]
+            for old_id in finished[:max(0, len(finished) - MAX_KEPT_JOBS + 1)]:
+                del self.jobs[old_id]
+            self.jobs[job.id] = job
+        return job
+
+    def _parse(self, job, files):
+        for name, data in files:
+            if data is None:
+                self._failed(job, ParsedCV(name, None, 0, f"larger than {MAX_PDF_BYTES // (1024 * 1024)} MB"))
+        uploads = ((name, data) for name, data in files if data is not None)
+        yield from iter_parse_bytes(uploads, self._parse_pool(), self.parse_timeout, cache=self.cache,
+                                    renew_pool=self._renew_pool)
+
+    def _run(self, job, parsed, matcher, db, identify):
+        job.status = "running"
+        try:
+            for chunk in chunked(self._count(job, parsed), self.chunk_size):
+                ok = [result for result in chunk if result.ok]
+                if ok:
+                    self._store(job, ok, matcher, db, identify)
+        except Exception as e:
+            job.errors.append(f"{type(e).__name__}: {e}")
+            job._finish("failed")
+            return
+        job._finish("done")
+
+    def _count(self, job, parsed):
+        # Progress moves per file, not per chunk
+        for result in parsed:
+            if result.ok:
+                job.parsed += 1
+            else:
+                self._failed(job, result)
+            yield result
+
+    def _failed(self, job, result):
+        BULK_FILES.inc(result="failed")
+        job.failed += 1
+        job.errors.append(f"{result.path}: {result.error}")
+
+    def _store(self, job, results, matcher, db, identify):
+        identities = [identify(result.text, result.path) for result in results]
+        duplicates = {}
+        if self.dedup is not None:
+            duplicates = self.dedup.check_many([(key, result.text) for (key, _), result in zip(identities, results)],
+                                               "upload", resubmissions=True)
+            # An unchanged resubmission is already stored; a near-duplicate is dropped only when merging
+            skipped = {key for key, duplicate in duplicates.items()
+                       if duplicate.original == key or self.dedup_mode == "merge"}
+            for (key, _), result in zip(identities, results):
+                if key in duplicates:
+                    job.duplicates.append({"file": result.path, "candidate": key,
+                                           "duplicate_of": duplicates[key].original,
+                                           "similarity": round(duplicates[key].similarity, 3),
+                                           "action": "unchanged" if duplicates[key].original == key
+                                           else "skipped" if key in skipped else "flagged"})
+            if skipped:
+                kept = [i for i, (key, _) in enumerate(identities) if key not in skipped]
+                BULK_FILES.inc(len(results) - len(kept), result="duplicate")
+                identities, results = [identities[i] for i in kept], [results[i] for i in kept]
+                if not results:
+                    return
+        try:
+            self._save(job, identities, results, duplicates, matcher, db)
+        except BaseException:
+            if self.dedup is not None:
+                # Unsaved CVs must not count as already stored when they are sent again
+                for key, _ in identities:
+                    self.dedup.remove(key)
+            raise
+
+    def _save(self, job, identities, results, duplicates, matcher, db):
+        timestamp = None
+        if db is not None:
+            from firebase_admin import firestore
+            timestamp = firestore.SERVER_TIMESTAMP
+
+        scores = np.asarray(matcher.score([result.text for result in results]), dtype=np.float64)
+        skill_cov = matcher.coverage([result.text for result in results])
+        existing = set()
+        if db is not None:
+            refs = [db.collection("candidates").document(key) for key, _ in identities]
+            existing = {snapshot.id for snapshot in db.get_all(refs) if snapshot.exists}
+
+        with BatchWriter(db) if db is not None else NullWriter() as writer:
+            for (key, name), result, row, cov in zip(identities, results, scores, skill_cov):
+                candidate = {
+                    "name": name,
+                    "email": key if "@" in key else None,
+                    "cv_text": result.text,
+                    "source_file": result.path,
+                    "upload_date": timestamp
+                }
+                if key in duplicates:
+                    candidate["duplicate_of"] = duplicates[key].original
+                writer.set("candidates", key, candidate)
+                for jd_id, score, jd_cov in zip(matcher.jd_ids, row, cov):
+                    writer.add("matches", {
+                        "candidate_email": key,
+                        "jd_id": jd_id,
+                        "score": round(float(score), 2),
+                        "skill_coverage": round(float(jd_cov), 1),
+                        "match_date": timestamp
+                    })
+            stats.record_counts(writer, candidates=len({key for key, _ in identities} - existing))
+            stats.record_score_matrix_change(writer, np.zeros((0, len(matcher.jd_ids))), matcher.jd_ids,
+                                             scores, matcher.jd_ids)
+        if self.cv_index is not None:
+            self.cv_index.add_documents([(key, result.text) for (key, _), result in zip(identities, results)])
+
+        for (key, name), result, row, cov, cols in zip(identities, results, scores, skill_cov,
+                                                         top_k(scores, self.top_k)):
+            job.results.append({
+                "file": result.path,
+                "candidate": key,
+                "name": name,
+                "matches": [(matcher.jd_ids[col], matcher.title(matcher.jd_ids[col]), round(float(row[col]), 2),
+                             round(float(cov[col]), 1)) for col in cols]
+            })
+        job.saved += len(results)
+        BULK_FILES.inc(len(results), result="ok")
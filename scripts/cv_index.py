@@ -0,0 +1,433 @@
+import contextlib
+import logging
+import math
+import shutil
+import sqlite3
+import threading
+import zlib
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+from skills import SKILLS_VERSION, WORDS, bitsets, coverage
+from text_prep import TEXT_PREP_VERSION, TermMap, tokens, vocab_of
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = Path(__file__).resolve().parent.parent / "output" / "cv_index"
+MAX_SEGMENTS = 16
+REBUILD_BATCH = 1000  # documents per segment when re-indexing stored CVs
+WRITE_TIMEOUT = 120  # seconds a writer waits for another process's add or compaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS terms (id INTEGER PRIMARY KEY, term TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    skills BLOB NOT NULL,
+    text BLOB NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS segments (id INTEGER PRIMARY KEY AUTOINCREMENT);
+"""
+
+class Segment:
+    """One immutable, memory-mapped slice of the postings.
+
+    Postings are stored term-major: for ``term_ids[i]`` the documents are
+    ``doc_ids[ptr[i]:ptr[i+1]]`` (ascending) with length-normalised term
+    frequencies in ``weights``; ``max_w[i]`` is the largest of those
+    weights and bounds the term's contribution to any score.
+    """
+
+    FILES = ("term_ids", "ptr", "doc_ids", "weights", "max_w")
+
+    def __init__(self, path):
+        self.path = Path(path)
+        for name in self.FILES:
+            setattr(self, name, np.load(self.path / f"{name}.npy", mmap_mode="r"))
+
+    def postings(self, term_id):
+        i = np.searchsorted(self.term_ids, term_id)
+        if i == len(self.term_ids) or self.term_ids[i] != term_id:
+            return None
+        start, end = self.ptr[i], self.ptr[i + 1]
+        return self.doc_ids[start:end], self.weights[start:end], float(self.max_w[i])
+
+    @classmethod
+    def write(cls, path, term_ids, doc_ids, weights):
+        """Write parallel (term, doc, weight) posting arrays as a new segment."""
+        path = Path(path)
+        path.mkdir(parents=True)
+        order = np.lexsort((doc_ids, term_ids))
+        term_ids = np.asarray(term_ids, dtype=np.int32)[order]
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)[order]
+        weights = np.asarray(weights, dtype=np.float32)[order]
+        unique_terms, starts = np.unique(term_ids, return_index=True)
+        ptr = np.append(starts, len(term_ids)).astype(np.int64)
+        max_w = np.maximum.reduceat(weights, starts) if len(weights) else weights
+        for name, array in zip(cls.FILES, (unique_terms, ptr, doc_ids, weights, max_w)):
+            np.save(path / f"{name}.npy", array)
+        return cls(path)
+
+    def arrays(self):
+        """All postings as parallel (term, doc, weight) arrays."""
+        terms = np.repeat(self.term_ids, np.diff(self.ptr))
+        return terms, np.asarray(self.doc_ids), np.asarray(self.weights)
+
+
+class CVIndex:
+    """Persistent inverted index over CV text for top-N search by JD.
+
+    Documents are added in batches; each batch becomes a new segment, so
+    indexing an upload never rewrites existing postings, and segments are
+    merged once there are more than ``MAX_SEGMENTS``. Re-adding a key
+    replaces the earlier version. Scores are TF-IDF cosine-style (IDF is
+    applied at query time from the postings, so it always reflects the
+    current pool) and search only touches postings of the query terms,
+    with max-score pruning once no unseen document can still reach the
+    top N.
+
+    Terms, documents and the live segment list sit in an append-only
+    SQLite catalogue (``index.db``) next to the segments. Every write runs
+    in one ``BEGIN IMMEDIATE`` transaction, so the batch, the app, bulk
+    uploads and the service can all add CVs to the same index: writers in
+    different processes take turns, and ``reload()`` only reads what was
+    appended since the last one. Each document keeps its skill bitset (see
+    ``skills``) for prefiltering, and its compressed text, so a new
+    tokenizer or skill list rebuilds the index from the stored CVs instead
+    of dropping them.
+    """
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR):
+        self.index_dir = Path(index_dir)
+        self.path = self.index_dir / "index.db"
+        self._lock = threading.RLock()
+        self._reset()
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self._drop_legacy()
+        with contextlib.closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+        stale = []
+        with self._lock, self._write() as conn:
+            stored = dict(conn.execute("SELECT name, value FROM meta").fetchall())
+            versions = {"text_prep": TEXT_PREP_VERSION, "skills": SKILLS_VERSION}
+            if {name: stored.get(name) for name in versions} != versions:
+                if stored:
+                    logger.warning("%s was built with another tokenizer or skill list, re-indexing its CVs",
+                                   self.index_dir)
+                    stale = self._rebuild(conn)
+                conn.executemany("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", versions.items())
+                self._bump(conn)
+            self._refresh(conn)
+        for segment_id in stale:
+            shutil.rmtree(self._segment_path(segment_id), ignore_errors=True)
+
+    # ------------------- persistence -------------------
+
+    def _reset(self):
+        self.epoch = None
+        self.terms = {}
+        self.term_map = TermMap(self.terms)
+        self.docs = []
+        self.deleted = set()
+        self.doc_ids = {}
+        self.segments = []
+        self.segment_ids = []
+        self.skill_bits = np.zeros((0, WORDS), dtype=np.uint64)
+        self._generation = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=WRITE_TIMEOUT, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextlib.contextmanager
+    def _write(self):
+        """One cross-process write transaction; other writers wait for it."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _bump(conn, name="generation"):
+        conn.execute("INSERT INTO meta (name, value) VALUES (?, '1') "
+                     "ON CONFLICT (name) DO UPDATE SET value = CAST(value AS INTEGER) + 1", (name,))
+
+    @contextlib.contextmanager
+    def _changing(self):
+        """Write transaction that also updates the in-memory view; on failure the view is reloaded."""
+        with self._lock:
+            try:
+                with self._write() as conn:
+                    self._refresh(conn)
+                    yield conn
+                    self._bump(conn)
+                    self._refresh(conn)
+            except BaseException:
+                self._reset()
+                raise
+
+    def _drop_legacy(self):
+        # Indexes from before the SQLite catalogue kept no CV text to rebuild from
+        if (self.index_dir / "meta.json").exists() and not self.path.exists():
+            logger.warning("%s uses the old meta.json layout and is rebuilt empty; re-run the batch to re-index "
+                           "its CVs", self.index_dir)
+            for entry in self.index_dir.iterdir():
+                if entry.is_dir():
+                    shutil.rmtree(entry, ignore_errors=True)
+                else:
+                    entry.unlink()
+
+    def reload(self):
+        """Pick up CVs added or removed by other processes; cheap when nothing changed."""
+        with self._lock:
+            for attempt in range(3):
+                conn = self._connect()
+                try:
+                    conn.execute("BEGIN")
+                    self._refresh(conn)
+                    return
+                except FileNotFoundError:
+                    # A compaction removed segments listed in our snapshot; read the new list
+                    if attempt == 2:
+                        raise
+                finally:
+                    conn.execute("ROLLBACK")
+                    conn.close()
+
+    def _refresh(self, conn):
+        """Bring the in-memory view up to date with what ``conn`` sees."""
+        stored = dict(conn.execute("SELECT name, value FROM meta WHERE name IN ('generation', 'epoch')").fetchall())
+        if stored.get("epoch") != self.epoch:
+            # Re-indexed with new term and doc ids (or never loaded): read everything
+            self._reset()
+            self.epoch = stored.get("epoch")
+        if stored.get("generation") == self._generation:
+            return
+        new_terms = conn.execute("SELECT id, term FROM terms WHERE id >= ? ORDER BY id", (len(self.terms),)).fetchall()
+        if new_terms:
+            self.terms.update((term, term_id) for term_id, term in new_terms)
+            # Lookups cached as "unknown" may now be known
+            self.term_map = TermMap(self.terms)
+
+        rows = conn.execute("SELECT id, key, skills FROM docs WHERE id >= ? ORDER BY id", (len(self.docs),)).fetchall()
+        for doc_id, key, _ in rows:
+            self.docs.append(key)
+            self.doc_ids[key] = doc_id
+        if rows:
+            self.skill_bits = np.concatenate(
+                [self.skill_bits, np.frombuffer(b"".join(bits for _, _, bits in rows), dtype=np.uint64)
+                 .reshape(-1, WORDS)])
+        deleted = {row[0] for row in conn.execute("SELECT id FROM docs WHERE deleted = 1")}
+        for doc_id in deleted - self.deleted:
+            if self.doc_ids.get(self.docs[doc_id]) == doc_id:
+                del self.doc_ids[self.docs[doc_id]]
+        self.deleted = deleted
+
+        segment_ids = [row[0] for row in conn.execute("SELECT id FROM segments ORDER BY id")]
+        if segment_ids != self.segment_ids:
+            loaded = dict(zip(self.segment_ids, self.segments))
+            self.segments = [loaded.get(i) or Segment(self._segment_path(i)) for i in segment_ids]
+            self.segment_ids = segment_ids
+        self._generation = stored.get("generation")
+
+    def _segment_path(self, segment_id):
+        return self.index_dir / f"seg_{segment_id:06d}"
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, key):
+        return key in self.doc_ids
+
+    # ------------------- indexing -------------------
+
+    def add_documents(self, items):
+        """Index ``(key, text)`` pairs as one new segment.
+
+        ``text`` may also be an already computed ``text_prep.tokens`` array.
+        """
+        items = [(key, text if isinstance(text, str) else " ".join(vocab_of(text).decode(text)))
+                 for key, text in items]
+        if not items:
+            return
+        with self._changing() as conn:
+            self._add(conn, items)
+        if len(self.segments) > MAX_SEGMENTS:
+            self.compact()
+
+    def _add(self, conn, items):
+        """Append ``(key, text)`` docs, their new terms and one segment inside a write transaction.
+
+        Only new rows are written: nothing already stored is rewritten.
+        """
+        n_terms = len(self.terms)
+        term_ids, doc_ids, weights = [], [], []
+        docs = []
+        for key, text in items:
+            local, counts = np.unique(self.term_map(tokens(text or ""), grow=True), return_counts=True)
+            if key in self.doc_ids:
+                self._delete(conn, key)
+            doc_id = len(self.docs)
+            self.docs.append(key)
+            self.doc_ids[key] = doc_id
+            docs.append((doc_id, key, text))
+            if not len(counts):
+                continue
+            term_ids.append(local)
+            doc_ids.append(np.full(len(local), doc_id, dtype=np.int32))
+            weights.append(counts / math.sqrt(float(np.dot(counts, counts))))
+
+        # Term ids are handed out in insertion order, so the new terms are the dict's last entries
+        new_terms = list(islice(reversed(self.terms.items()), len(self.terms) - n_terms))
+        conn.executemany("INSERT INTO terms (id, term) VALUES (?, ?)", ((i, term) for term, i in new_terms))
+        bits = bitsets([text for _, _, text in docs])
+        conn.executemany("INSERT INTO docs (id, key, skills, text) VALUES (?, ?, ?, ?)",
+                         ((doc_id, key, row.tobytes(), zlib.compress(text.encode("utf-8")))
+                          for (doc_id, key, text), row in zip(docs, bits)))
+        self.skill_bits = np.concatenate([self.skill_bits, bits])
+        if term_ids:
+            self._add_segment(conn, np.concatenate(term_ids), np.concatenate(doc_ids), np.concatenate(weights))
+
+    def _add_segment(self, conn, term_ids, doc_ids, weights):
+        segment_id = conn.execute("INSERT INTO segments DEFAULT VALUES").lastrowid
+        path = self._segment_path(segment_id)
+        shutil.rmtree(path, ignore_errors=True)  # left by a writer that crashed before committing
+        self.segments.append(Segment.write(path, term_ids, doc_ids, weights))
+        self.segment_ids.append(segment_id)
+
+    def _delete(self, conn, key):
+        doc_id = self.doc_ids.pop(key)
+        self.deleted.add(doc_id)
+        # Only live documents keep their text for rebuilds
+        conn.execute("UPDATE docs SET deleted = 1, text = x'' WHERE id = ?", (doc_id,))
+
+    def remove(self, *keys):
+        """Drop the documents of ``keys`` (unknown keys are ignored) in one write."""
+        with self._changing() as conn:
+            for key in keys:
+                if key in self.doc_ids:
+                    self._delete(conn, key)
+
+    def compact(self):
+        """Merge all segments into one and drop postings of removed documents."""
+        with self._changing() as conn:
+            old = self.segment_ids
+            parts = [segment.arrays() for segment in self.segments]
+            conn.execute("DELETE FROM segments")
+            self.segments, self.segment_ids = [], []
+            if parts:
+                term_ids, doc_ids, weights = (np.concatenate(column) for column in zip(*parts))
+                if self.deleted:
+                    keep = ~np.isin(doc_ids, np.fromiter(self.deleted, dtype=np.int64))
+                    term_ids, doc_ids, weights = term_ids[keep], doc_ids[keep], weights[keep]
+                if len(term_ids):
+                    self._add_segment(conn, term_ids, doc_ids, weights)
+        # Readers that still map the old files keep them open on POSIX; later reloads see the merged list
+        for segment_id in old:
+            shutil.rmtree(self._segment_path(segment_id), ignore_errors=True)
+
+    def _rebuild(self, conn):
+        """Re-index every live document from its stored text, inside a write transaction.
+
+        Returns the replaced segment ids, whose files go once the transaction commits.
+        """
+        live = [(key, zlib.decompress(text).decode("utf-8"))
+                for key, text in conn.execute("SELECT key, text FROM docs WHERE deleted = 0 ORDER BY id")]
+        stale = [row[0] for row in conn.execute("SELECT id FROM segments")]
+        conn.execute("DELETE FROM docs")
+        conn.execute("DELETE FROM terms")
+        conn.execute("DELETE FROM segments")
+        self._reset()
+        self._bump(conn, "epoch")
+        for start in range(0, len(live), REBUILD_BATCH):
+            self._add(conn, live[start:start + REBUILD_BATCH])
+        return stale
+
+    # ------------------- search -------------------
+
+    def search(self, query_text, top_n=10, required=None, min_coverage=0.0):
+        """Return ``[(key, score), ...]`` for the best ``top_n`` CVs, best first.
+
+        Scores are relevance values for ranking within one query, not
+        percentages comparable with MatchEngine scores. With a JD skill
+        bitset in ``required``, only CVs covering at least ``min_coverage``
+        percent of it are scored at all.
+        """
+        with self._lock:
+            n_live = len(self.doc_ids)
+            local = self.term_map(tokens(query_text or ""))
+            query_terms, counts = np.unique(local[local >= 0], return_counts=True)
+            if not n_live or not len(query_terms):
+                return []
+            candidates = None
+            if required is not None and min_coverage > 0:
+                allowed = coverage(self.skill_bits, required)[:, 0] >= min_coverage
+                if self.deleted:
+                    allowed[list(self.deleted)] = False
+                candidates = np.flatnonzero(allowed)
+                if not len(candidates):
+                    return []
+
+            # Query weights and per-term postings with their score upper bounds.
+            terms = []
+            for term_id, count in zip(query_terms.tolist(), counts.tolist()):
+                parts = [p for p in (s.postings(term_id) for s in self.segments) if p is not None]
+                # Document frequency straight from the postings, so writers never rewrite a df table
+                idf = math.log((1 + n_live) / (1 + sum(len(doc_ids) for doc_ids, _, _ in parts))) + 1
+                if parts:
+                    terms.append((count * idf, idf, parts))
+            if not terms:
+                return []
+            q_norm = math.sqrt(sum(qw * qw for qw, _, _ in terms))
+            terms = [(qw * idf / q_norm, parts) for qw, idf, parts in terms]
+            bounds = [scale * max(m for _, _, m in parts) for scale, parts in terms]
+            order = np.argsort(bounds)[::-1]
+
+            acc = np.zeros(len(self.docs), dtype=np.float32)
+            if self.deleted:
+                acc[list(self.deleted)] = -np.inf
+            remaining = float(sum(bounds))
+            for i in order:
+                scale, parts = terms[i]
+                remaining -= bounds[i]
+                for doc_ids, weights, _ in parts:
+                    if candidates is None:
+                        acc[doc_ids] += scale * weights
+                    else:
+                        # Only skill-qualified documents that can still make the top N are scored.
+                        pos = np.searchsorted(doc_ids, candidates)
+                        pos = np.minimum(pos, len(doc_ids) - 1)
+                        hit = doc_ids[pos] == candidates
+                        acc[candidates[hit]] += scale * weights[pos[hit]]
+                threshold = self._kth_score(acc if candidates is None else acc[candidates], top_n)
+                if threshold > 0 and threshold > remaining:
+                    pool = np.nonzero(acc + remaining >= threshold)[0] if candidates is None else candidates
+                    candidates = pool[acc[pool] + remaining >= threshold]
+
+            pool = candidates if candidates is not None else np.nonzero(acc > 0)[0]
+            pool = pool[acc[pool] > 0]
+            best = pool[np.argsort(-acc[pool], kind="stable")[:top_n]]
+            return [(self.docs[d], round(float(acc[d]), 4)) for d in best]
+
+    def coverage(self, keys, required):
+        """Percent of the ``required`` skill bitset covered by each CV in ``keys``."""
+        with self._lock:
+            rows = [self.doc_ids[key] for key in keys]
+            return coverage(self.skill_bits[rows], required)[:, 0].tolist()
+
+    @staticmethod
+    def _kth_score(scores, k):
+        if len(scores) < k:
+            return 0.0
+        return float(np.partition(scores, len(scores) - k)[len(scores) - k])
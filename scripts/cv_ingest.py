@@ -0,0 +1,342 @@
+import io
+import os
+import re
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple, Optional
+
+from extraction_cache import content_key
+import metrics
+
+# Bump whenever extract_text changes so cached text is re-extracted.
+PARSER_VERSION = "2"
+
+MAX_PAGES = 10  # CVs longer than this are cut; later pages add little signal
+MIN_PAGE_CHARS = 40  # fewer characters than this on a page means a scan or a broken text layer
+MAX_BAD_CHAR_RATIO = 0.02  # replacement/private-use/control characters
+MIN_ALNUM_RATIO = 0.5  # of the non-space characters
+MIN_LINE_LENGTH = 3  # average; lower means glyphs came out one per line
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+PARSED = metrics.counter("intelliscreen_cv_parsed_total", "PDFs processed, by outcome", ["result"])
+PARSE_SECONDS = metrics.histogram("intelliscreen_cv_parse_seconds", "Text extraction time per PDF")
+PAGES = metrics.counter("intelliscreen_pdf_pages_total", "PDF pages extracted, by method", ["method"])
+
+
+class ParsedCV(NamedTuple):
+    path: str
+    text: Optional[str]
+    pages: int
+    error: Optional[str]
+    cached: bool = False
+    seconds: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class ParseTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise ParseTimeout()
+
+
+def _clean(text):
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return "".join(c for c in text if c in "\n\t" or c >= " ")
+
+
+def needs_layout(text):
+    """True if fast-path page text looks empty, garbled or out of order."""
+    stripped = text.strip()
+    if len(stripped) < MIN_PAGE_CHARS:
+        return True
+    chars = [c for c in stripped if not c.isspace()]
+    bad = sum(c == "\ufffd" or "\ue000" <= c <= "\uf8ff" or c < " " for c in chars)
+    if bad / len(chars) > MAX_BAD_CHAR_RATIO:
+        return True
+    if sum(c.isalnum() for c in chars) / len(chars) < MIN_ALNUM_RATIO:
+        return True
+    lines = [line for line in stripped.splitlines() if line.strip()]
+    return len(stripped) / len(lines) < MIN_LINE_LENGTH
+
+
+def _fast_pages(source, max_pages):
+    """Text of the first ``max_pages`` pages from PDFium's text layer, plus the page count."""
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(source)
+    try:
+        texts = []
+        for i in range(min(len(pdf), max_pages)):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            texts.append(_clean(textpage.get_text_range()))
+            textpage.close()
+            page.close()
+        return texts, len(pdf)
+    finally:
+        pdf.close()
+
+
+# ✅ Extract text from a single PDF
+def extract_text(pdf_path, max_pages=MAX_PAGES):
+    """Return (text, page count) for a path or binary file object.
+
+    Reads the PDF's text layer with PDFium first, which is many times
+    faster than layout analysis and right for ordinary single-column CVs.
+    Only pages that fail ``needs_layout`` go through pdfplumber, and only
+    the first ``max_pages`` pages are read.
+    """
+    import pdfplumber
+    import pypdfium2
+
+    if hasattr(pdf_path, "seek"):
+        pdf_path.seek(0)
+    try:
+        texts, pages = _fast_pages(pdf_path, max_pages)
+    except pypdfium2.PdfiumError:
+        texts, pages = [], None
+    retry = [i for i, text in enumerate(texts) if needs_layout(text)] if pages is not None else None
+    PAGES.inc(len(texts) - len(retry or ()), method="fast")
+    if retry == []:
+        return "\n".join(texts), pages
+
+    if hasattr(pdf_path, "seek"):
+        pdf_path.seek(0)
+    with pdfplumber.open(pdf_path) as pdf:
+        if retry is None:  # PDFium could not open it at all
+            pages = len(pdf.pages)
+            texts = [""] * min(pages, max_pages)
+            retry = range(len(texts))
+        for i in retry:
+            texts[i] = pdf.pages[i].extract_text() or ""
+        PAGES.inc(len(retry), method="layout")
+    return "\n".join(texts), pages
+
+
+def _parse_one(pdf_path, timeout=None):
+    """Worker entry point: never raises, failures are reported in the result."""
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    start = time.perf_counter()
+    try:
+        text, pages = extract_text(pdf_path)
+        return ParsedCV(pdf_path, text, pages, None, seconds=time.perf_counter() - start)
+    except ParseTimeout:
+        return ParsedCV(pdf_path, None, 0, f"timed out after {timeout}s", seconds=time.perf_counter() - start)
+    except Exception as e:
+        return ParsedCV(pdf_path, None, 0, f"{type(e).__name__}: {e}", seconds=time.perf_counter() - start)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def _parse_upload(name, pdf_bytes, timeout=None):
+    """Worker entry point for in-memory PDFs; ``name`` labels the result."""
+    return _parse_one(io.BytesIO(pdf_bytes), timeout)._replace(path=name)
+
+
+def _observe(result):
+    """Record one result in the parse metrics; worker timings travel back in ``seconds``."""
+    if result.cached:
+        PARSED.inc(result="cached")
+        return result
+    PARSED.inc(result="ok" if result.ok else "failed")
+    PARSE_SECONDS.observe(result.seconds)
+    return result
+
+
+def find_email(text):
+    """The first email address in a CV's text, lower-cased, or None."""
+    match = EMAIL_PATTERN.search(text or "")
+    return match.group(0).lower().rstrip(".") if match else None
+
+
+def list_cv_files(cv_folder):
+    return sorted(os.path.join(cv_folder, f) for f in os.listdir(cv_folder) if f.lower().endswith(".pdf"))
+
+
+def iter_parse(pdf_paths, workers=None, timeout=None, max_pending=None, cache=None):
+    """Parse PDFs across a process pool, yielding ParsedCV as each one finishes.
+
+    Results arrive in completion order, not input order. At most
+    ``max_pending`` files are in flight at once so a huge listing does not
+    queue every path up front. ``timeout`` (seconds) is enforced inside the
+    worker with SIGALRM where the platform supports it; a file that exceeds
+    it is reported as failed and the worker moves on.
+
+    A worker that dies outright (out of memory, a segfault in the PDF
+    library) breaks the whole pool. The pool is then recreated and the files
+    that were in flight are retried one at a time, so only the file that
+    crashes on its own is reported as failed.
+
+    With an ``ExtractionCache``, files whose bytes were already extracted
+    are answered from the cache without touching the pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+    paths = iter(pdf_paths)
+    suspects = []  # (path, cache key) in flight when a worker died
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {}
+        exhausted = False
+        while True:
+            if suspects and not pending:
+                path, key = suspects.pop(0)
+                pending[pool.submit(_parse_one, path, timeout)] = (path, key)
+            while not suspects and not exhausted and len(pending) < max_pending:
+                path = next(paths, None)
+                if path is None:
+                    exhausted = True
+                    break
+                key = None
+                if cache is not None:
+                    try:
+                        key = _cache_key(path)
+                    except OSError as e:
+                        yield _observe(ParsedCV(path, None, 0, f"{type(e).__name__}: {e}"))
+                        continue
+                    hit = cache.get(key)
+                    if hit is not None:
+                        yield _observe(ParsedCV(path, hit[0], hit[1], None, cached=True))
+                        continue
+                pending[pool.submit(_parse_one, path, timeout)] = (path, key)
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, key = pending.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    crashed = [(path, key)] + list(pending.values())
+                    pending.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                    if len(crashed) == 1:
+                        # Alone in the pool, so this file is the one that kills workers
+                        yield _observe(ParsedCV(path, None, 0, "worker process crashed"))
+                    else:
+                        suspects.extend(crashed)
+                    break
+                if key is not None and result.ok:
+                    cache.put(key, result.text, result.pages)
+                yield _observe(result)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_parse_bytes(uploads, pool, timeout=None, max_pending=None, cache=None, renew_pool=None):
+    """Like ``iter_parse`` for ``(name, pdf_bytes)`` pairs, on a caller-owned pool.
+
+    Results carry the name in ``path`` and arrive in completion order.
+    The pool is not shut down, so a long-lived process (the app) can keep
+    one warm for every upload.
+
+    When a worker dies, ``renew_pool(broken)`` is called for the pool to
+    carry on with, and the files in flight are retried one at a time. The
+    pool may be shared with other callers whose files could be the culprit,
+    so a file is only reported as failed when it crashes again on its own.
+    Without ``renew_pool`` the ``BrokenProcessPool`` propagates.
+    """
+    max_pending = max_pending or getattr(pool, "_max_workers", os.cpu_count() or 1) * 4
+    uploads = iter(uploads)
+    suspects = []  # (name, pdf bytes, cache key) in flight when a worker died
+    pending = {}
+    exhausted = False
+
+    def submit(name, pdf_bytes):
+        nonlocal pool
+        try:
+            return pool.submit(_parse_upload, name, pdf_bytes, timeout)
+        except BrokenProcessPool:
+            # Another caller's file broke the shared pool since we last used it
+            if renew_pool is None:
+                raise
+            pool = renew_pool(pool)
+            return pool.submit(_parse_upload, name, pdf_bytes, timeout)
+
+    while True:
+        if suspects and not pending:
+            name, pdf_bytes, key = suspects.pop(0)
+            pending[submit(name, pdf_bytes)] = (name, pdf_bytes, key, True)
+        while not suspects and not exhausted and len(pending) < max_pending:
+            upload = next(uploads, None)
+            if upload is None:
+                exhausted = True
+                break
+            name, pdf_bytes = upload
+            key = content_key(pdf_bytes, PARSER_VERSION) if cache is not None else None
+            hit = cache.get(key) if key is not None else None
+            if hit is not None:
+                yield _observe(ParsedCV(name, hit[0], hit[1], None, cached=True))
+                continue
+            pending[submit(name, pdf_bytes)] = (name, pdf_bytes, key, False)
+        if not pending:
+            break
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            name, pdf_bytes, key, alone = pending.pop(future)
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                if renew_pool is None:
+                    raise
+                crashed = [(name, pdf_bytes, key, alone)] + list(pending.values())
+                pending.clear()
+                pool = renew_pool(pool)
+                for name, pdf_bytes, key, alone in crashed:
+                    if alone:
+                        yield _observe(ParsedCV(name, None, 0, "worker process crashed"))
+                    else:
+                        suspects.append((name, pdf_bytes, key))
+                break
+            if key is not None and result.ok:
+                cache.put(key, result.text, result.pages)
+            yield _observe(result)
+
+
+def _cache_key(pdf_path):
+    with open(pdf_path, "rb") as f:
+        return content_key(f.read(), PARSER_VERSION)
+
+
+def parse_bytes(pdf_bytes, cache=None):
+    """Extract (text, pages) from in-memory PDF bytes, e.g. an upload."""
+    key = content_key(pdf_bytes, PARSER_VERSION) if cache is not None else None
+    if key is not None:
+        hit = cache.get(key)
+        if hit is not None:
+            PARSED.inc(result="cached")
+            return hit
+    try:
+        with PARSE_SECONDS.time():
+            text, pages = extract_text(io.BytesIO(pdf_bytes))
+    except Exception:
+        PARSED.inc(result="failed")
+        raise
+    PARSED.inc(result="ok")
+    if key is not None:
+        cache.put(key, text, pages)
+    return text, pages
+
+
+def parse_directory(cv_folder, workers=None, timeout=None, cache=None):
+    """Parse every PDF in ``cv_folder``; returns (texts by path, failures)."""
+    texts, failures = {}, []
+    for result in iter_parse(list_cv_files(cv_folder), workers=workers, timeout=timeout, cache=cache):
+        if result.ok:
+            texts[result.path] = result.text
+        else:
+            failures.append(result)
+    return texts, failures
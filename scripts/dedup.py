@@ -0,0 +1,261 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import weakref
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+import metrics
+from text_prep import TEXT_PREP_VERSION, tokens, vocab_of
+
+DEFAULT_DEDUP_PATH = Path(__file__).resolve().parent.parent / "output" / "dedup.db"
+DEFAULT_THRESHOLD = 0.85  # estimated Jaccard similarity of word shingles
+DEDUP_MODES = ("off", "flag", "merge")
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128  # MinHash signature length; the estimate's standard error is about 1 / sqrt(NUM_PERM)
+SHINGLE_SIZE = 5  # words per shingle
+SEED = 1
+
+DUPLICATES = metrics.counter("intelliscreen_cv_duplicates_total", "Near-duplicate CVs found at ingestion",
+                             ["source"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS docs (
+    key TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    duplicate_of TEXT,
+    similarity REAL
+);
+CREATE TABLE IF NOT EXISTS bands (band INTEGER NOT NULL, bucket INTEGER NOT NULL, key TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS bands_bucket ON bands (band, bucket);
+CREATE INDEX IF NOT EXISTS bands_key ON bands (key);
+CREATE INDEX IF NOT EXISTS docs_source ON docs (source);
+"""
+
+# Multiply-shift hash family: h(x) = (a * x + b) >> 32 over uint64, with odd ``a``.
+_rng = np.random.default_rng(SEED)
+_A = (_rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+_SHINGLE_BASE = np.uint64(1000003)
+
+
+class Duplicate(NamedTuple):
+    original: str
+    similarity: float
+
+
+# ------------------- 🔏 SIGNATURES -------------------
+
+_term_lock = threading.Lock()
+_term_hashes = weakref.WeakKeyDictionary()  # per vocabulary, so a replaced one takes its table with it
+
+
+def term_hashes(ids):
+    """Stable uint64 hashes of shared-vocabulary token ids.
+
+    Ids depend on the order a process met its terms, so signatures that
+    are persisted and compared across runs hash the terms themselves.
+    """
+    vocab = vocab_of(ids)
+    with _term_lock:
+        hashes = _term_hashes.get(vocab, np.empty(0, dtype=np.uint64))
+        if len(hashes) < len(vocab):
+            extra = [int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+                     for term in vocab.terms[len(hashes):len(vocab)]]
+            hashes = _term_hashes[vocab] = np.concatenate([hashes, np.asarray(extra, dtype=np.uint64)])
+        return hashes[np.asarray(ids)]
+
+
+def shingles(text):
+    """uint64 hashes of the ``SHINGLE_SIZE``-word shingles of ``text`` (a text or token array)."""
+    ids = term_hashes(text if isinstance(text, np.ndarray) else tokens(text or ""))
+    if not len(ids):
+        return ids
+    size = min(SHINGLE_SIZE, len(ids))
+    hashes = np.zeros(len(ids) - size + 1, dtype=np.uint64)
+    for offset in range(size):
+        hashes = hashes * _SHINGLE_BASE + ids[offset:offset + len(hashes)]
+    return np.unique(hashes)
+
+
+def minhash(text):
+    """(NUM_PERM,) uint32 MinHash signature of the text's shingles, or None for an empty text."""
+    hashed = shingles(text)
+    if not len(hashed):
+        return None
+    return ((_A[:, None] * hashed[None, :] + _B[:, None]) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(sig_a == sig_b))
+
+
+def lsh_bands(threshold, num_perm=NUM_PERM, recall=0.95):
+    """(bands, rows) with the most rows per band that still make a pair at
+    ``threshold`` a candidate with probability ``recall``.
+
+    More rows per band means fewer false candidates to verify against the
+    full signatures; pairs above the threshold are found even more often.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            best = (bands, rows)
+    return best
+
+
+# ------------------- 🗂️ LSH INDEX -------------------
+
+class DedupIndex:
+    """MinHash/LSH index of ingested CVs, persisted in SQLite.
+
+    Each signature is cut into bands; a band's rows hash to a bucket, and
+    CVs sharing any bucket are candidate duplicates, so a lookup reads a
+    handful of buckets instead of comparing against every CV. Only
+    originals are bucketed: a near-duplicate is always reported against
+    the first CV of its group, whatever order later runs see them in.
+    Keys are whatever the caller uses for candidates (a CV id, an email);
+    ``source`` tells batch runs and uploads apart for ``retain``.
+    """
+
+    def __init__(self, path=DEFAULT_DEDUP_PATH, threshold=DEFAULT_THRESHOLD):
+        self.path = str(path)
+        self.threshold = threshold
+        self.bands, self.rows = lsh_bands(threshold)
+        self._lock = threading.Lock()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        params = {"num_perm": NUM_PERM, "shingle": SHINGLE_SIZE, "seed": SEED, "text_prep": TEXT_PREP_VERSION,
+                  "bands": self.bands}
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            stored = dict(conn.execute("SELECT name, value FROM meta").fetchall())
+            if stored != {name: str(value) for name, value in params.items()}:
+                # Signatures or buckets from other settings cannot be compared; start over
+                if stored:
+                    logger.warning("%s was built with other MinHash settings, rebuilding", self.path)
+                conn.executescript("DELETE FROM docs; DELETE FROM bands; DELETE FROM meta;")
+                conn.executemany("INSERT INTO meta (name, value) VALUES (?, ?)",
+                                 [(name, str(value)) for name, value in params.items()])
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _buckets(self, signature):
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            yield band, int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), "little", signed=True)
+
+    def _find(self, conn, key, signature):
+        """Best original above the threshold for ``signature``, ignoring ``key`` itself."""
+        candidates = set()
+        for band, bucket in self._buckets(signature):
+            candidates.update(row[0] for row in conn.execute(
+                "SELECT key FROM bands WHERE band = ? AND bucket = ?", (band, bucket)))
+        candidates.discard(key)
+        best = None
+        for other in sorted(candidates):
+            row = conn.execute("SELECT signature FROM docs WHERE key = ?", (other,)).fetchone()
+            score = similarity(signature, np.frombuffer(row[0], dtype=np.uint32))
+            if score >= self.threshold and (best is None or score > best.similarity):
+                best = Duplicate(other, score)
+        return best
+
+    def check_many(self, items, source, resubmissions=False):
+        """Register ``(key, text)`` pairs in order; returns {key: Duplicate} for the near-duplicates.
+
+        A key seen before with the same text keeps its earlier verdict
+        while its original is still indexed; otherwise it is looked up
+        again. With ``resubmissions`` such a key comes back as
+        ``Duplicate(key, 1.0)`` instead, so uploads can skip saving an
+        unchanged CV twice. Texts may be raw strings or
+        ``text_prep.tokens`` arrays; empty texts are never duplicates.
+        """
+        signed = [(key, minhash(text)) for key, text in items]
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for key, signature in signed:
+                    if signature is None:
+                        self._remove(conn, key)
+                        continue
+                    row = conn.execute("SELECT signature, duplicate_of, similarity FROM docs WHERE key = ?",
+                                       (key,)).fetchone()
+                    if row is not None and row[0] == signature.tobytes():
+                        if resubmissions:
+                            found[key] = Duplicate(key, 1.0)
+                            continue
+                        if row[1] is None:
+                            continue
+                        if conn.execute("SELECT 1 FROM docs WHERE key = ?", (row[1],)).fetchone():
+                            found[key] = Duplicate(row[1], row[2])
+                            continue
+                    self._remove(conn, key)
+                    duplicate = self._find(conn, key, signature)
+                    conn.execute("INSERT INTO docs (key, source, signature, duplicate_of, similarity) "
+                                 "VALUES (?, ?, ?, ?, ?)",
+                                 (key, source, signature.tobytes(), duplicate and duplicate.original,
+                                  duplicate and duplicate.similarity))
+                    if duplicate is None:
+                        conn.executemany("INSERT INTO bands (band, bucket, key) VALUES (?, ?, ?)",
+                                         [(band, bucket, key) for band, bucket in self._buckets(signature)])
+                    else:
+                        found[key] = duplicate
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+        if found:
+            DUPLICATES.inc(len(found), source=source)
+        return found
+
+    def check(self, key, text, source, resubmissions=False):
+        """Register one CV; returns its ``Duplicate`` or None."""
+        return self.check_many([(key, text)], source, resubmissions).get(key)
+
+    def _remove(self, conn, key):
+        conn.execute("DELETE FROM bands WHERE key = ?", (key,))
+        conn.execute("DELETE FROM docs WHERE key = ?", (key,))
+
+    def remove(self, key):
+        with self._lock, self._connect() as conn:
+            self._remove(conn, key)
+
+    def retain(self, source, keys):
+        """Forget every CV of ``source`` not in ``keys`` (e.g. files gone from the CV folder)."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep (key TEXT PRIMARY KEY)")
+                conn.execute("DELETE FROM keep")
+                conn.executemany("INSERT OR IGNORE INTO keep (key) VALUES (?)", ((key,) for key in keys))
+                stale = [row[0] for row in conn.execute(
+                    "SELECT key FROM docs WHERE source = ? AND key NOT IN (SELECT key FROM keep)", (source,))]
+                for key in stale:
+                    self._remove(conn, key)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+        return len(stale)
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
@@ -0,0 +1,165 @@
+import json
+import sys
+import time
+
+
+# Terminal color codes for enhanced display
+class Colors:
+    HEADER = '\033[95m'
+    BLUE = '\033[94m'
+    CYAN = '\033[96m'
+    GREEN = '\033[92m'
+    YELLOW = '\033[93m'
+    RED = '\033[91m'
+    ENDC = '\033[0m'
+    BOLD = '\033[1m'
+    UNDERLINE = '\033[4m'
+
+
+# Animation function for loading effects
+def loading_animation(message, duration=1.5):
+    animation_chars = "|/-\\"
+    end_time = time.time() + duration
+    i = 0
+
+    print()  # Start with empty line
+    while time.time() < end_time:
+        print(f"\r{Colors.CYAN}{message} {animation_chars[i % len(animation_chars)]}{Colors.ENDC}", end="")
+        time.sleep(0.1)
+        i += 1
+
+    print(f"\r{Colors.GREEN}✅ {message} Done!{Colors.ENDC}")
+    time.sleep(0.3)
+
+
+def score_color(score):
+    if score >= 70:
+        return Colors.GREEN
+    elif score >= 50:
+        return Colors.YELLOW
+    return Colors.RED
+
+
+# Animated score bar visualization
+def display_score_bar(score, width=30):
+    filled_width = int(score * width / 100)
+    color = score_color(score)
+    bar = f"{color}{'█' * filled_width}{Colors.ENDC}{'░' * (width - filled_width)}"
+    return f"[{bar}] {color}{score:.2f}%{Colors.ENDC}"
+
+
+def animate_score_bar(score, width=30, steps=10):
+    # Gradually fill the bar
+    print(f"      [{'░' * width}] 0.00%", end="\r")
+    for i in range(steps + 1):
+        print(f"      {display_score_bar(score * i / steps, width)}", end="\r")
+        time.sleep(0.03)
+
+
+def animate_text(text, color, delay):
+    for i in range(len(text) + 1):
+        print(f"\r{color}{Colors.BOLD}{text[:i]}{Colors.ENDC}", end="")
+        time.sleep(delay)
+
+
+class Reporter:
+    """Receives progress from the batch run; the base class stays silent."""
+
+    def start(self, title):
+        pass
+
+    def stage(self, name, message):
+        pass
+
+    def progress(self, stage, done, total, item=""):
+        pass
+
+    def warn(self, message):
+        pass
+
+    def candidate(self, cv_id, matches, threshold):
+        """``matches`` is a list of dicts with jd_id, job_title, score, skill_coverage, invited, already_invited."""
+
+    def finish(self, summary):
+        pass
+
+
+class ConsoleReporter(Reporter):
+    """Colored terminal output; ``animate`` turns on the demo animations."""
+
+    def __init__(self, animate=False):
+        self.animate = animate
+
+    def start(self, title):
+        print("\n")
+        if self.animate:
+            animate_text(title, Colors.HEADER, 0.03)
+        else:
+            print(f"{Colors.HEADER}{Colors.BOLD}{title}{Colors.ENDC}", end="")
+        print("\n" + "=" * len(title))
+
+    def stage(self, name, message):
+        if self.animate and name == "scan":
+            loading_animation(message)
+        else:
+            print(f"{Colors.BLUE}{message}{Colors.ENDC}")
+
+    def progress(self, stage, done, total, item=""):
+        count = f"{done}/{total}" if total else str(done)
+        print(f"\r{Colors.CYAN}⏳ {stage} {count}: {item}{Colors.ENDC}", end="\n" if done == total else "")
+
+    def warn(self, message):
+        print(f"{Colors.RED}⚠️ {message}{Colors.ENDC}")
+
+    def candidate(self, cv_id, matches, threshold):
+        print(f"{Colors.BOLD}{Colors.YELLOW}👤 CANDIDATE {cv_id} TOP MATCHES:{Colors.ENDC}")
+        print(f"{Colors.YELLOW}{'─' * 40}{Colors.ENDC}")
+        for rank, match in enumerate(matches, 1):
+            print(f"   {Colors.BLUE}#{rank}{Colors.ENDC} JD {match['jd_id']} - {Colors.BOLD}{match['job_title']}{Colors.ENDC}")
+            if self.animate:
+                animate_score_bar(match["score"])
+            print(f"      {display_score_bar(match['score'])}")
+            if "skill_coverage" in match:
+                print(f"      Skill coverage: {match['skill_coverage']:.0f}%")
+
+        if any(m["invited"] for m in matches):
+            print(f"\n   {Colors.GREEN}✅ Interview scheduled for Candidate {cv_id}{Colors.ENDC}")
+        elif any(m["already_invited"] for m in matches):
+            print(f"\n   {Colors.BLUE}ℹ️ Candidate {cv_id} was already invited on an earlier run{Colors.ENDC}")
+        else:
+            print(f"\n   {Colors.RED}❌ No interview scheduled for Candidate {cv_id} (all scores < {threshold}%){Colors.ENDC}")
+        print(f"{Colors.YELLOW}{'─' * 40}{Colors.ENDC}\n")
+        if self.animate:
+            time.sleep(0.3)  # Pause between candidates
+
+    def finish(self, summary):
+        print(f"{Colors.HEADER}{'=' * 50}{Colors.ENDC}")
+        completion_msg = "🎉 ALL PROCESSING COMPLETED SUCCESSFULLY! 🎉"
+        if self.animate:
+            animate_text(completion_msg, Colors.GREEN, 0.02)
+            print("\n")
+        else:
+            print(f"{Colors.GREEN}{Colors.BOLD}{completion_msg}{Colors.ENDC}\n")
+
+
+class JsonReporter(Reporter):
+    """One JSON object per line, for cron logs and CI."""
+
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+
+    def _emit(self, event, **fields):
+        self.stream.write(json.dumps({"event": event, "ts": round(time.time(), 3), **fields}) + "\n")
+        self.stream.flush()
+
+    def stage(self, name, message):
+        self._emit("stage", stage=name, message=message)
+
+    def progress(self, stage, done, total, item=""):
+        self._emit("progress", stage=stage, done=done, total=total, item=item)
+
+    def warn(self, message):
+        self._emit("warning", message=message)
+
+    def finish(self, summary):
+        self._emit("finish", **summary)
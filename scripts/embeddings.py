@@ -0,0 +1,127 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from jd_summarizer import make_client
+import metrics
+
+DEFAULT_EMBED_MODEL = "nomic-embed-text"
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / "output" / "cache" / "embeddings"
+
+# Weight of the lexical TF-IDF score in the blended score, per --scorer choice
+SCORERS = {"tfidf": 1.0, "embedding": 0.0, "hybrid": 0.5}
+
+CACHE_REQUESTS = metrics.counter("intelliscreen_cache_requests_total", "Cache lookups", ["cache", "result"])
+EMBED_SECONDS = metrics.histogram("intelliscreen_embed_batch_seconds", "Ollama embedding request latency per batch",
+                                  ["model"])
+EMBEDDED = metrics.counter("intelliscreen_texts_embedded_total", "Texts sent to the embedding model", ["model"])
+
+
+def embedding_key(model, text):
+    return hashlib.sha256(f"{model}\0{text or ''}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk cache of float16 embedding vectors keyed by ``embedding_key``."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.npy"
+
+    def get(self, key):
+        try:
+            vector = np.load(self._path(key))
+        except (OSError, ValueError):
+            CACHE_REQUESTS.inc(cache="embedding", result="miss")
+            return None
+        CACHE_REQUESTS.inc(cache="embedding", result="hit")
+        return vector
+
+    def put(self, key, vector):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp.npy")
+        np.save(tmp, np.asarray(vector, dtype=np.float16))
+        os.replace(tmp, path)
+
+
+class Embedder:
+    """Batched text embeddings from Ollama's ``/api/embed``, cached by content.
+
+    Only texts missing from the cache reach the model, ``batch_size`` at a
+    time, so re-embedding an unchanged pool costs file reads, not
+    inference. Vectors are L2-normalised and returned as a float16 matrix;
+    a dot product of two rows is their cosine similarity.
+    """
+
+    def __init__(self, model=DEFAULT_EMBED_MODEL, host=None, batch_size=DEFAULT_BATCH_SIZE, timeout=120,
+                 cache=None):
+        self.model = model
+        self.batch_size = batch_size
+        self.client = make_client(host, timeout)
+        self.cache = EmbeddingCache() if cache is None else cache
+
+    def _embed_batch(self, texts):
+        with EMBED_SECONDS.time(model=self.model):
+            response = self.client.embed(model=self.model, input=texts, truncate=True)
+        EMBEDDED.inc(len(texts), model=self.model)
+        vectors = np.asarray(response["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.where(norms == 0, 1, norms)).astype(np.float16)
+
+    def embed(self, texts):
+        texts = [text or "" for text in texts]
+        keys = [embedding_key(self.model, text) for text in texts]
+        vectors = [self.cache.get(key) if self.cache else None for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector
+                if self.cache:
+                    self.cache.put(keys[i], vector)
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float16)
+        return np.vstack(vectors).astype(np.float16, copy=False)
+
+
+def semantic_scores(cv_vectors, jd_vectors):
+    """(n_cvs, n_jds) cosine similarities in percent, negatives clipped to 0."""
+    scores = np.asarray(cv_vectors, dtype=np.float32) @ np.asarray(jd_vectors, dtype=np.float32).T
+    return np.clip(scores, 0, None) * 100
+
+
+def blend(lexical, semantic, alpha):
+    """``alpha`` * lexical + (1 - ``alpha``) * semantic, both in percent."""
+    if alpha >= 1:
+        return lexical
+    if alpha <= 0:
+        return semantic
+    return alpha * lexical + (1 - alpha) * semantic
+
+
+class HybridScorer:
+    """Drop-in for ``MatchEngine.score_texts`` blending TF-IDF with embeddings.
+
+    The JD embeddings are computed once; each call embeds only the CVs it
+    is given (cache first) and does one dense product.
+    """
+
+    def __init__(self, engine, embedder, jd_texts, alpha=SCORERS["hybrid"]):
+        self.engine = engine
+        self.embedder = embedder
+        self.alpha = alpha
+        self.jd_vectors = embedder.embed(list(jd_texts))
+
+    def score_texts(self, cv_texts):
+        cv_texts = list(cv_texts)
+        lexical = self.engine.score_texts(cv_texts) if self.alpha > 0 else 0
+        semantic = semantic_scores(self.embedder.embed(cv_texts), self.jd_vectors) if self.alpha < 1 else 0
+        return blend(lexical, semantic, self.alpha)
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import metrics
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / "output" / "cache" / "cv_text"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+CACHE_REQUESTS = metrics.counter("intelliscreen_cache_requests_total", "Cache lookups", ["cache", "result"])
+
+
+def content_key(pdf_bytes, parser_version):
+    """Cache key for a PDF: hash of its bytes plus the extractor version."""
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    return f"{parser_version}-{digest}"
+
+
+class ExtractionCache:
+    """On-disk cache of extracted CV text, keyed by PDF content hash.
+
+    Each entry is a small JSON file holding the text and page count.
+    Reads refresh the file's mtime, and when the cache grows past
+    ``max_bytes`` the least recently used entries are evicted. Bumping the
+    extractor version changes every key, so old entries are simply never
+    hit again; ``purge_stale`` reclaims their space.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size = sum(st.st_size for st, _ in self._stats())
+
+    def _entries(self):
+        return self.cache_dir.glob("*/*.json")
+
+    def _stats(self):
+        """(stat, path) for every entry; entries another process deletes meanwhile are skipped."""
+        for path in self._entries():
+            try:
+                yield path.stat(), path
+            except FileNotFoundError:
+                continue
+
+    def _path(self, key):
+        return self.cache_dir / key[-2:] / f"{key}.json"
+
+    def get(self, key):
+        """Return (text, pages) for ``key`` or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            CACHE_REQUESTS.inc(cache="cv_text", result="miss")
+            return None
+        CACHE_REQUESTS.inc(cache="cv_text", result="hit")
+        return entry["text"], entry["pages"]
+
+    def put(self, key, text, pages):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "text": text, "pages": pages}, f)
+        size = tmp.stat().st_size
+        with self._lock:
+            try:
+                size -= path.stat().st_size  # overwriting an entry frees the old one
+            except FileNotFoundError:
+                pass
+            os.replace(tmp, path)
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used entries until we are under 90% of the limit.
+        entries = sorted(self._stats(), key=lambda e: e[0].st_mtime)
+        self._size = sum(st.st_size for st, _ in entries)
+        target = self.max_bytes * 0.9
+        for st, path in entries:
+            if self._size <= target:
+                break
+            try:
+                path.unlink()
+                self._size -= st.st_size
+            except OSError:
+                pass
+
+    def purge_stale(self, parser_version):
+        """Delete entries written by any other extractor version."""
+        removed = 0
+        for path in list(self._entries()):
+            if not path.name.startswith(f"{parser_version}-"):
+                size = path.stat().st_size
+                path.unlink()
+                self._size -= size
+                removed += 1
+        return removed
+
+    def clear(self):
+        for path in list(self._entries()):
+            path.unlink()
+        self._size = 0
@@ -1,10 +1,6 @@
 import os
-import pyrebase
-import firebase_admin
 from dotenv import load_dotenv
 
-from firebase_admin import credentials, firestore
-
 # Load environment variables from .env file
 load_dotenv()
 
@@ -19,12 +15,22 @@ firebase_config = {
     "appId": os.getenv("FIREBASE_APP_ID")
 }
 
-# Initialize Pyrebase
-firebase = pyrebase.initialize_app(firebase_config)
-auth = firebase.auth()
+_auth = None
+
+# Pyrebase auth client, initialised on first use
+def get_auth():
+    global _auth
+    if _auth is None:
+        import pyrebase
+
+        _auth = pyrebase.initialize_app(firebase_config).auth()
+    return _auth
 
 # Initialize Firebase Admin SDK for Firestore
 def init_firestore():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
     if not firebase_admin._apps:
         cred = credentials.Certificate("scripts/firebase_credentials.json")
         firebase_admin.initialize_app(cred)
@@ -33,7 +39,7 @@ def init_firestore():
 # Login user with Firebase Auth
 def login_user(email, password):
     try:
-        user = auth.sign_in_with_email_and_password(email, password)
+        user = get_auth().sign_in_with_email_and_password(email, password)
         return user, None
     except Exception as e:
         error_message = parse_firebase_error(e)
@@ -42,7 +48,7 @@ def login_user(email, password):
 # Send password reset email
 def send_password_reset(email):
     try:
-        auth.send_password_reset_email(email)
+        get_auth().send_password_reset_email(email)
         return "Password reset email sent!"
     except Exception as e:
         return parse_firebase_error(e)
@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+
+import metrics
+
+# Firestore rejects batched writes with more than 500 operations.
+MAX_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+COMMIT_SECONDS = metrics.histogram("intelliscreen_firestore_commit_seconds", "Firestore batch commit latency")
+COMMITS = metrics.counter("intelliscreen_firestore_commits_total", "Firestore batch commits, by outcome", ["result"])
+WRITES = metrics.counter("intelliscreen_firestore_writes_total", "Firestore document writes committed")
+
+
+class BatchWriter:
+    """Buffer Firestore writes and commit them as batched writes.
+
+    ``set``, ``add`` and ``delete`` only queue an operation; the buffer is
+    committed in chunks of ``batch_size`` once it fills up, every
+    ``flush_interval`` seconds from a background thread if one is given,
+    and on ``flush()``/``close()``. Each chunk is atomic, so a failed chunk is
+    retried as a whole with exponential backoff while chunks that already
+    committed are not resent. Use it as a context manager so the tail of
+    the buffer is always written.
+    """
+
+    def __init__(self, db, batch_size=MAX_BATCH_SIZE, flush_interval=None, max_retries=3, backoff=0.5):
+        if not 0 < batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+        self.db = db
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.written = 0
+        self._ops = []
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._timer = None
+        if flush_interval:
+            self._timer = threading.Thread(target=self._flush_periodically, args=(flush_interval,), daemon=True)
+            self._timer.start()
+
+    def set(self, collection, doc_id, data, merge=False):
+        self._queue(("set", self.db.collection(collection).document(str(doc_id)), data, merge))
+
+    def add(self, collection, data):
+        # document() with no id allocates an auto-id client side, like collection.add().
+        self._queue(("set", self.db.collection(collection).document(), data, False))
+
+    def delete(self, collection, doc_id):
+        self._queue(("delete", self.db.collection(collection).document(str(doc_id)), None, False))
+
+    def increment(self, collection, doc_id, fields):
+        """Queue server-side increments of numeric ``fields`` (nested maps allowed)."""
+        from firebase_admin import firestore
+
+        def wrap(values):
+            return {k: wrap(v) if isinstance(v, dict) else firestore.Increment(v) for k, v in values.items()}
+        self.set(collection, doc_id, wrap(fields), merge=True)
+
+    def _queue(self, op):
+        with self._lock:
+            self._ops.append(op)
+            full = len(self._ops) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Commit everything buffered so far; returns the number of writes."""
+        with self._lock:
+            ops, self._ops = self._ops, []
+            committed = 0
+            for start in range(0, len(ops), self.batch_size):
+                chunk = ops[start:start + self.batch_size]
+                try:
+                    self._commit_with_retry(chunk)
+                except Exception:
+                    # Keep what did not make it so a later flush can retry it.
+                    self._ops = ops[start:] + self._ops
+                    raise
+                committed += len(chunk)
+            self.written += committed
+            return committed
+
+    def _commit_with_retry(self, chunk):
+        for attempt in range(self.max_retries + 1):
+            batch = self.db.batch()
+            for kind, ref, data, merge in chunk:
+                if kind == "delete":
+                    batch.delete(ref)
+                else:
+                    batch.set(ref, data, merge=merge)
+            try:
+                with COMMIT_SECONDS.time():
+                    batch.commit()
+                COMMITS.inc(result="ok")
+                WRITES.inc(len(chunk))
+                return
+            except Exception as e:
+                COMMITS.inc(result="error")
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logger.warning("Firestore batch commit failed (%s), retrying in %.1fs", e, delay)
+                time.sleep(delay)
+
+    def _flush_periodically(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Periodic Firestore flush failed: %s", e)
+
+    def close(self):
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class NullWriter:
+    """Drop-in for BatchWriter that discards every write, for dry runs."""
+
+    written = 0
+
+    def set(self, collection, doc_id, data, merge=False):
+        pass
+
+    def add(self, collection, data):
+        pass
+
+    def delete(self, collection, doc_id):
+        pass
+
+    def increment(self, collection, doc_id, fields):
+        pass
+
+    def flush(self):
+        return 0
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
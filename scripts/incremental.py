@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+from embeddings import blend, semantic_scores
+from matching import MatchEngine
+from text_prep import TEXT_PREP_VERSION, as_tokens
+
+DEFAULT_STATE_DIR = Path(__file__).resolve().parent.parent / "output" / "match_state"
+
+
+def content_hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _diff(old, new):
+    added = [key for key in new if key not in old]
+    modified = [key for key in new if key in old and old[key] != new[key]]
+    removed = [key for key in old if key not in new]
+    return added, modified, removed
+
+
+class MatchDelta:
+    """What an incremental run changed.
+
+    ``dirty`` is a boolean (n_cvs, n_jds) mask of the score cells that were
+    (re)computed; ``removed_cvs``/``removed_jds`` are the ids whose results
+    should be deleted downstream.
+    """
+
+    def __init__(self, cv_keys, jd_keys, cvs, jds, dirty, old_cv_keys=(), old_jd_keys=()):
+        self.cv_keys = cv_keys
+        self.jd_keys = jd_keys
+        self.old_cv_keys = list(old_cv_keys)
+        self.old_jd_keys = list(old_jd_keys)
+        self.added_cvs, self.modified_cvs, self.removed_cvs = cvs
+        self.added_jds, self.modified_jds, self.removed_jds = jds
+        self.dirty = dirty
+
+    @property
+    def pairs_scored(self):
+        return int(self.dirty.sum())
+
+    def dirty_pairs(self):
+        """Yield ``(row, col)`` of every recomputed score cell."""
+        rows, cols = np.nonzero(self.dirty)
+        return zip(rows.tolist(), cols.tolist())
+
+    def removed_pairs(self):
+        """Yield ``(cv_id, jd_id)`` of every stored result that no longer exists."""
+        removed_cvs = set(self.removed_cvs)
+        for cv_key in self.removed_cvs:
+            for jd_key in self.old_jd_keys:
+                yield cv_key, jd_key
+        for cv_key in self.old_cv_keys:
+            if cv_key in removed_cvs:
+                continue
+            for jd_key in self.removed_jds:
+                yield cv_key, jd_key
+
+    def to_dict(self):
+        return {
+            "cvs": {"added": self.added_cvs, "modified": self.modified_cvs, "removed": self.removed_cvs},
+            "jds": {"added": self.added_jds, "modified": self.modified_jds, "removed": self.removed_jds},
+            "pairs_scored": self.pairs_scored
+        }
+
+
+class MatchState:
+    """Score matrix persisted between runs so only changes are rescored.
+
+    Alongside the scores it keeps the fitted engine and the CV TF-IDF rows,
+    so a changed JD only needs one sparse product against the stored CV
+    matrix and a new CV only needs its own row. The vocabulary and IDF stay
+    those of the last full run; rebuild with ``full=True`` from time to
+    time so they follow the pool.
+
+    With an ``Embedder`` the stored scores are the blend of TF-IDF and
+    embedding similarity, and the CV embeddings are kept alongside the
+    TF-IDF rows. Changing the scorer forces a full rebuild.
+    """
+
+    def __init__(self, state_dir=DEFAULT_STATE_DIR):
+        import scipy.sparse as sp
+
+        self.state_dir = Path(state_dir)
+        self.cv_hashes, self.jd_hashes = {}, {}
+        self.scores = np.zeros((0, 0), dtype=np.float32)
+        self.cv_matrix = None
+        self.cv_vectors = None
+        self.scorer = {"embed_model": None, "alpha": 1.0}
+        self.engine = None
+        try:
+            with open(self.state_dir / "state.json", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(self.state_dir / "engine.pkl", "rb") as f:
+                self.engine = pickle.load(f)
+            self.scores = np.load(self.state_dir / "scores.npy")
+            self.cv_matrix = sp.load_npz(self.state_dir / "cv_matrix.npz")
+            self.cv_hashes, self.jd_hashes = meta["cvs"], meta["jds"]
+            self.scorer = meta.get("scorer", self.scorer)
+            if meta.get("text_prep") != TEXT_PREP_VERSION:
+                # Stored TF-IDF rows came from another tokenizer: rescore everything.
+                self.engine = None
+            if self.scorer["embed_model"]:
+                self.cv_vectors = np.load(self.state_dir / "cv_vectors.npy")
+        except FileNotFoundError:
+            self.engine = None
+
+    def save(self, delta=None):
+        import scipy.sparse as sp
+
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.state_dir / "engine.pkl", "wb") as f:
+            pickle.dump(self.engine, f)
+        np.save(self.state_dir / "scores.npy", self.scores)
+        sp.save_npz(self.state_dir / "cv_matrix.npz", self.cv_matrix)
+        if self.cv_vectors is not None:
+            np.save(self.state_dir / "cv_vectors.npy", self.cv_vectors)
+        if delta is not None:
+            with open(self.state_dir / "last_delta.json", "w", encoding="utf-8") as f:
+                json.dump(delta.to_dict(), f, indent=2)
+        # state.json goes last: it is what marks the other files as valid.
+        tmp = self.state_dir / "state.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"cvs": self.cv_hashes, "jds": self.jd_hashes, "scorer": self.scorer,
+                       "text_prep": TEXT_PREP_VERSION}, f)
+        os.replace(tmp, self.state_dir / "state.json")
+
+    def rematch(self, cv_texts, jd_texts, full=False, embedder=None, alpha=1.0):
+        """Bring the score matrix up to date with ``{cv_id: text}``/``{jd_id: text}``.
+
+        Returns ``(scores, cv_keys, jd_keys, delta)``; ``scores`` rows and
+        columns follow ``cv_keys`` and ``jd_keys`` (the input dict orders).
+        ``alpha`` is the TF-IDF weight when blending with ``embedder``.
+        """
+        import scipy.sparse as sp
+
+        cv_keys, jd_keys = list(cv_texts), list(jd_texts)
+        new_cv_hashes = {key: content_hash(cv_texts[key]) for key in cv_keys}
+        new_jd_hashes = {key: content_hash(jd_texts[key]) for key in jd_keys}
+        semantic = embedder is not None and alpha < 1
+        scorer = {"embed_model": embedder.model if semantic else None, "alpha": alpha if semantic else 1.0}
+        full = full or self.engine is None or scorer != self.scorer or (semantic and self.cv_vectors is None)
+
+        cvs = _diff(self.cv_hashes, new_cv_hashes)
+        jds = _diff(self.jd_hashes, new_jd_hashes)
+        if full:
+            cv_docs = as_tokens([cv_texts[k] for k in cv_keys])
+            self.engine = MatchEngine().fit([jd_texts[k] for k in jd_keys], cv_docs)
+            self.cv_matrix = self.engine.transform(cv_docs)
+            scores = self.engine.score(self.cv_matrix)
+            dirty = np.ones(scores.shape, dtype=bool)
+            self.cv_vectors = embedder.embed([cv_texts[k] for k in cv_keys]) if semantic else None
+        else:
+            old_rows = {key: i for i, key in enumerate(self.cv_hashes)}
+            old_cols = {key: j for j, key in enumerate(self.jd_hashes)}
+            stale_cvs = set(cvs[0]) | set(cvs[1])
+            stale_jds = set(jds[0]) | set(jds[1])
+
+            # Carry over every cell whose CV and JD are both unchanged.
+            scores = np.zeros((len(cv_keys), len(jd_keys)), dtype=np.float32)
+            dirty = np.ones(scores.shape, dtype=bool)
+            keep_rows = [i for i, key in enumerate(cv_keys) if key not in stale_cvs]
+            keep_cols = [j for j, key in enumerate(jd_keys) if key not in stale_jds]
+            src_rows = [old_rows[cv_keys[i]] for i in keep_rows]
+            src_cols = [old_cols[jd_keys[j]] for j in keep_cols]
+            scores[np.ix_(keep_rows, keep_cols)] = self.scores[np.ix_(src_rows, src_cols)]
+            dirty[np.ix_(keep_rows, keep_cols)] = False
+
+            # Reuse stored CV vectors; only new or edited CVs are transformed.
+            stale_rows = [i for i, key in enumerate(cv_keys) if key in stale_cvs]
+            blocks = [self.cv_matrix[src_rows]]
+            if stale_rows:
+                blocks.append(self.engine.transform([cv_texts[cv_keys[i]] for i in stale_rows]))
+            order = np.argsort(np.array(keep_rows + stale_rows, dtype=np.int64), kind="stable")
+            self.cv_matrix = sp.vstack(blocks).tocsr()[order]
+            if semantic:
+                vectors = [self.cv_vectors[src_rows]]
+                if stale_rows:
+                    vectors.append(embedder.embed([cv_texts[cv_keys[i]] for i in stale_rows]))
+                self.cv_vectors = np.vstack(vectors)[order]
+
+            self.engine.jd_matrix = self.engine.transform([jd_texts[k] for k in jd_keys])
+            if stale_rows:
+                scores[stale_rows] = self.engine.score(self.cv_matrix[stale_rows])
+            stale_cols = [j for j, key in enumerate(jd_keys) if key in stale_jds]
+            if stale_cols:
+                cols = (self.cv_matrix @ self.engine.jd_matrix[stale_cols].T).toarray() * 100
+                scores[:, stale_cols] = cols
+
+        # Recomputed cells hold TF-IDF scores so far; blend in the embeddings
+        if semantic:
+            jd_vectors = embedder.embed([jd_texts[k] for k in jd_keys])
+            similarity = semantic_scores(self.cv_vectors, jd_vectors)
+            scores[dirty] = blend(scores[dirty], similarity[dirty], alpha)
+        self.scorer = scorer
+        self.scores = np.asarray(scores, dtype=np.float32)
+
+        delta = MatchDelta(cv_keys, jd_keys, cvs, jds, dirty, self.cv_hashes, self.jd_hashes)
+        self.cv_hashes, self.jd_hashes = new_cv_hashes, new_jd_hashes
+        return self.scores, cv_keys, jd_keys, delta
@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import metrics
+from summary_cache import prompt_key
+
+DEFAULT_MODEL = "gemma:2b"
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 120  # seconds per request
+
+logger = logging.getLogger(__name__)
+
+LLM_REQUESTS = metrics.counter("intelliscreen_llm_requests_total", "Ollama chat requests, by outcome", ["model", "result"])
+LLM_SECONDS = metrics.histogram("intelliscreen_llm_request_seconds", "Ollama chat request latency", ["model"])
+LLM_TOKENS = metrics.counter("intelliscreen_llm_tokens_total", "Tokens reported by Ollama", ["model", "kind"])
+
+
+def make_client(host=None, timeout=DEFAULT_TIMEOUT):
+    """Ollama client with a per-request timeout.
+
+    ``host`` defaults to ``OLLAMA_HOST`` (or the local server), so pointing
+    it at a stub server is enough to run the pipeline without a model.
+    """
+    import ollama
+
+    return ollama.Client(host=host or os.getenv("OLLAMA_HOST"), timeout=timeout)
+
+
+def summarize(client, prompt, model=DEFAULT_MODEL, options=None, retries=3, backoff=1.0):
+    """Run one chat request, retrying failures with exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            with LLM_SECONDS.time(model=model):
+                response = client.chat(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    options=options
+                )
+            LLM_REQUESTS.inc(model=model, result="ok")
+            LLM_TOKENS.inc(response.get("prompt_eval_count") or 0, model=model, kind="prompt")
+            LLM_TOKENS.inc(response.get("eval_count") or 0, model=model, kind="completion")
+            return response["message"]["content"]
+        except Exception as e:
+            LLM_REQUESTS.inc(model=model, result="error")
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            logger.warning("Ollama request failed (%s), retrying in %.1fs", e, delay)
+            time.sleep(delay)
+
+
+def summarize_all(jobs, prompt_template, model=DEFAULT_MODEL, options=None, concurrency=DEFAULT_CONCURRENCY,
+                  timeout=DEFAULT_TIMEOUT, retries=3, backoff=1.0, host=None, cache=None):
+    """Summarize many JDs concurrently, yielding results as they complete.
+
+    ``jobs`` is an iterable of ``(jd_id, job_title, jd_text)`` and each
+    prompt is ``prompt_template.format(job_title=..., jd_text=...)``.
+    Yields ``(jd_id, summary, error)`` where exactly one of ``summary`` and
+    ``error`` is set. At most ``concurrency`` requests are in flight; the
+    Ollama server only runs them in parallel up to its own
+    ``OLLAMA_NUM_PARALLEL`` setting, so keep the two in line.
+
+    With a ``SummaryCache``, JDs whose model, options and rendered prompt
+    were summarized before are answered from it without calling Ollama.
+    """
+    client = make_client(host, timeout)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {}
+        for jd_id, job_title, jd_text in jobs:
+            prompt = prompt_template.format(job_title=job_title, jd_text=jd_text)
+            key = prompt_key(model, options, prompt) if cache is not None else None
+            summary = cache.get(key) if key is not None else None
+            if summary is not None:
+                yield jd_id, summary, None
+                continue
+            futures[pool.submit(summarize, client, prompt, model, options, retries, backoff)] = (jd_id, key)
+
+        for future in as_completed(futures):
+            jd_id, key = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                yield jd_id, None, f"{type(e).__name__}: {e}"
+                continue
+            if key is not None:
+                cache.put(key, summary)
+            yield jd_id, summary, None
+
+
+class SummaryStore:
+    """JSON file of summaries keyed by JD id, rewritten after every update.
+
+    Each ``save`` replaces the file atomically, so a crash mid-run keeps
+    every summary finished so far. With ``load_existing=False`` the file
+    is rebuilt from scratch rather than extended. A run can work on a
+    side file and ``publish`` it over the real one once it is complete.
+    """
+
+    def __init__(self, path, load_existing=True):
+        self.path = path
+        self._lock = threading.Lock()
+        self.records = {}
+        if not load_existing:
+            return
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.records = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.records = {}
+
+    def __contains__(self, jd_id):
+        return str(jd_id) in self.records
+
+    def save(self, jd_id, record):
+        with self._lock:
+            self.records[str(jd_id)] = record
+            self._write(self.path)
+
+    def publish(self, path):
+        """Atomically replace ``path`` with every record and remove this store's own file."""
+        with self._lock:
+            self._write(path)
+            if os.path.abspath(path) != os.path.abspath(self.path):
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+
+    def _write(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.records, f, indent=2)
+        os.replace(tmp, path)
@@ -1,110 +1,145 @@
-import os
-import time
+import argparse
+import csv
 import datetime
+import json
 import logging
+import os
+import sys
 import warnings
-import requests
-from collections import defaultdict
-
-import pdfplumber
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-
-import firebase_admin
-from firebase_admin import credentials, firestore
-import ollama
-
-# Terminal color codes for enhanced display
-class Colors:
-    HEADER = '\033[95m'
-    BLUE = '\033[94m'
-    CYAN = '\033[96m'
-    GREEN = '\033[92m'
-    YELLOW = '\033[93m'
-    RED = '\033[91m'
-    ENDC = '\033[0m'
-    BOLD = '\033[1m'
-    UNDERLINE = '\033[4m'
-
-# Initialize Firebase
-cred = credentials.Certificate("firebase_credentials.json")
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+from itertools import islice
+
+import numpy as np
+
+from cv_index import CVIndex
+from cv_ingest import find_email, iter_parse, list_cv_files
+from dedup import DEDUP_MODES, DEFAULT_THRESHOLD, DedupIndex
+from embeddings import DEFAULT_EMBED_MODEL, SCORERS, Embedder, HybridScorer
+from demo_display import ConsoleReporter, JsonReporter, Reporter
+from extraction_cache import ExtractionCache
+from firestore_writer import BatchWriter, NullWriter
+from incremental import MatchState
+from jd_summarizer import DEFAULT_CONCURRENCY, summarize_all
+from matching import MatchEngine, top_k
+import metrics
+from outbox import Dispatcher, FileTransport, Outbox, invite_key
+from result_store import ResultStore
+from skills import SkillGate, bitsets, coverage, jd_bitsets
+import stats
+from streaming import RESULT_FIELDS, ResultSink, chunked, iter_cv_files, score_stream
+from summary_cache import SummaryCache
 
 # Suppress warnings and noisy logs
 warnings.filterwarnings("ignore")
 logging.getLogger("httpx").setLevel(logging.WARNING)
-logging.basicConfig(level=logging.INFO, format='%(message)s')
 
-SCORE_THRESHOLD = 30  # Minimum score for scheduling interview
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SCRIPT_DIR, "..", "data")
+
+# Share of CV-JD pairs invited when no --threshold is given. Scores are
+# cosines under one IDF fitted over the whole corpus, so their scale moves
+# with the corpus (the old per-pair TF-IDF topped out near 40%, the batch
+# engine near 15% on the sample data); 7% is the share the old fixed 30% cut
+# invited on the sample.
+INVITE_TOP_PERCENT = 7.0
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_PARTIAL = 3  # finished, but some CVs or JDs could not be processed
 
 
 # ------------------- 🔍 UTILITY FUNCTIONS -------------------
 
-# Animation function for loading effects
-def loading_animation(message, duration=1.5):
-    animation_chars = "|/-\\"
-    end_time = time.time() + duration
-    i = 0
-    
-    print()  # Start with empty line
-    while time.time() < end_time:
-        print(f"\r{Colors.CYAN}{message} {animation_chars[i % len(animation_chars)]}{Colors.ENDC}", end="")
-        time.sleep(0.1)
-        i += 1
-    
-    print(f"\r{Colors.GREEN}✅ {message} Done!{Colors.ENDC}")
-    time.sleep(0.3)
-
-# ✅ Function to summarize JD using Ollama
-def summarize_jd(jd_text, jd_id, job_title):
-    doc_ref = db.collection("jobs").document(str(jd_id))
-    existing_doc = doc_ref.get()
-
-    if existing_doc.exists:
-        return existing_doc.to_dict().get("summary", "")
-
-    loading_animation(f"Summarizing job {jd_id}: {job_title}")
-    
-    prompt = f"Summarize this job description into key skills, experience, and qualifications:\n\n{jd_text}"
-    response = ollama.chat(model="gemma:2b", messages=[{"role": "user", "content": prompt}])
-    summary = response["message"]["content"]
-
-    doc_ref.set({
-        "job_title": job_title,
-        "jd_text": jd_text,
-        "summary": summary
+_db = None
+
+
+# ✅ Firestore client, initialised on first use
+def get_db():
+    global _db
+    if _db is None:
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(credentials.Certificate("firebase_credentials.json"))
+        _db = firestore.client()
+    return _db
+
+
+def open_writer(db, **kwargs):
+    return BatchWriter(db, **kwargs) if db is not None else NullWriter()
+
+
+SUMMARY_PROMPT = "Summarize this job description into key skills, experience, and qualifications:\n\n{jd_text}"
+
+
+# ✅ Summarize JDs using Ollama, several at a time
+@metrics.timed("summarize")
+def summarize_jds(db, jobs, reporter, concurrency=DEFAULT_CONCURRENCY):
+    """Return {jd_id: summary} for ``jobs`` given as (jd_id, job_title, jd_text).
+
+    Summaries come from the shared summary cache whenever the JD text and
+    prompt are unchanged; only new or edited JDs are sent to Ollama,
+    concurrently. Every summary is mirrored to ``jobs/{jd_id}`` in Firestore.
+    """
+    jobs = {jd_id: (jd_id, job_title, jd_text) for jd_id, job_title, jd_text in jobs}
+    summaries = {}
+
+    reporter.stage("summarize", f"🧠 Summarizing {len(jobs)} job(s) with up to {concurrency} parallel requests")
+    with open_writer(db, flush_interval=5) as writer:
+        results = summarize_all(jobs.values(), SUMMARY_PROMPT, concurrency=concurrency, cache=SummaryCache())
+        for jd_id, summary, error in results:
+            _, job_title, jd_text = jobs[jd_id]
+            if error:
+                reporter.warn(f"Could not summarize job {jd_id}: {error}")
+                summaries[jd_id] = ""
+                continue
+            writer.set("jobs", jd_id, {
+                "job_title": job_title,
+                "jd_text": jd_text,
+                "summary": summary
+            })
+            summaries[jd_id] = summary
+
+    return summaries
+
+
+# ✅ Save a candidate's CV text once
+def save_candidate(writer, cv_id, cv_file, cv_text):
+    writer.set("candidates", f"cv{cv_id}", {
+        "cv_id": cv_id,
+        "cv_file": cv_file,
+        "cv_text": cv_text
     })
 
-    return summary
 
+# ✅ Mark a candidate as a near-duplicate of an earlier CV
+def flag_duplicate(writer, cv_id, duplicate):
+    writer.set("candidates", f"cv{cv_id}", {
+        "duplicate_of": duplicate.original,
+        "duplicate_similarity": round(duplicate.similarity, 3)
+    }, merge=True)
 
-# ✅ Parse CV from PDF
-def parse_cv(pdf_path):
-    with pdfplumber.open(pdf_path) as pdf:
-        return "\n".join(page.extract_text() or "" for page in pdf.pages)
 
+# ✅ Delete a CV-JD match that no longer exists
+def delete_match(writer, jd_id, cv_id):
+    writer.delete("matches", f"cv{cv_id}_jd{jd_id}")
 
-# ✅ Match CV with JD using TF-IDF
-def match_candidate(jd_summary, cv_text, jd_id, cv_id):
-    vectorizer = TfidfVectorizer()
-    tfidf_matrix = vectorizer.fit_transform([jd_summary, cv_text])
-    score = cosine_similarity(tfidf_matrix[0], tfidf_matrix[1])[0][0] * 100
 
-    doc_ref = db.collection("candidates").document(f"cv{cv_id}_jd{jd_id}")
-    doc_ref.set({
+# ✅ Save a CV-JD match score
+def save_match(writer, jd_id, cv_id, score):
+    writer.set("matches", f"cv{cv_id}_jd{jd_id}", {
         "cv_id": cv_id,
-        "cv_text": cv_text,
         "jd_id": jd_id,
-        "score": score
+        "score": float(score)
     })
 
     return score
 
 
-# ✅ Schedule interview if score is good
-def schedule_interview(cv_id, jd_id, score):
+# ✅ Schedule interview if score is good; the email goes out through the outbox
+def schedule_interview(writer, outbox, cv_id, jd_id, score, email):
+    """Invite ``email``; returns False (and writes nothing) if this pair was already invited."""
     interview_date = datetime.datetime.now() + datetime.timedelta(days=2)
     email_content = (
         f"Email: Dear Candidate {cv_id},\n\n"
@@ -113,145 +148,464 @@ def schedule_interview(cv_id, jd_id, score):
         f"Best Regards,\nHR Team"
     )
 
-    email_ref = db.collection("interviews").document(f"cv{cv_id}_jd{jd_id}")
-    email_ref.set({
+    if not outbox.enqueue(invite_key(cv_id, jd_id), email_content, email,
+                          subject=f"Interview Invitation: Job {jd_id}", channel=FileTransport.channel):
+        return False
+    writer.set("interviews", f"cv{cv_id}_jd{jd_id}", {
         "cv_id": cv_id,
         "jd_id": jd_id,
+        "email": email,
         "email_content": email_content,
         "interview_date": interview_date,
-        "score": score
+        "score": float(score)
     })
+    return True
 
-    email_path = f"../output/email_cv{cv_id}_jd{jd_id}.txt"
-    os.makedirs(os.path.dirname(email_path), exist_ok=True)
-    with open(email_path, "w", encoding="utf-8") as f:
-        f.write(email_content)
 
-    return email_content
+# ✅ A CV without an address cannot be invited; say so instead of dropping it silently
+def warn_no_email(reporter, cv_id, email, matches, threshold):
+    if email is None and any(match["score"] >= threshold for match in matches):
+        reporter.warn(f"No email address in CV {cv_id}; its interview invites were skipped")
 
 
-# Animated score bar visualization
-def display_score_bar(score, width=30):
-    filled_width = int(score * width / 100)
-    
-    # Choose color based on score
-    if score >= 70:
-        color = Colors.GREEN
-    elif score >= 50:
-        color = Colors.YELLOW
-    else:
-        color = Colors.RED
-        
-    bar = f"{color}{'█' * filled_width}{Colors.ENDC}{'░' * (width - filled_width)}"
-    return f"[{bar}] {color}{score:.2f}%{Colors.ENDC}"
+# ✅ Score at which a pair is among the run's best --invite-top percent
+def invite_threshold(scores, top_percent=INVITE_TOP_PERCENT):
+    """Percentile cut over this run's non-zero ``scores``; infinite when there are none."""
+    scores = np.asarray(scores, dtype=np.float64).ravel()
+    scores = scores[scores > 0]
+    if not scores.size:
+        return float("inf")
+    return float(np.percentile(scores, 100 - top_percent))
 
 
 # ------------------- 🚀 MAIN EXECUTION -------------------
 
-def animate_title():
-    title = "HR CANDIDATE MATCHING SYSTEM"
-    print("\n")
-    for i in range(len(title) + 1):
-        print(f"\r{Colors.HEADER}{Colors.BOLD}{title[:i]}{Colors.ENDC}", end="")
-        time.sleep(0.03)
-    print("\n" + "=" * len(title))
-    time.sleep(0.5)
-
-animate_title()
-
-data_dir = "../data"
-cv_folder = os.path.join(data_dir, "CVs1")
-jd_df = pd.read_csv(os.path.join(data_dir, "job_description.csv"), encoding='ISO-8859-1')
-print(f"{Colors.BLUE}✅ Loaded {Colors.BOLD}{len(jd_df)}{Colors.ENDC}{Colors.BLUE} Job Descriptions.{Colors.ENDC}")
-
-loading_animation("Scanning CV directory")
-cv_files = sorted([f for f in os.listdir(cv_folder) if f.endswith(".pdf")])[:10]
-
-print(f"{Colors.BLUE}📄 Processing {Colors.BOLD}{len(cv_files)}{Colors.ENDC}{Colors.BLUE} CV files{Colors.ENDC}")
-cv_texts = {}
-for cv_id, cv_file in enumerate(cv_files, 1):
-    print(f"\r{Colors.CYAN}⏳ Parsing CV {cv_id}/{len(cv_files)}: {cv_file}{Colors.ENDC}", end="")
-    cv_texts[cv_id] = parse_cv(os.path.join(cv_folder, cv_file))
-    time.sleep(0.2)  # Small delay for visual effect
-print(f"\n{Colors.GREEN}✅ All CVs parsed successfully!{Colors.ENDC}\n")
-
-all_matches = []
-cv_matches = defaultdict(list)
-
-print(f"{Colors.HEADER}{Colors.BOLD}🔍 Starting CV-JD Matching Process{Colors.ENDC}")
-for index, row in jd_df.iterrows():
-    jd_id = index + 1
-    job_title = row["Job Title"]
-    jd_text = row["Job Description"]
-    
-    print(f"\n{Colors.BLUE}🔍 Processing Job {jd_id}: {Colors.BOLD}{job_title}{Colors.ENDC}")
-    jd_summary = summarize_jd(jd_text, jd_id, job_title)
-
-    for cv_id, cv_text in cv_texts.items():
-        print(f"\r{Colors.CYAN}  Matching CV {cv_id} with Job {jd_id}...{Colors.ENDC}", end="")
-        score = match_candidate(jd_summary, cv_text, jd_id, cv_id)
-        all_matches.append((cv_id, jd_id, job_title, score))
-        cv_matches[cv_id].append((jd_id, job_title, score))
-        time.sleep(0.1)  # Small delay for animation effect
-    
-    print(f"\r{Colors.GREEN}  ✅ Completed matching all CVs with Job {jd_id}{Colors.ENDC}")
-
-# Animated results display
-print(f"\n\n{Colors.HEADER}{Colors.BOLD}📊 FINAL MATCHING RESULTS{Colors.ENDC}")
-print(f"{Colors.HEADER}{'=' * 50}{Colors.ENDC}\n")
-time.sleep(0.5)
-
-for cv_id in sorted(cv_matches):
-    top3 = sorted(cv_matches[cv_id], key=lambda x: x[2], reverse=True)[:3]
-    
-    print(f"{Colors.BOLD}{Colors.YELLOW}👤 CANDIDATE {cv_id} TOP MATCHES:{Colors.ENDC}")
-    print(f"{Colors.YELLOW}{'─' * 40}{Colors.ENDC}")
-    
-    email_sent = False
-    for rank, (jd_id, job_title, score) in enumerate(top3, 1):
-        # Animation effect for each score bar
-        print(f"   {Colors.BLUE}#{rank}{Colors.ENDC} JD {jd_id} - {Colors.BOLD}{job_title}{Colors.ENDC}")
-        
-        # Animate the score bar
-        empty_bar = f"[{'░' * 30}] 0.00%"
-        print(f"      {empty_bar}", end="\r")
-        
-        # Gradually fill the bar
-        steps = 10
-        for i in range(steps + 1):
-            temp_score = score * i / steps
-            filled_width = int(temp_score * 30 / 100)
-            
-            if temp_score >= 70:
-                color = Colors.GREEN
-            elif temp_score >= 50:
-                color = Colors.YELLOW
+def load_jobs(jd_file):
+    """Return [(jd_id, job_title, jd_text)]; ids are 1-based row numbers, as in jd_summaries.json."""
+    import pandas as pd
+
+    jd_df = pd.read_csv(jd_file, encoding='ISO-8859-1')
+    # ✅ Same ids as the app, bulk upload and the service; titles repeat, row numbers don't
+    return [(str(index + 1), row["Job Title"], row["Job Description"]) for index, row in jd_df.iterrows()]
+
+
+@metrics.timed("parse")
+def parse_cvs(cv_files, reporter, workers=None, timeout=60):
+    """Return ({cv_id: text}, failures); the file name (e.g. C1061) is the stable CV id."""
+    cv_texts, failures = {}, []
+    results = iter_parse(cv_files, workers=workers, timeout=timeout, cache=ExtractionCache())
+    for done, result in enumerate(results, 1):
+        reporter.progress("Parsed CV", done, len(cv_files), os.path.basename(result.path))
+        if result.ok:
+            cv_texts[os.path.splitext(os.path.basename(result.path))[0]] = result.text
+        else:
+            failures.append(result)
+    return dict(sorted(cv_texts.items())), failures
+
+
+def make_embedder(args):
+    """(Embedder or None, TF-IDF weight) for the chosen ``--scorer``."""
+    alpha = SCORERS[args.scorer] if args.alpha is None else args.alpha
+    if args.scorer == "tfidf" or alpha >= 1:
+        return None, 1.0
+    return Embedder(model=args.embed_model), alpha
+
+
+def run(args, reporter):
+    """Parse, summarize, score and persist; returns (results, summary)."""
+    db = None if args.no_firestore else get_db()
+
+    jd_rows = load_jobs(args.jd_file)
+    jd_titles = {jd_id: job_title for jd_id, job_title, _ in jd_rows}
+    reporter.stage("load", f"✅ Loaded {len(jd_rows)} Job Descriptions.")
+
+    reporter.stage("scan", "Scanning CV directory")
+    cv_files = list_cv_files(args.cv_dir)[:args.limit]
+    # CVs past --limit are still in the folder: nothing is removed for them and the
+    # incremental state is not saved, so the next complete run starts from the last one
+    partial = args.limit is not None
+    reporter.stage("parse", f"📄 Processing {len(cv_files)} CV files")
+    cv_texts, parse_failures = parse_cvs(cv_files, reporter, args.workers, args.parse_timeout)
+    for failure in parse_failures:
+        reporter.warn(f"Could not parse {os.path.basename(failure.path)}: {failure.error}")
+
+    # Re-applications and resent files are caught before indexing and scoring
+    duplicates = {}
+    if args.dedup != "off":
+        with metrics.timed("dedup"):
+            dedup = DedupIndex(threshold=args.dedup_threshold)
+            if not partial:
+                dedup.retain("batch", cv_texts)
+            duplicates = dedup.check_many(cv_texts.items(), "batch")
+        reporter.stage("dedup", f"🧬 {len(duplicates)} near-duplicate CV(s) "
+                                f"{'merged into' if args.dedup == 'merge' else 'flagged against'} earlier ones")
+        if args.dedup == "merge":
+            for cv_id, duplicate in duplicates.items():
+                reporter.warn(f"{cv_id} is a near-duplicate of {duplicate.original}; not scored (--dedup merge)")
+            cv_texts = {cv_id: text for cv_id, text in cv_texts.items() if cv_id not in duplicates}
+
+    reporter.stage("summarize", "🔍 Starting CV-JD Matching Process")
+    jd_summaries = summarize_jds(db, jd_rows, reporter, args.concurrency)
+    failed_jds = [jd_id for jd_id, summary in jd_summaries.items() if not summary]
+
+    # Only new or changed CVs/JDs are rescored; --full rebuilds everything
+    match_state = MatchState()
+    old_scores, old_jd_ids = match_state.scores, list(match_state.jd_hashes)
+    embedder, alpha = make_embedder(args)
+    with metrics.timed("match"):
+        scores, cv_ids, jd_ids, delta = match_state.rematch(cv_texts, jd_summaries, full=args.full,
+                                                            embedder=embedder, alpha=alpha)
+    # Every run's full matrix is kept locally for analysis and bulk sync
+    store = ResultStore()
+    with metrics.timed("store"):
+        result_run = store.save(cv_ids, jd_ids, scores, mode="batch", scorer=args.scorer,
+                                full=args.full or delta.pairs_scored == scores.size)
+        store.prune(args.keep_runs)
+    reporter.stage("match", f"🧮 Scored {delta.pairs_scored} of {scores.size} CV-JD pairs "
+                            f"(CVs +{len(delta.added_cvs)} ~{len(delta.modified_cvs)} -{len(delta.removed_cvs)}, "
+                            f"JDs +{len(delta.added_jds)} ~{len(delta.modified_jds)} -{len(delta.removed_jds)})")
+
+    # Keep the candidate search index in step with the CV folder: edited CVs
+    # are re-indexed, deleted ones dropped, and a new or wiped index filled
+    with metrics.timed("index"):
+        cv_index = CVIndex()
+        changed = set(delta.added_cvs) | set(delta.modified_cvs)
+        cv_index.add_documents([(f"{cv_id}.pdf", cv_texts[cv_id]) for cv_id in cv_ids
+                                if cv_id in changed or f"{cv_id}.pdf" not in cv_index])
+        if delta.removed_cvs and not partial:
+            cv_index.remove(*(f"{cv_id}.pdf" for cv_id in delta.removed_cvs))
+
+    # Pairs short of --min-skill-coverage are neither ranked nor invited; the
+    # stored matrix keeps every score so changing the cut needs no rescoring
+    with metrics.timed("skills"):
+        skill_cov = coverage(bitsets([cv_texts[cv_id] for cv_id in cv_ids]),
+                             jd_bitsets([jd_summaries[jd_id] for jd_id in jd_ids]))
+    qualified = skill_cov >= args.min_skill_coverage
+    # Unchanged cells count too, so the cut does not drift with the size of the delta
+    threshold = args.threshold if args.threshold is not None else invite_threshold(scores[qualified], args.invite_top)
+
+    # Invites are queued and written out by a background dispatcher
+    outbox = Outbox()
+    dispatcher = Dispatcher(outbox, FileTransport(), rate=args.email_rate).start()
+
+    results = []
+    with metrics.timed("persist"), open_writer(db) as writer:
+        if not partial:
+            for cv_id in delta.removed_cvs:
+                writer.delete("candidates", f"cv{cv_id}")
+            for cv_id, jd_id in delta.removed_pairs():
+                delete_match(writer, jd_id, cv_id)
+        for cv_id in delta.added_cvs + delta.modified_cvs:
+            save_candidate(writer, cv_id, f"{cv_id}.pdf", cv_texts[cv_id])
+        if args.dedup == "flag":
+            for cv_id, duplicate in duplicates.items():
+                flag_duplicate(writer, cv_id, duplicate)
+        for row, col in delta.dirty_pairs():
+            save_match(writer, jd_ids[col], cv_ids[row], scores[row, col])
+        if not partial:
+            # A partial run's changes are counted by the next complete run, which sees them again
+            stats.record_counts(writer, candidates=len(delta.added_cvs) - len(delta.removed_cvs))
+            stats.record_score_matrix_change(writer, old_scores, old_jd_ids, scores, jd_ids)
+
+        reporter.stage("results", "📊 FINAL MATCHING RESULTS")
+        for row, cols in enumerate(top_k(np.where(qualified, scores, -1.0), args.top_k)):
+            cv_id = cv_ids[row]
+            email = find_email(cv_texts[cv_id])
+            matches = []
+            for rank, col in enumerate(cols[qualified[row, cols]], 1):
+                jd_id, score = jd_ids[col], float(scores[row, col])
+                due = score >= threshold and email is not None
+                # The outbox remembers every invite key, so pairs invited on an earlier run come back False
+                invited = due and schedule_interview(writer, outbox, cv_id, jd_id, score, email)
+                matches.append({
+                    "cv_id": cv_id,
+                    "rank": rank,
+                    "jd_id": jd_id,
+                    "job_title": jd_titles[jd_id],
+                    "score": round(score, 2),
+                    "skill_coverage": round(float(skill_cov[row, col]), 1),
+                    "invited": invited,
+                    "already_invited": due and not invited
+                })
+            warn_no_email(reporter, cv_id, email, matches, threshold)
+            reporter.candidate(cv_id, matches, round(threshold, 2))
+            results.extend(matches)
+        stats.record_counts(writer, interviews=sum(m["invited"] for m in results))
+
+    if not partial:
+        with metrics.timed("save_state"):
+            match_state.save(delta)
+    with metrics.timed("email_drain"):
+        dispatcher.stop(drain=True, timeout=60)
+    summary = {
+        "cvs": len(cv_ids),
+        "jds": len(jd_ids),
+        "pairs_scored": delta.pairs_scored,
+        "interviews": sum(m["invited"] for m in results),
+        "invite_threshold": round(threshold, 2),
+        "skill_qualified_pairs": int(qualified.sum()),
+        "records_written": writer.written,
+        "emails": outbox.counts(FileTransport.channel),
+        "run_id": result_run.run_id,
+        "parse_failures": [os.path.basename(f.path) for f in parse_failures],
+        "summary_failures": failed_jds,
+        "duplicates": {cv_id: duplicate.original for cv_id, duplicate in duplicates.items()},
+        "delta": delta.to_dict()
+    }
+    return results, summary
+
+
+def run_stream(args, reporter, sink=None):
+    """Constant-memory variant of ``run`` for very large CV folders.
+
+    CVs flow parse -> score -> top-k -> persist in chunks of
+    ``--chunk-size``; only the JD matrix and the current chunk are held,
+    and matches go to ``sink`` as they are produced instead of being
+    returned. The engine is fitted on the JD summaries alone (as in the
+    app), there is no incremental state, and only each CV's top-k matches
+    are stored. The dashboard counters are bumped by what each chunk writes.
+    """
+    db = None if args.no_firestore else get_db()
+
+    jd_rows = load_jobs(args.jd_file)
+    jd_titles = {jd_id: job_title for jd_id, job_title, _ in jd_rows}
+    reporter.stage("load", f"✅ Loaded {len(jd_rows)} Job Descriptions.")
+
+    jd_summaries = summarize_jds(db, jd_rows, reporter, args.concurrency)
+    failed_jds = [jd_id for jd_id, summary in jd_summaries.items() if not summary]
+    jd_ids = [jd_id for jd_id, summary in jd_summaries.items() if summary]
+    engine = MatchEngine().fit([jd_summaries[jd_id] for jd_id in jd_ids])
+    embedder, alpha = make_embedder(args)
+    if embedder is not None:
+        engine = HybridScorer(engine, embedder, [jd_summaries[jd_id] for jd_id in jd_ids], alpha)
+    # CVs short of --min-skill-coverage for every JD are never scored
+    engine = SkillGate(engine, jd_bitsets([jd_summaries[jd_id] for jd_id in jd_ids]), args.min_skill_coverage)
+
+    reporter.stage("parse", f"📄 Streaming CVs from {args.cv_dir} in chunks of {args.chunk_size}")
+    cv_files = islice(iter_cv_files(args.cv_dir), args.limit)
+    parsed = iter_parse(cv_files, workers=args.workers, timeout=args.parse_timeout, cache=ExtractionCache())
+    dedup = DedupIndex(threshold=args.dedup_threshold) if args.dedup != "off" else None
+    seen, duplicates, duplicate_ids, flagged = [], 0, {}, {}
+
+    def drop_duplicates(parsed):
+        # Checked a chunk at a time so the LSH index is updated in one transaction per chunk
+        nonlocal duplicates
+        for chunk in chunked(parsed, args.chunk_size):
+            ok = {os.path.splitext(os.path.basename(r.path))[0]: r.text for r in chunk if r.ok}
+            seen.extend(ok)
+            found = dedup.check_many(ok.items(), "batch")
+            duplicates += len(found)
+            for cv_id, duplicate in islice(found.items(), max(0, 100 - len(duplicate_ids))):
+                duplicate_ids[cv_id] = duplicate.original
+            if args.dedup == "flag":
+                flagged.update(found)
             else:
-                color = Colors.RED
-                
-            temp_bar = f"{color}{'█' * filled_width}{Colors.ENDC}{'░' * (30 - filled_width)}"
-            print(f"      [{temp_bar}] {color}{temp_score:.2f}%{Colors.ENDC}", end="\r")
-            time.sleep(0.03)
-        
-        # Final score bar
-        print(f"      {display_score_bar(score)}")
-        
-        if score >= SCORE_THRESHOLD:
-            schedule_interview(cv_id, jd_id, score)
-            email_sent = True
-    
-    if email_sent:
-        print(f"\n   {Colors.GREEN}✅ Interview scheduled for Candidate {cv_id}{Colors.ENDC}")
+                for cv_id, duplicate in found.items():
+                    reporter.warn(f"{cv_id} is a near-duplicate of {duplicate.original}; not scored (--dedup merge)")
+            for result in chunk:
+                if args.dedup != "merge" or os.path.splitext(os.path.basename(result.path))[0] not in found:
+                    yield result
+
+    if dedup is not None:
+        parsed = drop_duplicates(parsed)
+
+    outbox = Outbox()
+    dispatcher = Dispatcher(outbox, FileTransport(), rate=args.email_rate).start()
+    store = ResultStore()
+    run_writer = store.new_run(jd_ids, mode="stream", scorer=args.scorer)
+
+    chunk_coverage = {}
+    threshold = args.threshold
+    chunk_counts = {"candidates": 0, "interviews": 0}
+    chunk_matches = []
+
+    def record_chunk():
+        # Counters go out once per chunk, in the same writer as the chunk's documents
+        stats.record_counts(writer, **chunk_counts)
+        stats.record_matches(writer, chunk_matches)
+        chunk_counts.update(candidates=0, interviews=0)
+        chunk_matches.clear()
+
+    def store_scores(results, scores):
+        nonlocal threshold
+        record_chunk()  # everything from the previous chunk has been written by now
+        run_writer.append([os.path.splitext(os.path.basename(r.path))[0] for r in results], scores)
+        # Without --threshold the invite cut is fixed by the first chunk's scores
+        if threshold is None:
+            threshold = invite_threshold(scores[engine.last_coverage >= args.min_skill_coverage], args.invite_top)
+        # The chunk's CVs are persisted before the next chunk is scored
+        chunk_coverage.clear()
+        chunk_coverage.update(zip((r.path for r in results), engine.last_coverage))
+
+    cvs, interviews, failures, failure_names = 0, 0, 0, []
+    with metrics.timed("stream"), run_writer, open_writer(db) as writer:
+        for result, top in score_stream(parsed, engine, args.chunk_size, args.top_k, store_scores):
+            name = os.path.basename(result.path)
+            if top is None:
+                failures += 1
+                if len(failure_names) < 100:
+                    failure_names.append(name)
+                reporter.warn(f"Could not parse {name}: {result.error}")
+                continue
+
+            cv_id = os.path.splitext(name)[0]
+            cvs += 1
+            reporter.progress("Scored CV", cvs, None, name)
+            save_candidate(writer, cv_id, name, result.text)
+            chunk_counts["candidates"] += 1
+            if cv_id in flagged:
+                flag_duplicate(writer, cv_id, flagged.pop(cv_id))
+            skill_cov = chunk_coverage[result.path]
+            top = [(col, score) for col, score in top if skill_cov[col] >= args.min_skill_coverage]
+            email = find_email(result.text)
+            matches = []
+            for rank, (col, score) in enumerate(top, 1):
+                jd_id = jd_ids[col]
+                save_match(writer, jd_id, cv_id, score)
+                chunk_matches.append((jd_id, score))
+                due = score >= threshold and email is not None
+                invited = due and schedule_interview(writer, outbox, cv_id, jd_id, score, email)
+                matches.append({
+                    "cv_id": cv_id,
+                    "rank": rank,
+                    "jd_id": jd_id,
+                    "job_title": jd_titles[jd_id],
+                    "score": round(score, 2),
+                    "skill_coverage": round(float(skill_cov[col]), 1),
+                    "invited": invited,
+                    "already_invited": due and not invited
+                })
+            warn_no_email(reporter, cv_id, email, matches, threshold)
+            interviews += sum(m["invited"] for m in matches)
+            chunk_counts["interviews"] += sum(m["invited"] for m in matches)
+            reporter.candidate(cv_id, matches, round(threshold, 2))
+            if sink is not None:
+                for match in matches:
+                    sink.write(match)
+        record_chunk()
+
+    store.prune(args.keep_runs)
+    if dedup is not None and args.limit is None:
+        dedup.retain("batch", seen)
+    with metrics.timed("email_drain"):
+        dispatcher.stop(drain=True, timeout=60)
+    return {
+        "cvs": cvs,
+        "jds": len(jd_ids),
+        "pairs_scored": (cvs - engine.skipped) * len(jd_ids),
+        "interviews": interviews,
+        "invite_threshold": None if threshold is None else round(threshold, 2),
+        "skill_prefiltered_cvs": engine.skipped,
+        "duplicates": duplicate_ids,
+        "duplicate_count": duplicates,
+        "records_written": writer.written,
+        "emails": outbox.counts(FileTransport.channel),
+        "run_id": run_writer.run_dir.name,
+        "parse_failures": failure_names,
+        "parse_failure_count": failures,
+        "summary_failures": failed_jds
+    }
+
+
+def write_results(results, summary, path, fmt):
+    out = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+    try:
+        if fmt == "json":
+            json.dump({"summary": summary, "matches": results}, out, indent=2)
+            out.write("\n")
+        else:
+            csv_writer = csv.DictWriter(out, fieldnames=RESULT_FIELDS)
+            csv_writer.writeheader()
+            csv_writer.writerows(results)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Match CVs against job descriptions and schedule interviews.")
+    parser.add_argument("--cv-dir", default=os.path.join(DATA_DIR, "CVs1"), help="Folder of PDF CVs")
+    parser.add_argument("--jd-file", default=os.path.join(DATA_DIR, "job_description.csv"), help="Job description CSV")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Only process the first N CVs; nothing is removed for the rest and the "
+                             "incremental state is not saved")
+    parser.add_argument("--top-k", type=int, default=3, help="Matches reported per CV")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Minimum score for an interview (default: the --invite-top cut of this run's scores)")
+    parser.add_argument("--invite-top", type=float, default=INVITE_TOP_PERCENT,
+                        help="Without --threshold, invite pairs scoring in the best this-many percent of the run")
+    parser.add_argument("--full", action="store_true", help="Rescore every pair instead of only changes")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default="flag",
+                        help="Near-duplicate CVs: mark them in Firestore (flag), drop them (merge) or ignore (off)")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Estimated Jaccard similarity above which two CVs are near-duplicates")
+    parser.add_argument("--min-skill-coverage", type=float, default=0,
+                        help="Skip CV-JD pairs covering less than this percent of the JD's key skills")
+    parser.add_argument("--stream", action="store_true",
+                        help="Constant-memory mode for huge CV folders: no incremental state, top-k matches only")
+    parser.add_argument("--keep-runs", type=int, default=10, help="Score matrices kept in output/results")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="CVs scored together in --stream mode")
+    parser.add_argument("--scorer", choices=list(SCORERS), default="tfidf",
+                        help="TF-IDF, embedding similarity, or a blend of both")
+    parser.add_argument("--alpha", type=float, help="TF-IDF weight for --scorer hybrid (default 0.5)")
+    parser.add_argument("--embed-model", default=DEFAULT_EMBED_MODEL, help="Ollama embedding model")
+    parser.add_argument("--workers", type=int, default=None, help="PDF parsing processes (default: all cores)")
+    parser.add_argument("--parse-timeout", type=float, default=60, help="Seconds allowed per PDF")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Parallel Ollama requests")
+    parser.add_argument("--email-rate", type=float, default=200.0, help="Invite emails written per second")
+    parser.add_argument("--no-firestore", action="store_true", help="Do not read or write Firestore")
+    parser.add_argument("--progress", choices=["text", "json", "none"], default="text",
+                        help="Progress output: colored text, JSON lines on stderr, or nothing")
+    parser.add_argument("--animate", action="store_true", help="Animated demo presentation (slow)")
+    parser.add_argument("--output", help="Write results to this file ('-' for stdout)")
+    parser.add_argument("--format", choices=["json", "csv"], default="json", help="Format for --output")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port during the run")
+    parser.add_argument("--metrics-file", help="Write a JSON metrics snapshot here periodically and at the end")
+    parser.add_argument("--metrics-interval", type=float, default=10, help="Seconds between metrics snapshots")
+    parser.add_argument("--profile", help="Dump cProfile stats for the whole run to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.progress == "json":
+        reporter = JsonReporter()
+    elif args.progress == "text":
+        reporter = ConsoleReporter(animate=args.animate)
     else:
-        print(f"\n   {Colors.RED}❌ No interview scheduled for Candidate {cv_id} (all scores < {SCORE_THRESHOLD}%){Colors.ENDC}")
-    
-    print(f"{Colors.YELLOW}{'─' * 40}{Colors.ENDC}\n")
-    time.sleep(0.3)  # Pause between candidates
-
-# Animated completion message
-print(f"{Colors.HEADER}{'=' * 50}{Colors.ENDC}")
-completion_msg = "🎉 ALL PROCESSING COMPLETED SUCCESSFULLY! 🎉"
-for i in range(len(completion_msg) + 1):
-    print(f"\r{Colors.GREEN}{Colors.BOLD}{completion_msg[:i]}{Colors.ENDC}", end="")
-    time.sleep(0.02)
-print("\n")
\ No newline at end of file
+        reporter = Reporter()
+
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    snapshots = metrics.SnapshotWriter(args.metrics_file, args.metrics_interval) if args.metrics_file else None
+
+    reporter.start("HR CANDIDATE MATCHING SYSTEM")
+    sink = ResultSink(args.output, args.format) if args.stream and args.output else None
+    try:
+        with metrics.profile(args.profile), metrics.timed("total"):
+            if args.stream:
+                summary = run_stream(args, reporter, sink)
+            else:
+                results, summary = run(args, reporter)
+    except Exception as e:
+        logging.exception("Batch run failed")
+        reporter.warn(f"Batch run failed: {e}")
+        if sink is not None:
+            sink.close({"error": str(e)})
+        return EXIT_FAILURE
+    finally:
+        if snapshots is not None:
+            snapshots.stop()
+
+    if sink is not None:
+        sink.close(summary)
+    elif args.output:
+        write_results(results, summary, args.output, args.format)
+    reporter.finish(summary)
+    if summary["parse_failures"] or summary["summary_failures"]:
+        return EXIT_PARTIAL
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import json
+
+import numpy as np
+
+import metrics
+from skills import bitsets, coverage, jd_bitsets
+from text_prep import TermMap, as_tokens, count_matrix, vocab_of
+
+MATCH_SECONDS = metrics.histogram("intelliscreen_match_seconds", "CV x JD scoring time per call")
+PAIRS_SCORED = metrics.counter("intelliscreen_pairs_scored_total", "CV-JD pairs scored")
+
+
+class MatchEngine:
+    """Score many CVs against many job descriptions with one shared TF-IDF model.
+
+    The vocabulary and IDF are fitted once over the whole corpus (JD summaries
+    plus any CVs supplied), every document is transformed once, and the full
+    CV x JD score matrix comes out of a single sparse matrix product.
+    """
+
+    def __init__(self):
+        from sklearn.feature_extraction.text import TfidfTransformer
+
+        self.terms = TermMap({})
+        self.transformer = TfidfTransformer()
+        self.jd_matrix = None
+
+    def fit(self, jd_texts, cv_texts=()):
+        """Fit vocabulary/IDF over JDs and CVs, and cache the JD vectors.
+
+        Texts may be raw strings or ``text_prep.tokens`` arrays; only terms
+        seen in this corpus become features, as with a TfidfVectorizer.
+        """
+        jd_texts = list(jd_texts)
+        docs = as_tokens(jd_texts + list(cv_texts))
+        jd_docs = docs[:len(jd_texts)]
+        seen = np.unique(np.concatenate(docs)) if docs else np.empty(0, dtype=np.int32)
+        # Columns in sorted term order, so a refit over the same corpus is identical.
+        terms = vocab_of(docs[0]).decode(seen) if docs else []
+        self.terms = TermMap({term: col for col, term in enumerate(sorted(terms))})
+        self.transformer.fit(count_matrix(docs, self.terms, len(self.terms.columns)))
+        self.jd_matrix = self.transform(jd_docs)
+        return self
+
+    def transform(self, cv_texts):
+        return self.transformer.transform(count_matrix(list(cv_texts), self.terms, len(self.terms.columns)))
+
+    def score(self, cv_matrix):
+        """Return a dense (n_cvs, n_jds) matrix of match scores in percent.
+
+        Rows of a TfidfTransformer output are L2-normalised, so the dot
+        product is the cosine similarity.
+        """
+        if self.jd_matrix is None:
+            raise RuntimeError("MatchEngine.fit() must be called before scoring")
+        with MATCH_SECONDS.time():
+            scores = (cv_matrix @ self.jd_matrix.T).toarray()
+        PAIRS_SCORED.inc(scores.size)
+        return scores * 100
+
+    def score_texts(self, cv_texts):
+        return self.score(self.transform(cv_texts))
+
+
+def top_k(scores, k, axis=1):
+    """Indices of the k best scores along ``axis``, best first.
+
+    Uses ``argpartition`` so only the selected slice is fully sorted. With
+    ``axis=1`` each row gives the top JDs for a CV; with ``axis=0`` each
+    column gives the top CVs for a JD.
+    """
+    scores = np.asarray(scores)
+    if axis == 0:
+        return top_k(scores.T, k, axis=1).T
+
+    n = scores.shape[1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.intp)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(n), (scores.shape[0], 1))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+class JDMatcher:
+    """JD summaries with a pre-fitted engine, for matching CVs as they arrive.
+
+    Vocabulary/IDF come from the JD summaries alone, so the JD vectors are
+    computed once and each incoming CV costs one transform and one sparse
+    product. With an ``Embedder`` and ``alpha`` < 1 the TF-IDF score is
+    blended with embedding similarity (see ``embeddings.HybridScorer``).
+    Each JD's required skills are kept as a bitset for ``coverage``.
+    """
+
+    def __init__(self, jds, embedder=None, alpha=1.0):
+        self.jds = jds
+        self.jd_ids = list(jds)
+        summaries = [jds[jd_id].get("summary", "") for jd_id in self.jd_ids]
+        self.engine = MatchEngine().fit(summaries)
+        self.skill_bits = jd_bitsets(summaries, [jds[jd_id].get("structured") for jd_id in self.jd_ids])
+        self.scorer = self.engine
+        if embedder is not None and alpha < 1:
+            from embeddings import HybridScorer
+            self.scorer = HybridScorer(self.engine, embedder, summaries, alpha)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    def title(self, jd_id):
+        return self.jds[jd_id].get("title", jd_id)
+
+    def score(self, cv_texts):
+        return self.scorer.score_texts(cv_texts)
+
+    def coverage(self, cv_texts):
+        """(n_cvs, n_jds) percent of each JD's required skills found in each CV."""
+        return coverage(bitsets(list(cv_texts)), self.skill_bits)
+
+    def ranked(self, cv_text):
+        """[(jd_id, score)] for one CV, best match first."""
+        scores = self.score([cv_text])[0]
+        order = top_k(scores[None, :], len(self.jd_ids))[0]
+        return [(self.jd_ids[i], round(float(scores[i]), 2)) for i in order]
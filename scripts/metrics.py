@@ -0,0 +1,258 @@
+import contextlib
+import cProfile
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; covers cache lookups up to slow LLM calls.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_metrics = {}
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic count, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+    def _snapshot(self):
+        return [{"labels": dict(zip(self.labelnames, key)), "value": value}
+                for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, Prometheus style."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            state = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def time(self, **labels):
+        """Context manager observing the elapsed seconds of its block."""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        for key, state in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, state):
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, key, [("le", bound)]), count
+            yield f"{self.name}_bucket", _format_labels(self.labelnames, key, [("le", "+Inf")]), state[-2]
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), state[-2]
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), state[-1]
+
+    def _snapshot(self):
+        return [{
+            "labels": dict(zip(self.labelnames, key)),
+            "count": state[-2],
+            "sum": round(state[-1], 6),
+            "buckets": dict(zip(map(str, self.buckets), state[:-2]))
+        } for key, state in sorted(self._values.items())]
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def _register(cls, name, help, labelnames, **kwargs):
+    with _lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, help, labelnames, **kwargs)
+        elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"metric {name} already registered with a different type or labels")
+        return metric
+
+
+def counter(name, help="", labelnames=()):
+    """Get or create the process-wide counter ``name``."""
+    return _register(Counter, name, help, labelnames)
+
+
+def histogram(name, help="", labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Get or create the process-wide histogram ``name``."""
+    return _register(Histogram, name, help, labelnames, buckets=buckets)
+
+
+STAGE_SECONDS = histogram("intelliscreen_stage_seconds", "Wall time of pipeline stages", ["stage"])
+
+
+def timed(stage):
+    """Time a block or function into ``intelliscreen_stage_seconds{stage=...}``.
+
+    Works as ``with timed("parse"):`` and as a ``@timed("parse")`` decorator.
+    """
+    return _TimedStage(stage)
+
+
+class _TimedStage(contextlib.ContextDecorator):
+    # As a decorator one instance serves every call, from any thread and
+    # recursively, so start times live on a per-thread stack
+    def __init__(self, stage):
+        self.stage = stage
+        self._local = threading.local()
+
+    def __enter__(self):
+        if not hasattr(self._local, "starts"):
+            self._local.starts = []
+        self._local.starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_SECONDS.observe(time.perf_counter() - self._local.starts.pop(), stage=self.stage)
+        return False
+
+
+def reset():
+    """Forget every recorded value (metrics stay registered)."""
+    with _lock:
+        for metric in _metrics.values():
+            metric._values.clear()
+
+
+# ------------------- 📤 EXPORT -------------------
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for name, metric in sorted(_metrics.items()):
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for sample, labels, value in metric._samples():
+                lines.append(f"{sample}{labels} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    with _lock:
+        return {
+            "ts": round(time.time(), 3),
+            "metrics": {name: {"type": metric.kind, "values": metric._snapshot()}
+                        for name, metric in sorted(_metrics.items())}
+        }
+
+
+def write_snapshot(path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(tmp, path)
+
+
+class SnapshotWriter:
+    """Rewrites ``path`` with a JSON snapshot every ``interval`` seconds and on ``stop()``."""
+
+    def __init__(self, path, interval=10):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="metrics-snapshot", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            write_snapshot(self.path)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        write_snapshot(self.path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, content_type = render_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body, content_type = json.dumps(snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+@contextlib.contextmanager
+def profile(path):
+    """cProfile the block and dump the stats to ``path`` (read with pstats or snakeviz)."""
+    if not path:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
@@ -0,0 +1,325 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import metrics
+
+DEFAULT_OUTBOX_PATH = Path(__file__).resolve().parent.parent / "output" / "outbox.db"
+OUTPUT_DIR = Path(__file__).resolve().parent.parent / "output"
+SENDGRID_API_URL = "https://api.sendgrid.com"
+DEFAULT_LEASE = 900  # seconds a claimed message may stay "sending" before another dispatcher retries it
+
+logger = logging.getLogger(__name__)
+
+EMAILS = metrics.counter("intelliscreen_emails_total", "Outbox send attempts, by outcome", ["transport", "result"])
+SEND_SECONDS = metrics.histogram("intelliscreen_email_send_seconds", "Time to hand one email to the transport",
+                                 ["transport"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    channel TEXT NOT NULL DEFAULT 'email',
+    recipient TEXT,
+    subject TEXT,
+    body TEXT NOT NULL,
+    content_type TEXT NOT NULL DEFAULT 'text/plain',
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_at REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+"""
+INDEXES = """
+DROP INDEX IF EXISTS outbox_due;
+CREATE INDEX IF NOT EXISTS outbox_channel_due ON outbox (channel, status, next_attempt_at);
+"""
+
+
+def invite_key(candidate, jd_id):
+    """Idempotency key for an interview invite: one per (candidate, JD)."""
+    return f"cv{candidate}_jd{jd_id}"
+
+
+class Outbox:
+    """Durable queue of outgoing emails in a local SQLite database.
+
+    ``enqueue`` is idempotent per key, so re-running a batch or clicking
+    twice never queues the same invite again. Messages move from pending
+    to sending to sent; failures go back to pending with exponential
+    backoff until ``max_attempts``, after which they stay failed.
+
+    Each message belongs to the ``channel`` of the transport that should
+    send it, and a dispatcher only claims its own channel's rows, so the
+    batch (file) and the app (SendGrid) can share one database.
+    """
+
+    def __init__(self, path=DEFAULT_OUTBOX_PATH, max_attempts=5, backoff=30.0):
+        self.path = str(path)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(outbox)")}
+            if "channel" not in columns:
+                # Before channels, only the batch queued messages without a recipient
+                conn.execute("ALTER TABLE outbox ADD COLUMN channel TEXT NOT NULL DEFAULT 'email'")
+                conn.execute("UPDATE outbox SET channel = 'file' WHERE recipient IS NULL")
+            if "claimed_at" not in columns:
+                conn.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")
+            conn.executescript(INDEXES)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, key, body, recipient, subject=None, content_type="text/plain", channel="email"):
+        """Queue a message for ``channel``; returns False if ``key`` was already queued."""
+        if not recipient:
+            raise ValueError(f"Message {key} has no recipient")
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO outbox (idempotency_key, channel, recipient, subject, body, content_type, "
+                "next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, channel, recipient, subject, body, content_type, now, now)
+            )
+            return cursor.rowcount == 1
+
+    def claim(self, limit, channel="email"):
+        """Atomically mark up to ``limit`` of ``channel``'s due messages as sending and return them."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT * FROM outbox WHERE channel = ? AND status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT ?",
+                (channel, time.time(), limit)
+            ).fetchall()
+            now = time.time()
+            conn.executemany("UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                             [(now, row["id"]) for row in rows])
+            conn.execute("COMMIT")
+            return [dict(row) for row in rows]
+
+    def recover(self, channel, lease=DEFAULT_LEASE):
+        """Return ``channel``'s messages claimed over ``lease`` seconds ago to pending; returns how many.
+
+        Those were being sent by a dispatcher that died. Messages another
+        live dispatcher is sending right now are left alone.
+        """
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE outbox SET status = 'pending' WHERE channel = ? AND status = 'sending' "
+                "AND (claimed_at IS NULL OR claimed_at < ?)", (channel, time.time() - lease)
+            ).rowcount
+
+    def mark_sent(self, message_ids):
+        with self._connect() as conn:
+            conn.executemany("UPDATE outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?",
+                             [(time.time(), message_id) for message_id in message_ids])
+
+    def mark_failed(self, message, error):
+        attempts = message["attempts"] + 1
+        status = "failed" if attempts >= self.max_attempts else "pending"
+        retry_at = time.time() + self.backoff * 2 ** (attempts - 1)
+        with self._connect() as conn:
+            conn.execute("UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                         (status, attempts, retry_at, str(error)[:500], message["id"]))
+
+    def counts(self, channel=None):
+        """{status: messages}, for one ``channel`` or all of them."""
+        with self._connect() as conn:
+            if channel is None:
+                return dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            return dict(conn.execute("SELECT status, COUNT(*) FROM outbox WHERE channel = ? GROUP BY status",
+                                     (channel,)).fetchall())
+
+    def pending(self, channel=None):
+        counts = self.counts(channel)
+        return counts.get("pending", 0) + counts.get("sending", 0)
+
+
+# ------------------- ✉️ TRANSPORTS -------------------
+
+class SendGridTransport:
+    """Sends through the SendGrid v3 HTTP API over one pooled session.
+
+    ``base_url`` (or ``SENDGRID_API_URL``) can point at a local fake mail
+    endpoint for testing.
+    """
+
+    channel = "email"
+
+    def __init__(self, api_key=None, from_email=None, base_url=None, pool_size=10, timeout=10):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.api_key = api_key or os.getenv("SENDGRID_API_KEY")
+        self.from_email = from_email or os.getenv("EMAIL_USER")
+        self.url = (base_url or os.getenv("SENDGRID_API_URL") or SENDGRID_API_URL).rstrip("/") + "/v3/mail/send"
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.headers["Authorization"] = f"Bearer {self.api_key}"
+
+    def send(self, message):
+        payload = {
+            "personalizations": [{"to": [{"email": message["recipient"]}]}],
+            "from": {"email": self.from_email},
+            "subject": message["subject"],
+            "content": [{"type": message["content_type"], "value": message["body"]}],
+            "custom_args": {"idempotency_key": message["idempotency_key"]}
+        }
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        if response.status_code >= 300:
+            raise RuntimeError(f"SendGrid returned {response.status_code}: {response.text[:200]}")
+
+
+class FileTransport:
+    """Writes each message to ``email_<key>.txt``, as the batch demo always has."""
+
+    channel = "file"
+
+    def __init__(self, out_dir=OUTPUT_DIR):
+        self.out_dir = Path(out_dir)
+
+    def send(self, message):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.out_dir / f"email_{message['idempotency_key']}.txt", "w", encoding="utf-8") as f:
+            f.write(message["body"])
+
+
+# ------------------- 🚚 DISPATCH -------------------
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` sends per second with bursts up to ``burst``."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            time.sleep((1 - self.tokens) / self.rate)
+
+
+class Dispatcher:
+    """Background thread draining the outbox in batches through ``transport``.
+
+    On start it takes back its channel's messages whose ``lease`` ran out,
+    i.e. ones an earlier dispatcher claimed and never finished.
+    """
+
+    def __init__(self, outbox, transport, batch_size=50, rate=10.0, poll_interval=1.0, lease=DEFAULT_LEASE):
+        self.outbox = outbox
+        self.transport = transport
+        self.lease = lease
+        self.batch_size = batch_size
+        self.limiter = RateLimiter(rate)
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """Send one batch of due messages; returns how many were claimed."""
+        batch = self.outbox.claim(self.batch_size, self.transport.channel)
+        transport = type(self.transport).__name__
+        sent = []
+        for message in batch:
+            self.limiter.acquire()
+            try:
+                with SEND_SECONDS.time(transport=transport):
+                    self.transport.send(message)
+                EMAILS.inc(transport=transport, result="sent")
+                sent.append(message["id"])
+            except Exception as e:
+                EMAILS.inc(transport=transport, result="error")
+                logger.warning("Sending %s failed: %s", message["idempotency_key"], e)
+                self.outbox.mark_failed(message, e)
+        if sent:
+            self.outbox.mark_sent(sent)
+        return len(batch)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if not self.run_once():
+                    self._stop.wait(self.poll_interval)
+            except Exception as e:
+                logger.error("Outbox dispatch failed: %s", e)
+                self._stop.wait(self.poll_interval)
+
+    def recover(self):
+        recovered = self.outbox.recover(self.transport.channel, self.lease)
+        if recovered:
+            logger.warning("Retrying %d %s message(s) left sending by an earlier dispatcher",
+                           recovered, self.transport.channel)
+        return recovered
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self.recover()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="outbox-dispatcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, drain=False, timeout=None):
+        """Stop the thread; with ``drain`` first wait (up to ``timeout`` s) for due messages to go out."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while drain and self.outbox.counts(self.transport.channel).get("sending", 0) + self._due() > 0:
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            time.sleep(0.1)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _due(self):
+        with self.outbox._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM outbox WHERE channel = ? AND status = 'pending' "
+                                "AND next_attempt_at <= ?", (self.transport.channel, time.time())).fetchone()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or drain the interview email outbox.")
+    parser.add_argument("command", choices=["status", "dispatch"])
+    parser.add_argument("--transport", choices=["sendgrid", "file"], default="sendgrid")
+    parser.add_argument("--rate", type=float, default=10.0, help="Messages per second")
+    args = parser.parse_args(argv)
+
+    outbox = Outbox()
+    if args.command == "status":
+        print(json.dumps(outbox.counts()))
+        return 0
+    transport = SendGridTransport() if args.transport == "sendgrid" else FileTransport()
+    dispatcher = Dispatcher(outbox, transport, rate=args.rate)
+    dispatcher.recover()
+    while dispatcher.run_once():
+        pass
+    print(json.dumps(outbox.counts(transport.channel)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
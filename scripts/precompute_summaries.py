@@ -1,16 +1,43 @@
-import ollama
+import argparse
 import pandas as pd
-import json
-import os
 from pathlib import Path
 
-def summarize_job_descriptions():
-    """Summarize job descriptions using Ollama's Gemma model and save results to JSON."""
+from jd_summarizer import DEFAULT_CONCURRENCY, DEFAULT_TIMEOUT, SummaryStore, summarize_all
+from skills import parse_json_block
+from summary_cache import SummaryCache
+
+PROMPT_TEMPLATE = """
+            Analyze this job description and extract the following information in JSON format:
+            - Job Title: {job_title}
+            - Key Skills: (list of 5-8 technical/hard skills)
+            - Experience Requirements: (years and type of experience needed)
+            - Qualifications: (education, certifications, etc.)
+            - Summary: (2-3 sentence overview of the role)
+            
+            Job Description:
+            {jd_text}
+            """
+
+def summarize_job_descriptions(concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, resume=False):
+    """Summarize job descriptions using Ollama's Gemma model and save results to JSON.
+
+    Requests run concurrently and every finished summary is written to a
+    working file next to the output straight away; the output itself is
+    only replaced once the run completes, so a crash never costs the last
+    complete set. With ``resume`` an interrupted run's working file (or,
+    failing that, the output) is kept and only missing JDs are requested.
+    A JD whose requests all fail keeps its previous summary, or is stored
+    with an ``error`` and an empty summary, and is retried next time.
+    Summaries are also reused from the shared summary cache whenever the
+    model, options, prompt and JD text are unchanged, so a full run only
+    calls Ollama for new or edited JDs.
+    """
     
     # Define paths using Path for better cross-platform compatibility
     data_dir = Path("../data")
     jd_file = data_dir / "job_description.csv"
     output_file = data_dir / "jd_summaries.json"
+    working_file = data_dir / "jd_summaries.json.partial"
     
     try:
         # Load job descriptions with explicit encoding and error handling
@@ -27,7 +54,11 @@ def summarize_job_descriptions():
             print(f"Error: Missing required columns: {', '.join(missing)}")
             return
 
-        jd_summaries = {}
+        previous = SummaryStore(output_file).records
+        store = SummaryStore(working_file, load_existing=resume)
+        if resume and not working_file.exists():
+            store.records.update(previous)
+        jobs = {}
         
         for index, row in jd_df.iterrows():
             jd_id = index + 1
@@ -37,47 +68,45 @@ def summarize_job_descriptions():
             if pd.isna(jd_text) or not jd_text.strip():
                 print(f"Skipping empty job description for {job_title}")
                 continue
+            if jd_id in store and not store.records[str(jd_id)].get("error"):
+                print(f"Already summarized JD {jd_id}: {job_title}")
+                continue
+            jobs[jd_id] = (jd_id, job_title, jd_text)
                 
-            # Create structured prompt for better results
-            prompt = f"""
-            Analyze this job description and extract the following information in JSON format:
-            - Job Title: {job_title}
-            - Key Skills: (list of 5-8 technical/hard skills)
-            - Experience Requirements: (years and type of experience needed)
-            - Qualifications: (education, certifications, etc.)
-            - Summary: (2-3 sentence overview of the role)
-            
-            Job Description:
-            {jd_text}
-            """
-            
-            try:
-                response = ollama.chat(
-                    model="gemma:2b",
-                    messages=[{"role": "user", "content": prompt}],
-                    options={"temperature": 0.3}  # Lower temp for more factual responses
-                )
-                summary = response["message"]["content"]
-                
-                # Store both raw and structured data
-                jd_summaries[jd_id] = {
-                    "title": job_title,
-                    "description": jd_text,
-                    "summary": summary,
-                    "structured": parse_summary(summary)  # Additional parsing function
-                }
-                
-                print(f"Summarized JD {jd_id}: {job_title}")
-                
-            except Exception as e:
-                print(f"Error processing JD {jd_id}: {str(e)}")
+        results = summarize_all(
+            jobs.values(),
+            PROMPT_TEMPLATE,
+            options={"temperature": 0.3},  # Lower temp for more factual responses
+            concurrency=concurrency,
+            timeout=timeout,
+            cache=SummaryCache()
+        )
+        for jd_id, summary, error in results:
+            _, job_title, jd_text = jobs[jd_id]
+            if error:
+                print(f"Error processing JD {jd_id}: {error}")
+                # Never drop a JD: fall back to its last good summary, else mark it for the next run
+                kept = previous.get(str(jd_id))
+                if not kept or kept.get("error"):
+                    kept = {"title": job_title, "description": jd_text, "summary": "", "structured": {},
+                            "error": error}
+                store.save(jd_id, kept)
                 continue
                 
-        # Save results with pretty formatting
-        with open(output_file, "w", encoding='utf-8') as f:
-            json.dump(jd_summaries, f, indent=2)
+            # Store both raw and structured data
+            store.save(jd_id, {
+                "title": job_title,
+                "description": jd_text,
+                "summary": summary,
+                "structured": parse_summary(summary)  # Additional parsing function
+            })
+            
+            print(f"Summarized JD {jd_id}: {job_title}")
             
-        print(f"Successfully saved {len(jd_summaries)} summaries to {output_file}")
+        store.publish(output_file)
+        failed = sum(bool(record.get("error")) for record in store.records.values())
+        print(f"Successfully saved {len(store.records) - failed} summaries to {output_file}"
+              + (f" ({failed} failed; run again with --resume to retry them)" if failed else ""))
         
     except FileNotFoundError:
         print(f"Error: File not found at {jd_file}")
@@ -87,9 +116,10 @@ def summarize_job_descriptions():
 def parse_summary(summary_text):
     """Parse the model's summary into structured data."""
     try:
-        # Attempt to parse JSON if the model returned it
-        if summary_text.strip().startswith("{"):
-            return json.loads(summary_text)
+        # Attempt to parse JSON if the model returned it (often fenced, with trailing commas)
+        data = parse_json_block(summary_text)
+        if data is not None:
+            return data
             
         # Fallback parsing for text responses
         structured = {}
@@ -109,4 +139,9 @@ def parse_summary(summary_text):
         return {"raw_summary": summary_text}
 
 if __name__ == "__main__":
-    summarize_job_descriptions()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pre-compute JD summaries with Ollama.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Parallel Ollama requests")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Seconds per Ollama request")
+    parser.add_argument("--resume", action="store_true", help="Keep summaries from an interrupted run (or the output file) and only request the rest")
+    args = parser.parse_args()
+    summarize_job_descriptions(args.concurrency, args.timeout, args.resume)
\ No newline at end of file
@@ -0,0 +1,264 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+import stats
+
+DEFAULT_RESULTS_DIR = Path(__file__).resolve().parent.parent / "output" / "results"
+INCOMPLETE_GRACE = 3600  # seconds without an append before an unfinished run counts as abandoned
+
+
+class RunWriter:
+    """Appends score rows for one run; the matrix is only valid after ``close``.
+
+    Rows go straight to ``scores.f32`` on disk (float32, one row per CV,
+    one column per JD) and CV ids to ``cv_ids.txt``, so a streaming run
+    never holds more than the chunk it is appending. Every append touches
+    the run directory, which tells ``ResultStore.prune`` the run is alive.
+    """
+
+    def __init__(self, run_dir, jd_ids, info=None):
+        self.run_dir = Path(run_dir)
+        self.run_dir.mkdir(parents=True)
+        self.jd_ids = list(jd_ids)
+        self.info = info or {}
+        self.rows = 0
+        self._scores = open(self.run_dir / "scores.f32", "wb")
+        self._cv_ids = open(self.run_dir / "cv_ids.txt", "w", encoding="utf-8")
+
+    def append(self, cv_ids, scores):
+        scores = np.ascontiguousarray(scores, dtype=np.float32).reshape(len(cv_ids), len(self.jd_ids))
+        self._scores.write(scores.tobytes())
+        self._cv_ids.writelines(f"{cv_id}\n" for cv_id in cv_ids)
+        self.rows += len(cv_ids)
+        os.utime(self.run_dir)
+
+    def close(self):
+        self._scores.close()
+        self._cv_ids.close()
+        with open(self.run_dir / "jd_ids.json", "w", encoding="utf-8") as f:
+            json.dump(self.jd_ids, f)
+        # meta.json goes last: a run without it was interrupted.
+        with open(self.run_dir / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"shape": [self.rows, len(self.jd_ids)], **self.info}, f, indent=2)
+        return ResultRun(self.run_dir)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._scores.close()
+            self._cv_ids.close()
+
+
+class ResultRun:
+    """Read-only view of one run's CV x JD score matrix, memory-mapped.
+
+    Row ``i`` is ``cv_ids[i]`` and column ``j`` is ``jd_ids[j]``; queries
+    work on int32 row/column indices and only slice what they need, so a
+    run far larger than RAM can be queried.
+    """
+
+    def __init__(self, run_dir):
+        self.run_dir = Path(run_dir)
+        with open(self.run_dir / "meta.json", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(self.run_dir / "jd_ids.json", encoding="utf-8") as f:
+            self.jd_ids = json.load(f)
+        with open(self.run_dir / "cv_ids.txt", encoding="utf-8") as f:
+            self.cv_ids = f.read().splitlines()
+        self.run_id = self.run_dir.name
+        shape = tuple(self.meta["shape"])
+        if shape[0]:
+            self.scores = np.memmap(self.run_dir / "scores.f32", dtype=np.float32, mode="r", shape=shape)
+        else:
+            self.scores = np.zeros(shape, dtype=np.float32)
+        self._jd_cols = {jd_id: j for j, jd_id in enumerate(self.jd_ids)}
+        self._cv_rows = None
+
+    def jd_col(self, jd_id):
+        try:
+            return self._jd_cols[jd_id]
+        except KeyError:
+            raise KeyError(f"JD {jd_id!r} is not in run {self.run_id}") from None
+
+    def cv_row(self, cv_id):
+        if self._cv_rows is None:
+            self._cv_rows = {cv_id: i for i, cv_id in enumerate(self.cv_ids)}
+        return self._cv_rows[cv_id]
+
+    def top_candidates(self, jd_id, min_score=None, limit=None):
+        """[(cv_id, score)] for one JD, best first, optionally above ``min_score``."""
+        column = np.asarray(self.scores[:, self.jd_col(jd_id)])
+        rows = np.nonzero(column >= min_score)[0] if min_score is not None else np.arange(len(column))
+        order = rows[np.argsort(-column[rows], kind="stable")][:limit]
+        return [(self.cv_ids[i], round(float(column[i]), 2)) for i in order]
+
+    def top_jds(self, cv_id, k=3):
+        """[(jd_id, score)] for one CV, best first."""
+        row = np.asarray(self.scores[self.cv_row(cv_id)])
+        order = np.argsort(-row, kind="stable")[:k]
+        return [(self.jd_ids[j], round(float(row[j]), 2)) for j in order]
+
+    def pairs(self, min_score):
+        """Columnar ``(cv_idx int32, jd_idx int32, score float32)`` of every cell >= ``min_score``."""
+        cv_idx, jd_idx, scores = [], [], []
+        for start in range(0, len(self.cv_ids), 65536):
+            block = np.asarray(self.scores[start:start + 65536])
+            rows, cols = np.nonzero(block >= min_score)
+            cv_idx.append((rows + start).astype(np.int32))
+            jd_idx.append(cols.astype(np.int32))
+            scores.append(block[rows, cols])
+        if not cv_idx:
+            return np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, np.float32)
+        return np.concatenate(cv_idx), np.concatenate(jd_idx), np.concatenate(scores)
+
+    def distribution(self, jd_id=None):
+        """{jd_id: {"count", "mean", "p50", "p90", "max", "hist"}} over the whole run."""
+        jd_ids = [jd_id] if jd_id is not None else self.jd_ids
+        result = {}
+        for jd in jd_ids:
+            column = np.asarray(self.scores[:, self.jd_col(jd)], dtype=np.float64)
+            if not len(column):
+                result[jd] = {"count": 0}
+                continue
+            result[jd] = {
+                "count": len(column),
+                "mean": round(float(column.mean()), 2),
+                "p50": round(float(np.percentile(column, 50)), 2),
+                "p90": round(float(np.percentile(column, 90)), 2),
+                "max": round(float(column.max()), 2),
+                "hist": stats.histogram(column).tolist()
+            }
+        return result
+
+    def sync(self, writer, min_score=None, top_k=None):
+        """Bulk-write ``matches/cv{cv}_jd{jd}`` documents for the selected cells.
+
+        Selects cells above ``min_score`` and/or each CV's ``top_k``; with
+        neither, every cell is written. Returns the number of documents queued.
+        """
+        queued = 0
+        for start in range(0, len(self.cv_ids), 65536):
+            block = np.asarray(self.scores[start:start + 65536])
+            keep = np.ones(block.shape, dtype=bool)
+            if top_k is not None and top_k < block.shape[1]:
+                keep[:] = False
+                cols = np.argpartition(-block, top_k - 1, axis=1)[:, :top_k]
+                np.put_along_axis(keep, cols, True, axis=1)
+            if min_score is not None:
+                keep &= block >= min_score
+            for row, col in zip(*np.nonzero(keep)):
+                cv_id, jd_id = self.cv_ids[start + row], self.jd_ids[col]
+                writer.set("matches", f"cv{cv_id}_jd{jd_id}", {
+                    "cv_id": cv_id,
+                    "jd_id": jd_id,
+                    "score": float(block[row, col]),
+                    "run_id": self.run_id
+                })
+                queued += 1
+        return queued
+
+
+class ResultStore:
+    """One directory per run under ``output/results``, newest run last."""
+
+    def __init__(self, root=DEFAULT_RESULTS_DIR):
+        self.root = Path(root)
+
+    def new_run(self, jd_ids, **info):
+        run_id = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        created = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+        return RunWriter(self.root / run_id, jd_ids, {"run_id": run_id, "created": created, **info})
+
+    def save(self, cv_ids, jd_ids, scores, **info):
+        """Record a complete score matrix as a new run."""
+        with self.new_run(jd_ids, **info) as run:
+            run.append(cv_ids, scores)
+        return ResultRun(run.run_dir)
+
+    def runs(self):
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if (p / "meta.json").exists())
+
+    def open(self, run_id=None):
+        """The run ``run_id``, or the latest complete run."""
+        runs = self.runs()
+        if run_id is None:
+            if not runs:
+                raise FileNotFoundError(f"No result runs in {self.root}")
+            run_id = runs[-1]
+        return ResultRun(self.root / run_id)
+
+    def prune(self, keep=10, grace=INCOMPLETE_GRACE):
+        """Delete all but the newest ``keep`` runs, and interrupted ones.
+
+        A run without meta.json is only treated as interrupted once it has
+        gone ``grace`` seconds without an append; until then another
+        process may still be writing it.
+        """
+        runs = self.runs()
+        keep_ids = set(runs[-keep:]) if keep else set()
+        removed = 0
+        for path in self.root.iterdir() if self.root.exists() else ():
+            if path.name in keep_ids:
+                continue
+            if path.name not in runs and time.time() - path.stat().st_mtime < grace:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query or sync stored match results.")
+    parser.add_argument("--run", help="Run id (default: latest)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("runs", help="List stored runs")
+    top = sub.add_parser("top", help="Top candidates for a JD")
+    top.add_argument("jd_id")
+    top.add_argument("--min-score", type=float)
+    top.add_argument("--limit", type=int, default=20)
+    dist = sub.add_parser("dist", help="Score distribution per JD")
+    dist.add_argument("jd_id", nargs="?")
+    sync = sub.add_parser("sync", help="Write match documents to Firestore in bulk")
+    sync.add_argument("--min-score", type=float)
+    sync.add_argument("--top-k", type=int)
+    prune = sub.add_parser("prune", help="Keep only the newest runs")
+    prune.add_argument("--keep", type=int, default=10)
+    prune.add_argument("--grace", type=float, default=INCOMPLETE_GRACE,
+                       help="Seconds without an append before an unfinished run is deleted")
+    args = parser.parse_args(argv)
+
+    store = ResultStore()
+    if args.command == "runs":
+        for run_id in store.runs():
+            print(run_id, json.dumps(ResultRun(store.root / run_id).meta))
+    elif args.command == "top":
+        print(json.dumps(store.open(args.run).top_candidates(args.jd_id, args.min_score, args.limit), indent=2))
+    elif args.command == "dist":
+        print(json.dumps(store.open(args.run).distribution(args.jd_id), indent=2))
+    elif args.command == "sync":
+        from firestore_writer import BatchWriter
+        from job_screening import get_db
+
+        with BatchWriter(get_db()) as writer:
+            queued = store.open(args.run).sync(writer, args.min_score, args.top_k)
+        print(f"✅ Synced {queued} match documents")
+    elif args.command == "prune":
+        print(f"🗑️ Removed {store.prune(args.keep, args.grace)} run(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
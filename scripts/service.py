@@ -0,0 +1,359 @@
+import argparse
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import numpy as np
+
+from bulk_upload import MAX_PDF_BYTES, BulkMatcher, iter_upload_files
+from cv_index import CVIndex
+from dedup import DEDUP_MODES, DEFAULT_THRESHOLD, DedupIndex
+from embeddings import DEFAULT_EMBED_MODEL, SCORERS
+from extraction_cache import ExtractionCache
+from matching import JDMatcher, top_k
+import metrics
+
+DEFAULT_JD_FILE = Path(__file__).resolve().parent.parent / "data" / "jd_summaries.json"
+DEFAULT_MAX_BATCH = 256  # CVs scored in one vectorized call
+DEFAULT_MAX_WAIT = 0.005  # seconds the first request of a batch waits for company
+MAX_TEXT_CHARS = 200_000
+MAX_REQUEST_BYTES = 200 * 1024 * 1024  # multipart uploads, zips included
+MAX_K = 100
+
+REQUESTS = metrics.counter("intelliscreen_service_requests_total", "Matching service requests, by endpoint and status",
+                           ["endpoint", "status"])
+REQUEST_SECONDS = metrics.histogram("intelliscreen_service_request_seconds", "Matching service request latency",
+                                    ["endpoint"])
+BATCH_SIZE = metrics.histogram("intelliscreen_service_batch_size", "CVs per coalesced scoring call",
+                               buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024))
+
+
+# ------------------- 🧺 MICRO-BATCHING -------------------
+
+class MicroBatcher:
+    """Coalesces concurrent calls into one vectorized ``fn(items)`` call.
+
+    A single thread takes the oldest waiting request, then keeps
+    collecting others for up to ``max_wait`` seconds or until
+    ``max_batch`` items are queued, runs ``fn`` once on all of them and
+    hands every caller its own rows of the result. Under load the wait is
+    never reached and batches simply grow; an idle service adds at most
+    ``max_wait`` to a request.
+    """
+
+    def __init__(self, fn, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT, name="micro-batch"):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, items):
+        """Future resolving to ``fn``'s rows for ``items``."""
+        future = Future()
+        self._queue.put((list(items), future))
+        return future
+
+    def __call__(self, items, timeout=None):
+        return self.submit(items).result(timeout)
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                try:
+                    request = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self._run(batch)
+
+    def _run(self, batch):
+        items = [item for request_items, _ in batch for item in request_items]
+        BATCH_SIZE.observe(len(items))
+        try:
+            results = self.fn(items)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        start = 0
+        for request_items, future in batch:
+            future.set_result(results[start:start + len(request_items)])
+            start += len(request_items)
+
+
+# ------------------- 🧠 MATCHING SERVICE -------------------
+
+class MatchService:
+    """Long-lived matching state behind the HTTP API.
+
+    The JD matrix is fitted once at start-up. Synchronous matches from
+    every request thread go through one ``MicroBatcher``, so concurrent
+    callers share a sparse product instead of each paying for their own.
+    Submitted CVs run as ``BulkMatcher`` jobs on a warm PDF parse pool,
+    are scored through the same batcher and land in the CV index (and in
+    Firestore when ``db`` is given). The service has the ``jd_ids`` /
+    ``title`` / ``score`` / ``coverage`` interface of a ``JDMatcher``,
+    which is what the bulk jobs score with.
+    """
+
+    def __init__(self, jd_file=DEFAULT_JD_FILE, scorer="tfidf", alpha=None, embed_model=DEFAULT_EMBED_MODEL,
+                 db=None, cv_index=None, dedup=None, dedup_mode="flag", workers=None,
+                 max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT, max_jobs=2):
+        if scorer == "tfidf":
+            self.matcher = JDMatcher.from_file(jd_file)
+        else:
+            from embeddings import Embedder
+            self.matcher = JDMatcher.from_file(jd_file, embedder=Embedder(model=embed_model),
+                                               alpha=SCORERS[scorer] if alpha is None else alpha)
+        self.jd_ids = self.matcher.jd_ids
+        self.db = db
+        self.cv_index = cv_index if cv_index is not None else CVIndex()
+        self.batcher = MicroBatcher(self.matcher.score, max_batch, max_wait, name="match-batch")
+        self.bulk = BulkMatcher(cv_index=self.cv_index, cache=ExtractionCache(), workers=workers,
+                                dedup=dedup, dedup_mode=dedup_mode, max_jobs=max_jobs)
+
+    # ✅ JDMatcher interface, used by the bulk jobs
+    def title(self, jd_id):
+        return self.matcher.title(jd_id)
+
+    def score(self, cv_texts):
+        return self.batcher(cv_texts)
+
+    def coverage(self, cv_texts):
+        return self.matcher.coverage(cv_texts)
+
+    def match(self, cv_texts, k=3):
+        """Best ``k`` JDs for each CV text, best first."""
+        scores = np.asarray(self.score(cv_texts), dtype=np.float64)
+        skill_cov = self.coverage(cv_texts)
+        return [[{"jd_id": self.jd_ids[col], "title": self.title(self.jd_ids[col]),
+                  "score": round(float(row[col]), 2), "skill_coverage": round(float(cov[col]), 1)}
+                 for col in cols]
+                for row, cov, cols in zip(scores, skill_cov, top_k(scores, k))]
+
+    def parse(self, name, data):
+        return self.bulk.parse(name, data)
+
+    def submit_files(self, files):
+        return self.bulk.submit(files, self, self.db)
+
+    def submit_texts(self, texts):
+        return self.bulk.submit_texts(texts, self, self.db)
+
+    def top_cvs(self, jd_id, k=10, min_coverage=0.0):
+        """Best ``k`` indexed CVs for a JD; None for an unknown JD."""
+        if jd_id not in self.matcher.jds:
+            return None
+        # The app and batch runs add CVs from other processes; reloading only reads what they appended
+        self.cv_index.reload()
+        required = self.matcher.skill_bits[self.jd_ids.index(jd_id)]
+        results = self.cv_index.search(self.matcher.jds[jd_id].get("summary", ""), k, required=required,
+                                       min_coverage=min_coverage)
+        coverages = self.cv_index.coverage([candidate for candidate, _ in results], required)
+        return [{"candidate": candidate, "relevance": relevance, "skill_coverage": round(cov, 1)}
+                for (candidate, relevance), cov in zip(results, coverages)]
+
+
+def job_status(job, results=True):
+    """JSON-ready view of a ``BulkJob``."""
+    status = {
+        "job_id": job.id,
+        "status": job.status,
+        "progress": round(job.progress, 3),
+        "total": job.total,
+        "parsed": job.parsed,
+        "failed": job.failed,
+        "saved": job.saved,
+        "duplicates": job.duplicates,
+        "errors": job.errors,
+        "started": job.started,
+        "finished": job.finished
+    }
+    if results:
+        status["results"] = [
+            {**result, "matches": [{"jd_id": jd_id, "title": title, "score": score, "skill_coverage": cov}
+                                   for jd_id, title, score, cov in result["matches"]]}
+            for result in list(job.results)
+        ]
+    return status
+
+
+# ------------------- 🌐 HTTP API -------------------
+
+def create_app(service=None):
+    """Flask app serving ``service`` (a ``MatchService`` built from the defaults if omitted).
+
+    Endpoints:
+      GET  /health                    liveness and JD count
+      GET  /jds                       the JDs that CVs are matched against
+      POST /match                     best JDs for CV text(s) or one PDF, answered synchronously
+      POST /cvs                       queue PDFs / zips (multipart "files") or {"cvs": [{"id", "text"}]}
+      GET  /jobs/<job_id>             progress and results of a queued submission
+      GET  /jds/<jd_id>/cvs           best indexed CVs for a JD (?k=&min_coverage=)
+      GET  /metrics                   Prometheus metrics
+    """
+    from flask import Flask, g, jsonify, request
+
+    service = service or MatchService()
+    app = Flask(__name__)
+    app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
+
+    def error(message, status=400):
+        return jsonify({"error": message}), status
+
+    def int_arg(source, name, default, high):
+        value = int(source.get(name, default))
+        if not 1 <= value <= high:
+            raise ValueError(f"{name} must be between 1 and {high}")
+        return value
+
+    @app.before_request
+    def start_timer():
+        g.started = time.perf_counter()
+
+    @app.after_request
+    def record(response):
+        endpoint = request.url_rule.rule if request.url_rule else "unknown"
+        REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+        REQUEST_SECONDS.observe(time.perf_counter() - g.started, endpoint=endpoint)
+        return response
+
+    @app.errorhandler(ValueError)
+    def bad_value(e):
+        return error(str(e))
+
+    @app.errorhandler(BrokenProcessPool)
+    def parser_crashed(e):
+        # BulkMatcher.parse renews its own pool; this covers parsers that cannot
+        response, status = error("The PDF parser crashed; try again", 503)
+        response.headers["Retry-After"] = "1"
+        return response, status
+
+    @app.errorhandler(413)
+    def too_large(e):
+        return error(f"Request larger than {MAX_REQUEST_BYTES // (1024 * 1024)} MB", 413)
+
+    @app.get("/health")
+    def health():
+        return jsonify({"status": "ok", "jds": len(service.jd_ids)})
+
+    @app.get("/jds")
+    def list_jds():
+        return jsonify({"jds": [{"jd_id": jd_id, "title": service.title(jd_id)} for jd_id in service.jd_ids]})
+
+    @app.post("/match")
+    def match():
+        if request.files:
+            upload = request.files.get("file")
+            if upload is None or not upload.filename.lower().endswith(".pdf"):
+                return error('Send one PDF as the multipart field "file"')
+            data = upload.read()
+            if len(data) > MAX_PDF_BYTES:
+                return error(f"PDF larger than {MAX_PDF_BYTES // (1024 * 1024)} MB", 413)
+            parsed = service.parse(upload.filename, data)
+            if not parsed.ok:
+                return error(f"Could not read {upload.filename}: {parsed.error}", 422)
+            texts, k, single = [parsed.text], int_arg(request.form, "k", 3, MAX_K), True
+        else:
+            body = request.get_json(silent=True) or {}
+            single = "texts" not in body
+            texts = [body["text"]] if single and "text" in body else body.get("texts")
+            if not texts or not all(isinstance(text, str) and text.strip() for text in texts):
+                return error('Send {"text": "..."} or {"texts": [...]} with non-empty CV text, or a PDF upload')
+            if any(len(text) > MAX_TEXT_CHARS for text in texts):
+                return error(f"CV text longer than {MAX_TEXT_CHARS} characters", 413)
+            k = int_arg(body, "k", 3, MAX_K)
+        matches = service.match(texts, min(k, len(service.jd_ids)))
+        return jsonify({"matches": matches[0]} if single else {"results": matches})
+
+    @app.post("/cvs")
+    def submit_cvs():
+        if request.files:
+            files = [item for upload in request.files.getlist("files")
+                     if upload.filename.lower().endswith((".pdf", ".zip"))
+                     for item in iter_upload_files(upload.filename, upload.read())]
+            if not files:
+                return error('Send PDFs or zips of PDFs as the multipart field "files"')
+            job = service.submit_files(files)
+        else:
+            cvs = (request.get_json(silent=True) or {}).get("cvs")
+            if not cvs or not all(isinstance(cv, dict) and cv.get("id") and isinstance(cv.get("text"), str)
+                                  for cv in cvs):
+                return error('Send {"cvs": [{"id": "...", "text": "..."}]} or multipart PDF "files"')
+            job = service.submit_texts([(str(cv["id"]), cv["text"]) for cv in cvs])
+        response = jsonify({"job_id": job.id, "status": job.status, "total": job.total})
+        response.status_code = 202
+        response.headers["Location"] = f"/jobs/{job.id}"
+        return response
+
+    @app.get("/jobs/<job_id>")
+    def get_job(job_id):
+        job = service.bulk.job(job_id)
+        if job is None:
+            return error(f"Unknown job {job_id}", 404)
+        return jsonify(job_status(job, results=request.args.get("results", "1") != "0"))
+
+    @app.get("/jds/<jd_id>/cvs")
+    def top_cvs(jd_id):
+        k = int_arg(request.args, "k", 10, MAX_K)
+        min_coverage = float(request.args.get("min_coverage", 0))
+        results = service.top_cvs(jd_id, k, min_coverage)
+        if results is None:
+            return error(f"Unknown JD {jd_id}", 404)
+        return jsonify({"jd_id": jd_id, "title": service.title(jd_id), "candidates": results})
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        return metrics.render_prometheus(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+    return app
+
+
+# ------------------- 🚀 ENTRY POINT -------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Headless matching service: one long-lived process holding the fitted JD matrix.",
+        epilog="The built-in server is threaded. Behind a WSGI server, use one process with many threads "
+               "(e.g. waitress-serve --threads 32 --call service:create_app): every process holds its own "
+               "JD matrix, batcher and parse pool.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--jd-file", default=str(DEFAULT_JD_FILE), help="JD summaries JSON")
+    parser.add_argument("--scorer", choices=list(SCORERS), default="tfidf", help="TF-IDF, embeddings, or a blend")
+    parser.add_argument("--alpha", type=float, help="TF-IDF weight for --scorer hybrid (default 0.5)")
+    parser.add_argument("--embed-model", default=DEFAULT_EMBED_MODEL, help="Ollama embedding model")
+    parser.add_argument("--firestore", action="store_true", help="Also save submitted candidates and matches")
+    parser.add_argument("--workers", type=int, default=None, help="PDF parsing processes (default: all cores)")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="CVs scored in one call")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT * 1000,
+                        help="How long a request waits for others to share its scoring call")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default="flag",
+                        help="Near-duplicate submitted CVs: mark them (flag), drop them (merge) or ignore (off)")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Estimated Jaccard similarity above which two CVs are near-duplicates")
+    args = parser.parse_args(argv)
+
+    db = None
+    if args.firestore:
+        from job_screening import get_db
+        db = get_db()
+    dedup = DedupIndex(threshold=args.dedup_threshold) if args.dedup != "off" else None
+    service = MatchService(args.jd_file, scorer=args.scorer, alpha=args.alpha, embed_model=args.embed_model, db=db,
+                           dedup=dedup, dedup_mode=args.dedup, workers=args.workers, max_batch=args.max_batch,
+                           max_wait=args.max_wait_ms / 1000)
+    print(f"🚀 Matching {len(service.jd_ids)} JDs on http://{args.host}:{args.port}")
+    create_app(service).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
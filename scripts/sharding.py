@@ -0,0 +1,480 @@
+import argparse
+import csv
+import datetime
+import hashlib
+import heapq
+import json
+import multiprocessing
+import os
+import pickle
+import socket
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from cv_ingest import iter_parse
+from demo_display import ConsoleReporter
+from embeddings import DEFAULT_EMBED_MODEL, SCORERS, Embedder, HybridScorer
+from extraction_cache import ExtractionCache
+from matching import MatchEngine, top_k
+import metrics
+from skills import SkillGate, jd_bitsets
+from streaming import chunked, iter_cv_files
+from text_prep import TEXT_PREP_VERSION
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SCRIPT_DIR, "..", "data")
+DEFAULT_JOB_DIR = Path(SCRIPT_DIR).parent / "output" / "shards"
+
+QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    heartbeat_at REAL,
+    finished_at REAL,
+    cvs INTEGER,
+    last_error TEXT
+);
+"""
+
+SHARD_SECONDS = metrics.histogram("intelliscreen_shard_seconds", "Wall time to score one shard")
+
+
+# ------------------- 🔍 RANKING -------------------
+
+def rank_key(item):
+    """Order for (score, cv_id) pairs: best score first, ties by CV id.
+
+    Every top-k selection goes through this key, so the merged ranking does
+    not depend on how CVs were split into shards or chunks.
+    """
+    return -item[0], item[1]
+
+
+def merge_top(lists, k):
+    """The ``k`` best (score, cv_id) pairs across ``lists``."""
+    return heapq.nsmallest(k, (item for items in lists for item in items), key=rank_key)
+
+
+def chunk_jd_top(scores, cv_ids, k):
+    """Per JD column, the ``k`` best (score, cv_id) pairs of one chunk (scores > 0 only)."""
+    k = min(k, scores.shape[0])
+    if not k:
+        return [[] for _ in range(scores.shape[1])]
+    # Everything tied with the k-th score stays a candidate so ties resolve by id.
+    kth = -np.partition(-scores, k - 1, axis=0)[k - 1]
+    tops = []
+    for col, bound in enumerate(kth):
+        column = scores[:, col]
+        rows = np.nonzero((column >= bound) & (column > 0))[0]
+        tops.append(merge_top([[(float(column[i]), cv_ids[i]) for i in rows]], k))
+    return tops
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def shard_of(content_hash, shards):
+    return int(content_hash[:12], 16) % shards
+
+
+# ------------------- 🗂️ QUEUE -------------------
+
+class ShardQueue:
+    """SQLite work queue of shard ids shared by every worker of a job.
+
+    A worker claims one pending shard at a time and heartbeats while it
+    scores; a shard whose heartbeat is older than ``lease`` seconds (its
+    worker died) is handed out again. The database only needs a
+    filesystem every worker can lock, so local disks and shared mounts
+    with working locks both do.
+    """
+
+    def __init__(self, path, lease=600, max_attempts=3):
+        self.path = str(path)
+        self.lease = lease
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.executescript(QUEUE_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def reset(self, shards):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM shards")
+            conn.executemany("INSERT INTO shards (id) VALUES (?)", [(i,) for i in range(shards)])
+
+    def claim(self, worker):
+        """Mark the next available shard as running for ``worker``; None when all are taken."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # A worker that died on the last allowed attempt counts as a failure, like one that raised
+            conn.execute("UPDATE shards SET status = 'failed', last_error = 'lease expired' "
+                         "WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+                         (now - self.lease, self.max_attempts))
+            row = conn.execute(
+                "SELECT id FROM shards WHERE status = 'pending' OR (status = 'running' AND heartbeat_at < ?) "
+                "ORDER BY id LIMIT 1", (now - self.lease,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE shards SET status = 'running', worker = ?, attempts = attempts + 1, "
+                             "heartbeat_at = ? WHERE id = ?", (worker, now, row["id"]))
+            conn.execute("COMMIT")
+        return None if row is None else row["id"]
+
+    def heartbeat(self, shard):
+        with self._connect() as conn:
+            conn.execute("UPDATE shards SET heartbeat_at = ? WHERE id = ?", (time.time(), shard))
+
+    def done(self, shard, cvs):
+        with self._connect() as conn:
+            conn.execute("UPDATE shards SET status = 'done', finished_at = ?, cvs = ?, last_error = NULL "
+                         "WHERE id = ?", (time.time(), cvs, shard))
+
+    def fail(self, shard, error):
+        with self._connect() as conn:
+            conn.execute("UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                         "last_error = ? WHERE id = ?", (self.max_attempts, str(error)[:500], shard))
+
+    def counts(self):
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall())
+
+    def rows(self):
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute("SELECT * FROM shards ORDER BY id")]
+
+
+# ------------------- 🧭 PLAN -------------------
+
+class ShardJob:
+    """Files of one sharded run under ``job_dir``.
+
+    ``plan.json`` (JDs and settings), ``engine.pkl`` (the coordinator's
+    fitted JD matrix), ``shards/NNNN.txt`` (CV paths per shard),
+    ``queue.db`` and ``parts/NNNN.npz`` (each shard's partial top-k).
+    """
+
+    def __init__(self, job_dir=DEFAULT_JOB_DIR):
+        self.job_dir = Path(job_dir)
+
+    @property
+    def queue(self):
+        return ShardQueue(self.job_dir / "queue.db")
+
+    def shard_file(self, shard):
+        return self.job_dir / "shards" / f"{shard:04d}.txt"
+
+    def part_file(self, shard):
+        return self.job_dir / "parts" / f"{shard:04d}.npz"
+
+    def load_plan(self):
+        with open(self.job_dir / "plan.json", encoding="utf-8") as f:
+            return json.load(f)
+
+    def load_engine(self):
+        with open(self.job_dir / "engine.pkl", "rb") as f:
+            return pickle.load(f)
+
+
+def plan(args, reporter):
+    """Summarize JDs, fit the engine once and split the CV folder into shards by content hash."""
+    from job_screening import load_jobs, summarize_jds
+
+    job = ShardJob(args.job_dir)
+    if (job.job_dir / "plan.json").exists() and not args.force:
+        raise SystemExit(f"{job.job_dir} already holds a job; pass --force to replace it")
+
+    jd_rows = load_jobs(args.jd_file)
+    jd_titles = {jd_id: job_title for jd_id, job_title, _ in jd_rows}
+    jd_summaries = summarize_jds(None, jd_rows, reporter, args.concurrency)
+    jd_ids = [jd_id for jd_id, summary in jd_summaries.items() if summary]
+    engine = MatchEngine().fit([jd_summaries[jd_id] for jd_id in jd_ids])
+
+    # The same bytes always land in the same shard, whatever the file is called
+    reporter.stage("scan", f"🔀 Hashing CVs in {args.cv_dir} into {args.shards} shards")
+    paths = sorted(iter_cv_files(args.cv_dir))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        hashes = list(pool.map(file_hash, paths))
+    shards = [[] for _ in range(args.shards)]
+    for path, content_hash in zip(paths, hashes):
+        shards[shard_of(content_hash, args.shards)].append(os.path.abspath(path))
+
+    for sub in ("shards", "parts"):
+        (job.job_dir / sub).mkdir(parents=True, exist_ok=True)
+        for stale in (job.job_dir / sub).iterdir():
+            stale.unlink()
+    for shard, shard_paths in enumerate(shards):
+        with open(job.shard_file(shard), "w", encoding="utf-8") as f:
+            f.writelines(f"{path}\n" for path in shard_paths)
+    with open(job.job_dir / "engine.pkl", "wb") as f:
+        pickle.dump(engine, f)
+    with open(job.job_dir / "plan.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "cv_dir": os.path.abspath(args.cv_dir),
+            "shards": args.shards,
+            "cvs": len(paths),
+            "top_k": args.top_k,
+            "cv_top_k": args.cv_top_k,
+            "scorer": args.scorer,
+            "alpha": SCORERS[args.scorer] if args.alpha is None else args.alpha,
+            "embed_model": args.embed_model,
+            "min_skill_coverage": args.min_skill_coverage,
+            "text_prep": TEXT_PREP_VERSION,
+            "jd_ids": jd_ids,
+            "jd_titles": {jd_id: jd_titles[jd_id] for jd_id in jd_ids},
+            "jd_summaries": {jd_id: jd_summaries[jd_id] for jd_id in jd_ids}
+        }, f, indent=2)
+    job.queue.reset(args.shards)
+    reporter.stage("plan", f"✅ Planned {len(paths)} CVs x {len(jd_ids)} JDs in {args.shards} shards")
+    return {"cvs": len(paths), "jds": len(jd_ids), "shards": [len(s) for s in shards]}
+
+
+# ------------------- ⚙️ WORKER -------------------
+
+def load_scorer(job, plan_data):
+    scorer = job.load_engine()
+    summaries = [plan_data["jd_summaries"][jd_id] for jd_id in plan_data["jd_ids"]]
+    if plan_data["scorer"] != "tfidf" and plan_data["alpha"] < 1:
+        scorer = HybridScorer(scorer, Embedder(model=plan_data["embed_model"]), summaries, plan_data["alpha"])
+    if plan_data.get("min_skill_coverage"):
+        # CVs without enough of any JD's key skills are not scored at all
+        scorer = SkillGate(scorer, jd_bitsets(summaries), plan_data["min_skill_coverage"])
+    return scorer
+
+
+def score_shard(job, shard, scorer, plan_data, chunk_size=1000, workers=None, on_chunk=None):
+    """Score one shard and write its partial top-k to ``parts/NNNN.npz``.
+
+    The part holds each JD's ``top_k`` best CVs of the shard and each
+    CV's ``cv_top_k`` best JDs; merging parts gives the global rankings.
+    """
+    with open(job.shard_file(shard), encoding="utf-8") as f:
+        paths = f.read().splitlines()
+    n_jds, k, cv_k = len(plan_data["jd_ids"]), plan_data["top_k"], plan_data["cv_top_k"]
+    jd_top = [[] for _ in range(n_jds)]
+    cv_ids, cv_cols, cv_scores, failures = [], [], [], []
+
+    parsed = iter_parse(paths, workers=workers, cache=ExtractionCache())
+    for chunk in chunked(parsed, chunk_size):
+        failures += [os.path.basename(r.path) for r in chunk if not r.ok]
+        ok = sorted((r for r in chunk if r.ok), key=lambda r: r.path)
+        if not ok:
+            continue
+        ids = [os.path.splitext(os.path.basename(r.path))[0] for r in ok]
+        scores = np.asarray(scorer.score_texts([r.text for r in ok]), dtype=np.float32)
+        for col, top in enumerate(chunk_jd_top(scores, ids, k)):
+            jd_top[col] = merge_top([jd_top[col], top], k)
+        cols = top_k(scores, cv_k)
+        cv_ids += ids
+        cv_cols.append(cols.astype(np.int32))
+        cv_scores.append(np.take_along_axis(scores, cols, axis=1))
+        if on_chunk is not None:
+            on_chunk()
+
+    # Parse order varies between runs; store the CVs sorted by id
+    order = np.argsort(np.asarray(cv_ids, dtype=str), kind="stable")
+    width = min(cv_k, n_jds)
+    jd_cv = np.full((n_jds, k), "", dtype=object)
+    jd_score = np.full((n_jds, k), np.nan, dtype=np.float32)
+    for col, top in enumerate(jd_top):
+        for rank, (score, cv_id) in enumerate(top):
+            jd_cv[col, rank], jd_score[col, rank] = cv_id, score
+
+    part = job.part_file(shard)
+    tmp = part.with_name(f"{part.stem}.{socket.gethostname()}.{os.getpid()}.tmp.npz")
+    np.savez(
+        tmp,
+        cv_ids=np.asarray(cv_ids, dtype=str)[order],
+        cv_cols=np.vstack(cv_cols)[order] if cv_cols else np.zeros((0, width), dtype=np.int32),
+        cv_scores=np.vstack(cv_scores)[order] if cv_scores else np.zeros((0, width), dtype=np.float32),
+        jd_cv=jd_cv.astype(str),
+        jd_score=jd_score,
+        failures=np.asarray(failures, dtype=str)
+    )
+    os.replace(tmp, part)
+    return len(cv_ids)
+
+
+def work(job_dir, worker=None, workers=None, chunk_size=1000, lease=600):
+    """Claim and score shards until none are left; returns the number of shards scored."""
+    job = ShardJob(job_dir)
+    plan_data = job.load_plan()
+    scorer = load_scorer(job, plan_data)
+    queue = ShardQueue(job.job_dir / "queue.db", lease=lease)
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    scored = 0
+    while True:
+        shard = queue.claim(worker)
+        if shard is None:
+            return scored
+        print(f"⚙️ {worker} scoring shard {shard}")
+        try:
+            with SHARD_SECONDS.time():
+                cvs = score_shard(job, shard, scorer, plan_data, chunk_size, workers,
+                                  on_chunk=lambda: queue.heartbeat(shard))
+        except Exception as e:
+            print(f"⚠️ Shard {shard} failed: {e}")
+            queue.fail(shard, e)
+            continue
+        queue.done(shard, cvs)
+        scored += 1
+
+
+def _work_process(job_dir, workers, chunk_size, lease):
+    work(job_dir, workers=workers, chunk_size=chunk_size, lease=lease)
+
+
+# ------------------- 🧩 MERGE -------------------
+
+def merge(job_dir, output=None, partial=False):
+    """Combine every shard's partial top-k into global rankings.
+
+    Returns ``{jd_id: [(cv_id, score), ...]}`` (best first) and, with
+    ``output``, writes ``rankings.json`` plus each CV's top JDs to
+    ``cv_matches.csv`` in that directory.
+    """
+    job = ShardJob(job_dir)
+    plan_data = job.load_plan()
+    counts = job.queue.counts()
+    if counts.get("done", 0) != plan_data["shards"] and not partial:
+        raise RuntimeError(f"Not every shard is done yet: {counts}")
+
+    jd_ids, k = plan_data["jd_ids"], plan_data["top_k"]
+    jd_top = [[] for _ in jd_ids]
+    out_dir = Path(output) if output else None
+    cv_file = None
+    if out_dir is not None:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        cv_file = open(out_dir / "cv_matches.csv", "w", encoding="utf-8", newline="")
+        cv_writer = csv.writer(cv_file)
+        cv_writer.writerow(["cv_id", "rank", "jd_id", "job_title", "score"])
+
+    cvs, failures = 0, []
+    try:
+        for shard in range(plan_data["shards"]):
+            if not job.part_file(shard).exists():
+                continue
+            with np.load(job.part_file(shard)) as part:
+                for col in range(len(jd_ids)):
+                    top = [(float(s), str(c)) for c, s in zip(part["jd_cv"][col], part["jd_score"][col]) if c]
+                    jd_top[col] = merge_top([jd_top[col], top], k)
+                cvs += len(part["cv_ids"])
+                failures += part["failures"].tolist()
+                if cv_file is not None:
+                    for cv_id, cols, scores in zip(part["cv_ids"], part["cv_cols"], part["cv_scores"]):
+                        for rank, (col, score) in enumerate(zip(cols, scores), 1):
+                            jd_id = jd_ids[col]
+                            cv_writer.writerow([cv_id, rank, jd_id, plan_data["jd_titles"][jd_id],
+                                                round(float(score), 2)])
+    finally:
+        if cv_file is not None:
+            cv_file.close()
+
+    rankings = {jd_id: [(cv_id, round(score, 2)) for score, cv_id in top] for jd_id, top in zip(jd_ids, jd_top)}
+    if out_dir is not None:
+        with open(out_dir / "rankings.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "summary": {"cvs": cvs, "jds": len(jd_ids), "shards": counts, "parse_failures": failures},
+                "rankings": {jd_id: {"job_title": plan_data["jd_titles"][jd_id],
+                                     "candidates": [{"cv_id": c, "score": s} for c, s in ranked]}
+                             for jd_id, ranked in rankings.items()}
+            }, f, indent=2)
+    return rankings, {"cvs": cvs, "parse_failures": failures}
+
+
+def sync(rankings, writer):
+    """Write each JD's merged top candidates as ``matches`` documents."""
+    from job_screening import save_match
+
+    for jd_id, ranked in rankings.items():
+        for cv_id, score in ranked:
+            save_match(writer, jd_id, cv_id, score)
+
+
+# ------------------- 🚀 MAIN EXECUTION -------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sharded batch scoring: plan on one machine, run workers anywhere the job dir is shared, merge.")
+    parser.add_argument("--job-dir", default=DEFAULT_JOB_DIR, help="Shared directory holding the job")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("plan", help="Summarize JDs, fit the engine and split CVs into shards")
+    p.add_argument("--cv-dir", default=os.path.join(DATA_DIR, "CVs1"), help="Folder of PDF CVs")
+    p.add_argument("--jd-file", default=os.path.join(DATA_DIR, "job_description.csv"), help="Job description CSV")
+    p.add_argument("--shards", type=int, default=64, help="Number of shards (several per worker balances load)")
+    p.add_argument("--top-k", type=int, default=100, help="Candidates kept per JD")
+    p.add_argument("--cv-top-k", type=int, default=3, help="Matches kept per CV")
+    p.add_argument("--scorer", choices=list(SCORERS), default="tfidf", help="TF-IDF, embeddings, or a blend")
+    p.add_argument("--alpha", type=float, help="TF-IDF weight for --scorer hybrid (default 0.5)")
+    p.add_argument("--embed-model", default=DEFAULT_EMBED_MODEL, help="Ollama embedding model")
+    p.add_argument("--min-skill-coverage", type=float, default=0,
+                   help="Only score CVs covering at least this percent of some JD's key skills")
+    p.add_argument("--concurrency", type=int, default=4, help="Parallel Ollama requests")
+    p.add_argument("--force", action="store_true", help="Replace an existing job in --job-dir")
+
+    w = sub.add_parser("worker", help="Score shards until the queue is empty")
+    w.add_argument("--processes", type=int, default=1, help="Worker processes to run on this machine")
+    w.add_argument("--workers", type=int, default=None, help="PDF parsing processes per worker")
+    w.add_argument("--chunk-size", type=int, default=1000, help="CVs scored together")
+    w.add_argument("--lease", type=float, default=600, help="Seconds without a heartbeat before a shard is retried")
+
+    m = sub.add_parser("merge", help="Combine shard results into global rankings")
+    m.add_argument("--output", help="Directory for rankings.json and cv_matches.csv (default: <job-dir>/merged)")
+    m.add_argument("--partial", action="store_true", help="Merge whatever shards are done")
+    m.add_argument("--firestore", action="store_true", help="Also write each JD's top candidates to Firestore")
+
+    sub.add_parser("status", help="Show shard progress")
+    args = parser.parse_args(argv)
+
+    if args.command == "plan":
+        print(json.dumps(plan(args, ConsoleReporter())))
+    elif args.command == "worker":
+        if args.processes == 1:
+            scored = work(args.job_dir, workers=args.workers, chunk_size=args.chunk_size, lease=args.lease)
+            print(f"✅ Scored {scored} shard(s)")
+        else:
+            workers = args.workers or max(1, (os.cpu_count() or 1) // args.processes)
+            procs = [multiprocessing.Process(target=_work_process,
+                                             args=(args.job_dir, workers, args.chunk_size, args.lease))
+                     for _ in range(args.processes)]
+            for proc in procs:
+                proc.start()
+            for proc in procs:
+                proc.join()
+        print(json.dumps(ShardJob(args.job_dir).queue.counts()))
+    elif args.command == "merge":
+        output = args.output or Path(args.job_dir) / "merged"
+        rankings, summary = merge(args.job_dir, output, args.partial)
+        if args.firestore:
+            from firestore_writer import BatchWriter
+            from job_screening import get_db
+
+            with BatchWriter(get_db()) as writer:
+                sync(rankings, writer)
+        print(f"✅ Merged {summary['cvs']} CVs into {output}")
+    elif args.command == "status":
+        job = ShardJob(args.job_dir)
+        print(json.dumps({"counts": job.queue.counts(), "shards": job.queue.rows()}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+import json
+import re
+import threading
+import weakref
+
+import numpy as np
+
+from text_prep import normalize, tokenize, tokens, vocab_of
+
+# Bump whenever SKILLS changes so stored CV skill bitsets are recomputed.
+SKILLS_VERSION = "1"
+
+# Canonical skill -> the ways JDs and CVs write it. Aliases go through the
+# shared tokenizer, so text_prep's synonyms (ml, k8s, c++, ...) already
+# collapse to one token and do not need repeating here. Single-letter
+# names (C, R) cannot survive tokenization and are left out.
+SKILLS = {
+    # Languages
+    "Python": ["python"],
+    "Java": ["java"],
+    "C++": ["c++"],
+    "C#": ["c#"],
+    "JavaScript": ["javascript"],
+    "TypeScript": ["typescript"],
+    "Go": ["golang"],
+    "Rust": ["rust"],
+    "Scala": ["scala"],
+    "Kotlin": ["kotlin"],
+    "Swift": ["swift"],
+    "PHP": ["php"],
+    "Ruby": ["ruby"],
+    "MATLAB": ["matlab"],
+    "Solidity": ["solidity"],
+    "Embedded C": ["embedded programming", "embedded software", "firmware"],
+    "SQL": ["sql", "sql server", "t-sql", "pl/sql"],
+    "HTML/CSS": ["html", "css", "html5", "css3"],
+    # Web and application frameworks
+    "React": ["react"],
+    "Angular": ["angular"],
+    "Vue": ["vue"],
+    "Node.js": ["node.js", "express.js", "expressjs"],
+    "Django": ["django"],
+    "Flask": ["flask"],
+    "Spring": ["spring boot", "spring framework", "spring mvc"],
+    ".NET": [".net", "asp.net"],
+    "REST APIs": ["rest", "restful apis", "api design", "api development"],
+    "GraphQL": ["graphql"],
+    "Microservices": ["microservices", "microservice"],
+    # Data
+    "NoSQL": ["nosql", "cassandra", "dynamodb", "redis"],
+    "MongoDB": ["mongodb"],
+    "PostgreSQL": ["postgresql"],
+    "MySQL": ["mysql"],
+    "Oracle": ["oracle"],
+    "Database Design": ["database design", "data modeling", "data modelling", "database administration"],
+    "Big Data": ["big data", "hadoop", "hive"],
+    "Spark": ["spark", "pyspark"],
+    "Kafka": ["kafka"],
+    "ETL": ["etl", "data pipelines", "data pipeline", "data warehousing", "airflow"],
+    "Data Analysis": ["data analysis", "data analytics", "pandas", "numpy"],
+    "Data Visualization": ["data visualization", "data visualisation", "dashboards"],
+    "Power BI": ["power bi"],
+    "Tableau": ["tableau"],
+    "Excel": ["microsoft excel", "ms excel", "advanced excel", "spreadsheets", "pivot tables", "vlookup"],
+    "Statistics": ["statistics", "statistical analysis", "statistical modeling", "probability"],
+    # AI / ML
+    "Machine Learning": ["machine learning"],
+    "Deep Learning": ["deep learning", "neural networks"],
+    "NLP": ["natural language processing"],
+    "Computer Vision": ["computer vision", "opencv", "image processing"],
+    "Artificial Intelligence": ["artificial intelligence"],
+    "Data Science": ["data science"],
+    "TensorFlow": ["tensorflow", "keras"],
+    "PyTorch": ["pytorch"],
+    "Scikit-learn": ["scikit-learn"],
+    # Cloud and operations
+    "AWS": ["aws"],
+    "Azure": ["azure"],
+    "Google Cloud": ["gcp"],
+    "Cloud Computing": ["cloud computing", "cloud infrastructure", "cloud platforms", "cloud architecture"],
+    "Docker": ["docker", "containerization"],
+    "Kubernetes": ["kubernetes"],
+    "Terraform": ["terraform", "infrastructure as code", "cloudformation"],
+    "Ansible": ["ansible", "puppet", "configuration management"],
+    "CI/CD": ["ci/cd", "jenkins", "continuous integration", "continuous delivery", "continuous deployment"],
+    "DevOps": ["devops"],
+    "Linux": ["linux", "unix", "bash", "shell scripting"],
+    "Git": ["git", "github", "gitlab", "version control"],
+    "Monitoring": ["monitoring", "prometheus", "grafana", "observability"],
+    # Networks and security
+    "Networking": ["networking", "network design", "tcp/ip", "routing", "switching", "lan", "wan", "dns"],
+    "Cisco": ["cisco", "ccna", "ccnp"],
+    "Network Security": ["network security", "firewalls", "firewall", "vpn", "intrusion detection"],
+    "Cloud Security": ["cloud security"],
+    "Cybersecurity": ["cybersecurity", "cyber security", "information security", "security"],
+    "Penetration Testing": ["penetration testing", "ethical hacking", "vulnerability assessment",
+                            "vulnerability management", "metasploit", "burp suite"],
+    "SIEM": ["siem", "splunk", "security monitoring", "incident response"],
+    "Cryptography": ["cryptography", "encryption"],
+    "Risk Management": ["risk management", "risk assessment"],
+    "Compliance": ["compliance", "iso 27001", "gdpr", "auditing"],
+    # Engineering practice
+    "System Design": ["systems design", "systems architecture", "software architecture", "design patterns",
+                      "distributed systems", "distributed computing", "scalability"],
+    "Object-Oriented Programming": ["object-oriented programming", "oop", "object oriented design"],
+    "Data Structures & Algorithms": ["data structures", "algorithms"],
+    "Software Testing": ["software testing", "quality assurance", "test cases", "test planning",
+                         "manual testing", "unit testing"],
+    "Test Automation": ["test automation", "automation testing", "automated testing", "selenium",
+                        "cypress", "junit", "pytest"],
+    "Performance Testing": ["performance testing", "load testing", "jmeter"],
+    "Agile": ["agile", "scrum", "kanban", "sprint planning"],
+    "Jira": ["jira", "confluence"],
+    "Troubleshooting": ["troubleshooting", "debugging"],
+    # Specialist domains
+    "Blockchain": ["blockchain", "ethereum", "web3", "hyperledger"],
+    "Smart Contracts": ["smart contracts", "smart contract"],
+    "Robotics": ["robotics", "ros", "robot operating system"],
+    "Embedded Systems": ["embedded systems", "microcontrollers", "rtos", "real-time operating systems", "arduino",
+                         "raspberry pi"],
+    "Control Systems": ["control systems", "control theory", "plc"],
+    "Mobile Development": ["android", "ios", "mobile development", "flutter", "react native"],
+    # Product and design
+    "Product Management": ["product management", "product strategy", "product roadmap", "roadmapping",
+                           "product lifecycle"],
+    "Project Management": ["project management", "pmp", "stakeholder management"],
+    "Market Research": ["market research", "market analysis", "competitive analysis"],
+    "UX Design": ["ux", "user experience", "ux design", "usability testing", "interaction design"],
+    "UI Design": ["ui design", "user interface design", "visual design"],
+    "User Research": ["user research", "user testing", "personas"],
+    "Wireframing & Prototyping": ["wireframing", "prototyping", "wireframes", "prototypes"],
+    "Figma": ["figma", "adobe xd", "invision"],
+}
+
+SKILL_NAMES = list(SKILLS)
+WORDS = (len(SKILL_NAMES) + 63) // 64
+
+# Set bits per byte value, for numpy releases without ``bitwise_count``.
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+KEY_SKILLS_PATTERN = re.compile(r'"key[_ ]?skills"\s*:\s*\[(.*?)\]', re.S | re.I)
+
+
+# ------------------- 🧩 EXTRACTION -------------------
+
+_alias_lock = threading.Lock()
+_alias_tables = weakref.WeakKeyDictionary()
+
+
+def _aliases(vocab):
+    # Token-id n-gram -> bit, in the shared vocabulary so CV text is matched
+    # on the same memoised token ids the scorers use. Built on first use of
+    # each vocabulary: the tokenizer loads scikit-learn's stop words.
+    table = _alias_tables.get(vocab)
+    if table is not None:
+        return table
+    with _alias_lock:
+        table = _alias_tables.get(vocab)
+        if table is None:
+            aliases = {}
+            for bit, name in enumerate(SKILL_NAMES):
+                for alias in SKILLS[name]:
+                    words = tokenize(alias)
+                    # "system design" minus the stop word "system" would match any "design"
+                    if words and (len(words) > 1 or len(normalize(alias).split()) == 1):
+                        aliases.setdefault(tuple(vocab.id(word) for word in words), bit)
+            table = _alias_tables[vocab] = aliases, max(len(key) for key in aliases)
+        return table
+
+
+def find_skills(text):
+    """Sorted bit positions of the dictionary skills mentioned in ``text``.
+
+    ``text`` may also be a ``text_prep.tokens`` array. Longest alias wins
+    at each position, so "cloud security" does not also count as plain
+    "security".
+    """
+    ids = text if isinstance(text, np.ndarray) else tokens(text or "")
+    aliases, longest = _aliases(vocab_of(ids))
+    words = ids.tolist()
+    found = set()
+    i = 0
+    while i < len(words):
+        for n in range(min(longest, len(words) - i), 0, -1):
+            bit = aliases.get(tuple(words[i:i + n]))
+            if bit is not None:
+                found.add(bit)
+                i += n
+                break
+        else:
+            i += 1
+    return sorted(found)
+
+
+def parse_json_block(text):
+    """A JSON object from model output, tolerating code fences and trailing commas; None if there is none."""
+    text = (text or "").strip()
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text, flags=re.I)
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        data = json.loads(re.sub(r",\s*([\]}])", r"\1", text[start:end + 1]))
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def key_skills(summary, structured=None):
+    """The "Key Skills" list of a JD summary, or [] if the summary has none."""
+    for data in (structured, parse_json_block(summary)):
+        for key, value in (data or {}).items():
+            if re.sub(r"[\s_]+", "", key).lower() == "keyskills" and isinstance(value, list):
+                return [str(skill) for skill in value]
+    match = KEY_SKILLS_PATTERN.search(summary or "")
+    return re.findall(r'"([^"]+)"', match.group(1)) if match else []
+
+
+def jd_skills(summary, structured=None):
+    """Bit positions a JD requires: its mapped Key Skills, else every skill its summary names."""
+    listed = key_skills(summary, structured)
+    if listed:
+        found = sorted({bit for skill in listed for bit in find_skills(skill)})
+        if found:
+            return found
+    return find_skills(summary)
+
+
+def skill_names(bits):
+    return [SKILL_NAMES[bit] for bit in bits]
+
+
+# ------------------- 🧮 BITSETS -------------------
+
+def to_bitset(bits):
+    """Pack bit positions into a (WORDS,) uint64 array."""
+    words = np.zeros(WORDS, dtype=np.uint64)
+    for bit in bits:
+        words[bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+    return words
+
+
+def bitsets(texts):
+    """(n, WORDS) uint64 skill bitsets for CV texts."""
+    out = np.zeros((len(texts), WORDS), dtype=np.uint64)
+    for row, text in enumerate(texts):
+        out[row] = to_bitset(find_skills(text))
+    return out
+
+
+def jd_bitsets(summaries, structured=None):
+    """(n_jds, WORDS) uint64 required-skill bitsets for JD summaries (see ``jd_skills``)."""
+    structured = structured or [None] * len(summaries)
+    out = np.zeros((len(summaries), WORDS), dtype=np.uint64)
+    for row, (summary, data) in enumerate(zip(summaries, structured)):
+        out[row] = to_bitset(jd_skills(summary, data))
+    return out
+
+
+def from_bitset(words):
+    """Bit positions set in one bitset."""
+    bytes_ = np.ascontiguousarray(words, dtype=np.uint64).view(np.uint8)
+    return [int(i) for i in np.flatnonzero(np.unpackbits(bytes_, bitorder="little"))]
+
+
+def popcount(words):
+    """Set bits per row of a (..., WORDS) uint64 array."""
+    words = np.ascontiguousarray(words, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):  # numpy 2.0+
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    return POPCOUNT[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+def coverage(cv_bits, jd_bits):
+    """(n_cvs, n_jds) share of each JD's skills found in each CV, in percent.
+
+    One broadcast AND and popcount over the whole CV block. A JD with no
+    mapped skills constrains nothing and covers 100%.
+    """
+    cv_bits = np.asarray(cv_bits, dtype=np.uint64).reshape(-1, WORDS)
+    jd_bits = np.asarray(jd_bits, dtype=np.uint64).reshape(-1, WORDS)
+    required = popcount(jd_bits)
+    found = popcount(cv_bits[:, None, :] & jd_bits[None, :, :])
+    return np.where(required > 0, found * 100.0 / np.maximum(required, 1), 100.0)
+
+
+# ------------------- 🚦 PREFILTER -------------------
+
+class SkillGate:
+    """Drop-in for ``MatchEngine.score_texts`` that skips CVs lacking required skills.
+
+    CV bitsets are compared with the JD bitsets first; only CVs reaching
+    ``min_coverage`` (percent) for at least one JD go to the wrapped
+    scorer, and pairs below it score 0. ``last_coverage`` holds the
+    coverage matrix of the most recent call so callers can report it.
+    """
+
+    def __init__(self, scorer, jd_bits, min_coverage=0.0):
+        self.scorer = scorer
+        self.jd_bits = np.asarray(jd_bits, dtype=np.uint64).reshape(-1, WORDS)
+        self.min_coverage = min_coverage
+        self.last_coverage = None
+        self.skipped = 0
+
+    def score_texts(self, cv_texts):
+        cv_texts = list(cv_texts)
+        cov = self.last_coverage = coverage(bitsets(cv_texts), self.jd_bits)
+        passed = cov >= self.min_coverage
+        keep = np.flatnonzero(passed.any(axis=1))
+        scores = np.zeros(cov.shape)
+        self.skipped += len(cv_texts) - len(keep)
+        if len(keep):
+            scores[keep] = self.scorer.score_texts([cv_texts[i] for i in keep])
+        scores[~passed] = 0.0
+        return scores
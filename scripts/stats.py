@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+STATS_COLLECTION = "stats"
+SUMMARY_DOC = "summary"
+HIST_BINS = 10  # 10-point score buckets: 0-10, 10-20, ... 90-100
+DEFAULT_TTL = 30  # seconds
+
+logger = logging.getLogger(__name__)
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _cached(key, ttl, compute):
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None and now - hit[0] < ttl:
+            return hit[1]
+    value = compute()
+    with _cache_lock:
+        _cache[key] = (now, value)
+    return value
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+# ------------------- 📊 READING -------------------
+
+def get_stats(db, ttl=DEFAULT_TTL):
+    """Return (candidates, matches, avg_score, interviews) for the dashboard.
+
+    Uses server-side count/avg aggregation queries, so the cost no longer
+    grows with the number of stored documents. Clients without aggregation
+    support fall back to the counters maintained by the ``record_*``
+    helpers. Results are cached in-process for ``ttl`` seconds.
+    """
+    def compute():
+        try:
+            return _aggregate(db)
+        except Exception as e:
+            logger.info("Aggregation queries unavailable (%s), using stored counters", e)
+            return _from_counters(db)
+    return _cached(("stats", id(db)), ttl, compute)
+
+
+def _aggregate_value(query, **aggregations):
+    agg = None
+    for alias, (kind, *field) in aggregations.items():
+        target = query if agg is None else agg
+        agg = getattr(target, kind)(*field, alias=alias)
+    values = {}
+    for result in agg.get():
+        for item in result if isinstance(result, list) else [result]:
+            values[item.alias] = item.value
+    return values
+
+
+def _aggregate(db):
+    candidates = _aggregate_value(db.collection("candidates"), n=("count",))["n"]
+    matches = _aggregate_value(db.collection("matches"), n=("count",), avg=("avg", "score"))
+    interviews = _aggregate_value(db.collection("interviews"), n=("count",))["n"]
+    return int(candidates), int(matches["n"]), float(matches["avg"] or 0), int(interviews)
+
+
+def _from_counters(db):
+    doc = db.collection(STATS_COLLECTION).document(SUMMARY_DOC).get()
+    data = doc.to_dict() if doc.exists else {}
+    matches = data.get("matches", 0)
+    avg_score = data.get("score_sum", 0.0) / matches if matches else 0
+    return data.get("candidates", 0), matches, avg_score, data.get("interviews", 0)
+
+
+def get_jd_histograms(db, ttl=DEFAULT_TTL):
+    """{jd_id: {"count", "avg", "hist"}} from the per-JD score counters."""
+    def compute():
+        histograms = {}
+        for doc in db.collection(STATS_COLLECTION).where("kind", "==", "jd").stream():
+            data = doc.to_dict()
+            count = data.get("count", 0)
+            hist = data.get("hist", {})
+            histograms[data["jd_id"]] = {
+                "count": count,
+                "avg": data.get("score_sum", 0.0) / count if count else 0,
+                "hist": [hist.get(str(b), 0) for b in range(HIST_BINS)]
+            }
+        return histograms
+    return _cached(("jd_hist", id(db)), ttl, compute)
+
+
+# ------------------- ✍️ WRITING -------------------
+
+def histogram(scores):
+    """Counts of ``scores`` (percent) in HIST_BINS equal buckets."""
+    scores = np.clip(np.asarray(scores, dtype=np.float64).ravel(), 0, 100)
+    return np.histogram(scores, bins=HIST_BINS, range=(0, 100))[0]
+
+
+def record_counts(writer, candidates=0, matches=0, score_sum=0.0, interviews=0):
+    """Queue increments of the global counters on ``writer``."""
+    updates = {name: value for name, value in (
+        ("candidates", candidates), ("matches", matches),
+        ("score_sum", float(score_sum)), ("interviews", interviews)
+    ) if value}
+    if updates:
+        writer.increment(STATS_COLLECTION, SUMMARY_DOC, updates)
+
+
+def record_jd_scores(writer, jd_id, added=(), removed=()):
+    """Queue count, score sum and histogram changes for one JD."""
+    added = np.asarray(added, dtype=np.float64).ravel()
+    removed = np.asarray(removed, dtype=np.float64).ravel()
+    count = len(added) - len(removed)
+    score_sum = float(added.sum() - removed.sum())
+    hist = histogram(added) - histogram(removed)
+    if not count and not score_sum and not hist.any():
+        return
+    doc_id = f"jd_{jd_id}"
+    writer.set(STATS_COLLECTION, doc_id, {"kind": "jd", "jd_id": jd_id}, merge=True)
+    writer.increment(STATS_COLLECTION, doc_id, {
+        "count": count,
+        "score_sum": score_sum,
+        "hist": {str(b): int(n) for b, n in enumerate(hist) if n}
+    })
+
+
+def record_matches(writer, jd_scores):
+    """Counters for newly added ``(jd_id, score)`` matches."""
+    jd_scores = list(jd_scores)
+    record_counts(writer, matches=len(jd_scores), score_sum=sum(score for _, score in jd_scores))
+    by_jd = {}
+    for jd_id, score in jd_scores:
+        by_jd.setdefault(jd_id, []).append(score)
+    for jd_id, scores in by_jd.items():
+        record_jd_scores(writer, jd_id, added=scores)
+
+
+def record_score_matrix_change(writer, old_scores, old_jd_ids, new_scores, new_jd_ids):
+    """Counters for replacing a stored CV x JD score matrix with a new one."""
+    old_scores = np.asarray(old_scores, dtype=np.float64)
+    new_scores = np.asarray(new_scores, dtype=np.float64)
+    record_counts(writer, matches=new_scores.size - old_scores.size,
+                  score_sum=new_scores.sum() - old_scores.sum())
+    old_cols = {jd_id: j for j, jd_id in enumerate(old_jd_ids)}
+    new_cols = {jd_id: j for j, jd_id in enumerate(new_jd_ids)}
+    for jd_id in set(old_cols) | set(new_cols):
+        added = new_scores[:, new_cols[jd_id]] if jd_id in new_cols else ()
+        removed = old_scores[:, old_cols[jd_id]] if jd_id in old_cols else ()
+        record_jd_scores(writer, jd_id, added=added, removed=removed)
@@ -0,0 +1,87 @@
+import csv
+import json
+import os
+import sys
+from itertools import islice
+
+from matching import top_k
+
+RESULT_FIELDS = ["cv_id", "rank", "jd_id", "job_title", "score", "skill_coverage", "invited", "already_invited"]
+
+
+def chunked(iterable, size):
+    """Yield lists of up to ``size`` items, pulling from ``iterable`` lazily."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_cv_files(cv_folder):
+    """Lazily list PDFs in ``cv_folder`` (directory order, nothing held in memory)."""
+    with os.scandir(cv_folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(".pdf"):
+                yield entry.path
+
+
+def score_stream(parsed, engine, chunk_size=1000, k=3, on_scores=None):
+    """Score parsed CVs against every JD a chunk at a time.
+
+    ``parsed`` yields ParsedCV results (e.g. from ``iter_parse``); failures
+    are passed through as ``(result, None)``. Each successful CV comes out
+    as ``(result, [(jd_col, score), ...])`` with its ``k`` best JDs, best
+    first. Only the current chunk is resident besides the engine's JD
+    matrix, and because everything is pulled lazily the parse pool never
+    runs more than its ``max_pending`` files ahead of scoring.
+    ``on_scores(results, scores)`` sees each chunk's full score matrix,
+    e.g. to append it to a result store.
+    """
+    for chunk in chunked(parsed, chunk_size):
+        ok = [result for result in chunk if result.ok]
+        for result in chunk:
+            if not result.ok:
+                yield result, None
+        if not ok:
+            continue
+        scores = engine.score_texts([result.text for result in ok])
+        if on_scores is not None:
+            on_scores(ok, scores)
+        for result, row, cols in zip(ok, scores, top_k(scores, k)):
+            yield result, [(int(col), float(row[col])) for col in cols]
+
+
+class ResultSink:
+    """Writes matches to ``--output`` as they are produced.
+
+    CSV rows are written straight through. JSON keeps the batch layout,
+    ``{"matches": [...], "summary": {...}}``, but streams the array and
+    appends the summary on ``close``, so nothing accumulates in memory.
+    """
+
+    def __init__(self, path, fmt):
+        self.fmt = fmt
+        self.out = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+        self.count = 0
+        if fmt == "csv":
+            self.csv = csv.DictWriter(self.out, fieldnames=RESULT_FIELDS)
+            self.csv.writeheader()
+        else:
+            self.out.write('{\n  "matches": [')
+
+    def write(self, match):
+        if self.fmt == "csv":
+            self.csv.writerow(match)
+        else:
+            self.out.write(("," if self.count else "") + "\n    " + json.dumps(match))
+        self.count += 1
+
+    def close(self, summary):
+        try:
+            if self.fmt == "json":
+                self.out.write(f'\n  ],\n  "summary": {json.dumps(summary)}\n}}\n')
+        finally:
+            if self.out is not sys.stdout:
+                self.out.close()
@@ -0,0 +1,52 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import metrics
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / "output" / "cache" / "summaries"
+
+CACHE_REQUESTS = metrics.counter("intelliscreen_cache_requests_total", "Cache lookups", ["cache", "result"])
+
+
+def prompt_key(model, options, prompt):
+    """Hash of everything that determines an LLM summary.
+
+    ``prompt`` is the rendered prompt, i.e. the template filled in with the
+    JD text, so any change to the model, its options, the template or the
+    JD gives a new key; identical inputs always give the same one, no
+    matter which JD id or script they come from.
+    """
+    payload = json.dumps([model, options or {}, prompt], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """On-disk cache of JD summaries keyed by ``prompt_key``."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                summary = json.load(f)["summary"]
+        except (OSError, ValueError, KeyError):
+            CACHE_REQUESTS.inc(cache="summary", result="miss")
+            return None
+        CACHE_REQUESTS.inc(cache="summary", result="hit")
+        return summary
+
+    def put(self, key, summary):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "summary": summary}, f)
+        os.replace(tmp, path)
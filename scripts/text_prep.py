@@ -0,0 +1,198 @@
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+
+# Bump whenever normalize/tokenize change so persisted TF-IDF state and indexes are rebuilt.
+TEXT_PREP_VERSION = "1"
+
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+TOKEN_CACHE_SIZE = 10000
+MAX_VOCAB_TERMS = 500_000  # past this, new texts are encoded against a fresh vocabulary
+
+# Spellings of the same skill, mapped to one token. Keys are lower case and
+# match as whole words; multi-word and punctuated names become one token.
+SKILL_SYNONYMS = {
+    "c++": "cplusplus", "cpp": "cplusplus", "c#": "csharp", "f#": "fsharp",
+    ".net": "dotnet", "asp.net": "aspdotnet",
+    "js": "javascript", "ecmascript": "javascript", "ts": "typescript",
+    "node.js": "nodejs", "react.js": "react", "reactjs": "react", "vue.js": "vue", "vuejs": "vue",
+    "angularjs": "angular", "golang": "go_lang",
+    "postgres": "postgresql", "mssql": "sql_server", "ms sql": "sql_server", "sql server": "sql_server",
+    "nosql": "no_sql", "mongo": "mongodb",
+    "k8s": "kubernetes", "ci/cd": "ci_cd", "ci cd": "ci_cd",
+    "aws": "amazon_web_services", "amazon web services": "amazon_web_services",
+    "gcp": "google_cloud", "google cloud": "google_cloud", "google cloud platform": "google_cloud",
+    "ml": "machine_learning", "machine learning": "machine_learning",
+    "dl": "deep_learning", "deep learning": "deep_learning",
+    "ai": "artificial_intelligence", "artificial intelligence": "artificial_intelligence",
+    "nlp": "natural_language_processing", "natural language processing": "natural_language_processing",
+    "computer vision": "computer_vision", "data science": "data_science", "big data": "big_data",
+    "sklearn": "scikit_learn", "scikit-learn": "scikit_learn", "scikit learn": "scikit_learn",
+    "power bi": "power_bi", "powerbi": "power_bi", "restful": "rest", "rest api": "rest",
+}
+
+_SYNONYM_RE = re.compile(
+    r"(?<!\w)(" + "|".join(re.escape(k).replace(r"\ ", " ") for k in sorted(SKILL_SYNONYMS, key=len, reverse=True))
+    + r")(?!\w)"
+)
+
+
+def normalize(text):
+    """NFKC, case-folded, single-spaced text with skill synonyms canonicalised."""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = " ".join(text.split())
+    return _SYNONYM_RE.sub(lambda m: SKILL_SYNONYMS[m.group(1)], text)
+
+
+@lru_cache(maxsize=None)
+def stop_words():
+    # scikit-learn's list; importing sklearn costs about a second, so only on first use
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+    return ENGLISH_STOP_WORDS
+
+
+def tokenize(text):
+    """The one tokenizer for every scorer and index: word tokens minus English stop words."""
+    stop = stop_words()
+    return [token for token in TOKEN_PATTERN.findall(normalize(text)) if token not in stop]
+
+
+class Vocabulary:
+    """Append-only term <-> int32 id mapping; ids never change once assigned."""
+
+    def __init__(self, terms=()):
+        self._lock = threading.Lock()
+        self.terms = []
+        self.ids = {}
+        for term in terms:
+            self.id(term)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def id(self, term):
+        term_id = self.ids.get(term)
+        if term_id is None:
+            with self._lock:
+                term_id = self.ids.get(term)
+                if term_id is None:
+                    term_id = self.ids[term] = len(self.terms)
+                    self.terms.append(term)
+        return term_id
+
+    def encode(self, tokens):
+        ids = np.fromiter((self.id(token) for token in tokens), dtype=np.int32).view(TokenIds)
+        ids.vocab = self
+        return ids
+
+    def decode(self, ids):
+        return [self.terms[i] for i in np.asarray(ids).tolist()]
+
+
+class TokenIds(np.ndarray):
+    """int32 token ids that remember the ``Vocabulary`` they index."""
+
+    def __array_finalize__(self, obj):
+        self.vocab = getattr(obj, "vocab", None)
+
+
+# Shared by every consumer in the process, so a text is tokenized once. A
+# long-running process would grow it without bound, so once it holds
+# MAX_VOCAB_TERMS terms it is swapped for an empty one; arrays encoded
+# before keep their old vocabulary, which is freed with the last of them.
+_vocab = Vocabulary()
+_vocab_lock = threading.Lock()
+
+
+def vocabulary():
+    """The current shared ``Vocabulary``."""
+    global _vocab
+    if len(_vocab) >= MAX_VOCAB_TERMS:
+        with _vocab_lock:
+            if len(_vocab) >= MAX_VOCAB_TERMS:
+                _vocab = Vocabulary()
+                tokens.cache_clear()
+    return _vocab
+
+
+def vocab_of(ids):
+    """The vocabulary ``ids`` index; plain arrays are taken to be in the current one."""
+    vocab = getattr(ids, "vocab", None)
+    return vocab if vocab is not None else vocabulary()
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def tokens(text):
+    """Read-only ``TokenIds`` of ``text`` against the shared vocabulary (memoised)."""
+    ids = vocabulary().encode(tokenize(text))
+    ids.flags.writeable = False
+    return ids
+
+
+def as_tokens(docs):
+    """Token id arrays, all in one vocabulary, for a mix of raw texts and already-encoded arrays."""
+    docs = [doc if isinstance(doc, np.ndarray) else tokens(doc or "") for doc in docs]
+    vocabs = {id(vocab_of(doc)) for doc in docs}
+    if len(vocabs) > 1:
+        # The shared vocabulary was swapped part way through; re-encode the older arrays
+        vocab = vocabulary()
+        docs = [doc if vocab_of(doc) is vocab else vocab.encode(vocab_of(doc).decode(doc)) for doc in docs]
+    return docs
+
+
+class TermMap:
+    """Maps shared-vocabulary ids onto a consumer's own term -> column dict.
+
+    Consumers (a fitted TF-IDF model, an on-disk index) persist their terms
+    as strings, so they stay valid whatever order the vocabulary was built
+    in; the lookup array is extended lazily as the vocabulary grows, and
+    rebuilt when ids from a newer vocabulary arrive. With ``grow=True``
+    unseen terms are appended to ``columns``.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self._lock = threading.Lock()
+        self._vocab = None
+        self._map = np.empty(0, dtype=np.int32)
+
+    def __call__(self, ids, grow=False, vocab=None):
+        vocab = vocab if vocab is not None else vocab_of(ids)
+        ids = np.asarray(ids, dtype=np.int32)
+        with self._lock:
+            if vocab is not self._vocab:
+                self._vocab, self._map = vocab, np.empty(0, dtype=np.int32)
+            if len(self._map) < len(vocab):
+                extra = [self.columns.get(term, -1) for term in vocab.terms[len(self._map):len(vocab)]]
+                self._map = np.concatenate([self._map, np.asarray(extra, dtype=np.int32)])
+            local = self._map[ids]
+            if grow and (local < 0).any():
+                for term_id in np.unique(ids[local < 0]):
+                    self._map[term_id] = self.columns.setdefault(vocab.terms[term_id], len(self.columns))
+                local = self._map[ids]
+        return local
+
+    def __getstate__(self):
+        return {"columns": self.columns}
+
+    def __setstate__(self, state):
+        self.__init__(state["columns"])
+
+
+def count_matrix(docs, term_map, n_columns):
+    """Sparse (n_docs, n_columns) term counts; terms outside ``term_map`` are dropped."""
+    import scipy.sparse as sp
+
+    docs = as_tokens(docs)
+    lengths = np.fromiter((len(doc) for doc in docs), dtype=np.int64, count=len(docs))
+    ids = np.concatenate(docs) if docs else np.empty(0, dtype=np.int32)
+    cols = term_map(ids, vocab=vocab_of(docs[0])) if len(ids) else np.empty(0, dtype=np.int32)
+    rows = np.repeat(np.arange(len(docs)), lengths)
+    keep = cols >= 0
+    counts = sp.csr_matrix((np.ones(int(keep.sum()), dtype=np.float64), (rows[keep], cols[keep])),
+                           shape=(len(docs), n_columns))
+    counts.sum_duplicates()
+    return counts
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# The scripts use flat imports and are run from scripts/
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
@@ -0,0 +1,58 @@
+import multiprocessing
+
+import cv_index
+from cv_index import CVIndex
+
+SKILLS = ["python", "docker", "kubernetes", "sql", "java", "react", "aws", "spark", "tableau", "excel"]
+
+
+def cv_text(i):
+    return f"candidate {i} experienced in {SKILLS[i % 10]} and {SKILLS[(i * 3) % 10]} with project work {i}"
+
+
+def add_in_batches(index_dir, worker, n=40, batch=4):
+    index = CVIndex(index_dir)
+    for start in range(0, n, batch):
+        index.add_documents((f"w{worker}-{i}", cv_text(i)) for i in range(start, start + batch))
+
+
+def test_writers_in_several_processes(tmp_path):
+    workers = [multiprocessing.Process(target=add_in_batches, args=(tmp_path, w)) for w in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(60)
+        assert p.exitcode == 0
+
+    index = CVIndex(tmp_path)
+    assert len(index) == 160
+    assert all(f"w{w}-{i}" in index for w in range(4) for i in range(40))
+    # The same CVs added by one writer give the same ranking (ties aside)
+    single = CVIndex(tmp_path / "single")
+    single.add_documents((f"w{w}-{i}", cv_text(i)) for w in range(4) for i in range(40))
+    assert ({score for _, score in index.search("python docker", 20)}
+            == {score for _, score in single.search("python docker", 20)})
+
+
+def test_reload_sees_other_writers(tmp_path):
+    reader, writer = CVIndex(tmp_path), CVIndex(tmp_path)
+    writer.add_documents([("a@example.com", cv_text(1))])
+    assert "a@example.com" not in reader
+    reader.reload()
+    assert "a@example.com" in reader
+    writer.remove("a@example.com")
+    reader.reload()
+    assert "a@example.com" not in reader
+
+
+def test_new_skill_list_reindexes_stored_cvs(tmp_path, monkeypatch):
+    index = CVIndex(tmp_path)
+    index.add_documents((f"cv{i}", cv_text(i)) for i in range(30))
+    index.add_documents([("cv3", cv_text(99))])
+    index.remove("cv4")
+    before = index.search("kubernetes aws", 5)
+
+    monkeypatch.setattr(cv_index, "SKILLS_VERSION", "next")
+    rebuilt = CVIndex(tmp_path)
+    assert len(rebuilt) == 29 and "cv3" in rebuilt and "cv4" not in rebuilt
+    assert {key for key, _ in rebuilt.search("kubernetes aws", 5)} == {key for key, _ in before}
@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv_ingest
+from bulk_upload import BulkMatcher
+from conftest import ROOT_DIR
+from cv_ingest import iter_parse, iter_parse_bytes, list_cv_files
+
+CRASHING = "C1070.pdf"
+
+
+def _crash_on_one_file(pdf_path, timeout=None):
+    # Stands in for a PDF that takes the worker down (OOM, segfault)
+    if os.path.basename(pdf_path) == CRASHING:
+        os._exit(1)
+    return _parse_one(pdf_path, timeout)
+
+
+def _crash_on_one_upload(name, pdf_bytes, timeout=None):
+    if name == CRASHING:
+        os._exit(1)
+    return _parse_upload(name, pdf_bytes, timeout)
+
+
+_parse_one = cv_ingest._parse_one
+_parse_upload = cv_ingest._parse_upload
+
+
+def test_worker_crash_only_fails_its_file(monkeypatch):
+    monkeypatch.setattr(cv_ingest, "_parse_one", _crash_on_one_file)
+    paths = list_cv_files(ROOT_DIR / "data" / "CVs1")[:24]
+    results = {os.path.basename(r.path): r for r in iter_parse(paths, workers=2)}
+
+    assert len(results) == len(paths)
+    assert results[CRASHING].error == "worker process crashed"
+    assert all(r.ok for name, r in results.items() if name != CRASHING)
+
+
+def test_upload_crash_only_fails_its_file(monkeypatch):
+    monkeypatch.setattr(cv_ingest, "_parse_upload", _crash_on_one_upload)
+    uploads = [(os.path.basename(path), open(path, "rb").read())
+               for path in list_cv_files(ROOT_DIR / "data" / "CVs1")[:24]]
+    pools = []
+
+    def renew_pool(broken):
+        broken.shutdown(wait=False, cancel_futures=True)
+        pools.append(ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("fork")))
+        return pools[-1]
+
+    pool = ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("fork"))
+    try:
+        results = {r.path: r for r in iter_parse_bytes(uploads, pool, renew_pool=renew_pool)}
+    finally:
+        for p in [pool] + pools:
+            p.shutdown()
+
+    assert len(results) == len(uploads)
+    assert results[CRASHING].error == "worker process crashed"
+    assert all(r.ok for name, r in results.items() if name != CRASHING)
+
+
+def test_renewing_keeps_a_pool_another_job_replaced():
+    matcher = BulkMatcher(workers=1)
+    broken = matcher._parse_pool()
+    assert matcher._renew_pool(broken) is not broken
+    replacement = matcher._pool
+
+    assert matcher._renew_pool(broken) is replacement
+    replacement.shutdown()
@@ -0,0 +1,54 @@
+import pytest
+
+from bulk_upload import BulkMatcher
+from conftest import ROOT_DIR
+from cv_index import CVIndex
+from dedup import Duplicate, DedupIndex
+from matching import JDMatcher
+
+CV = ("Jane Roe, data engineer. Five years building spark and kafka pipelines on aws, "
+      "airflow scheduling, dbt models and sql warehouses for retail analytics teams. "
+      "Led the migration of nightly batch jobs to streaming ingestion, cut warehouse costs by a third, "
+      "mentored four junior engineers and ran the on-call rotation. Earlier: analyst at a logistics "
+      "startup, python reporting, tableau dashboards, forecasting demand for regional depots. "
+      "MSc computer science, certified aws solutions architect, fluent english and spanish.")
+OTHER = ("John Doe, frontend developer. React, typescript and css design systems, "
+         "accessibility audits and component libraries for banking web apps.")
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return JDMatcher.from_file(ROOT_DIR / "data" / "jd_summaries.json")
+
+
+def test_resubmitted_cv_is_reported(tmp_path):
+    index = DedupIndex(tmp_path / "dedup.db")
+    assert index.check("jane@example.com", CV, "upload") is None
+    # The batch keeps its earlier verdict; uploads hear about the resubmission
+    assert index.check("jane@example.com", CV, "batch") is None
+    assert index.check("jane@example.com", CV, "upload", resubmissions=True) == Duplicate("jane@example.com", 1.0)
+    assert index.check("jane@example.com", OTHER, "upload", resubmissions=True) is None
+
+
+def test_bulk_upload_skips_unchanged_resubmissions(tmp_path, matcher):
+    cv_index = CVIndex(tmp_path / "index")
+    bulk = BulkMatcher(cv_index=cv_index, dedup=DedupIndex(tmp_path / "dedup.db"), workers=1)
+    first = bulk.submit_texts([("jane@example.com", CV), ("john@example.com", OTHER)], matcher, None)
+    assert first.wait(30) and first.status == "done" and first.saved == 2
+
+    again = bulk.submit_texts([("jane@example.com", CV), ("john@example.com", OTHER + " Also vue.")], matcher, None)
+    assert again.wait(30) and again.status == "done"
+    assert again.saved == 1 and [r["candidate"] for r in again.results] == ["john@example.com"]
+    assert again.duplicates == [{"file": "jane@example.com", "candidate": "jane@example.com",
+                                 "duplicate_of": "jane@example.com", "similarity": 1.0, "action": "unchanged"}]
+    assert len(cv_index) == 2
+
+
+def test_near_duplicates_are_flagged_by_default(tmp_path, matcher):
+    bulk = BulkMatcher(dedup=DedupIndex(tmp_path / "dedup.db"), workers=1)
+    job = bulk.submit_texts([("jane@example.com", CV), ("jane.roe@example.com", CV + " References on request.")],
+                            matcher, None)
+    assert job.wait(30) and job.status == "done"
+    assert job.saved == 2
+    assert [(d["candidate"], d["duplicate_of"], d["action"]) for d in job.duplicates] == [
+        ("jane.roe@example.com", "jane@example.com", "flagged")]
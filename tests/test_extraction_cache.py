@@ -0,0 +1,49 @@
+import os
+
+from extraction_cache import ExtractionCache, content_key
+
+
+def test_round_trip(tmp_path):
+    cache = ExtractionCache(tmp_path)
+    key = content_key(b"%PDF-1.4 cv", "2")
+
+    assert cache.get(key) is None
+    cache.put(key, "Python developer", 2)
+    assert cache.get(key) == ("Python developer", 2)
+    assert ExtractionCache(tmp_path).get(key) == ("Python developer", 2)
+
+
+def test_overwrite_replaces_the_old_size(tmp_path):
+    cache = ExtractionCache(tmp_path)
+    cache.put("2-a", "x" * 1000, 1)
+    cache.put("2-a", "short", 1)
+
+    assert cache.get("2-a") == ("short", 1)
+    assert cache._size == ExtractionCache(tmp_path)._size
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    text = "x" * 1000
+    cache = ExtractionCache(tmp_path, max_bytes=3500)
+    for i, key in enumerate(["2-a", "2-b", "2-c"]):
+        cache.put(key, text, 1)
+        os.utime(cache._path(key), (i, i))
+    cache.get("2-a")  # now the most recently used
+    cache.put("2-d", text, 1)
+
+    assert cache.get("2-b") is None
+    assert all(cache.get(key) is not None for key in ["2-a", "2-c", "2-d"])
+    assert cache._size <= 3500 * 0.9
+
+
+def test_entries_deleted_by_another_process_are_skipped(tmp_path):
+    cache = ExtractionCache(tmp_path, max_bytes=2500)
+    cache.put("2-a", "x" * 1000, 1)
+    vanished = cache._path("2-a")
+    real_entries = cache._entries
+    cache._entries = lambda: [vanished, *real_entries()]
+    vanished.unlink()
+    cache.put("2-b", "x" * 1000, 1)
+    cache.put("2-c", "x" * 1000, 1)  # over the limit: evicts while listing the vanished file
+
+    assert cache.get("2-c") is not None
@@ -0,0 +1,45 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from conftest import ROOT_DIR
+from cv_ingest import parse_directory
+from incremental import MatchState
+from job_screening import INVITE_TOP_PERCENT, invite_threshold
+from matching import top_k
+
+
+@pytest.fixture(scope="module")
+def sample_scores(tmp_path_factory):
+    """Batch-path score matrix for the shipped CVs and JD summaries."""
+    cv_texts, failures = parse_directory(ROOT_DIR / "data" / "CVs1", workers=2)
+    assert not failures
+    with open(ROOT_DIR / "data" / "jd_summaries.json", encoding="utf-8") as f:
+        jds = {jd_id: jd["summary"] for jd_id, jd in json.load(f).items()}
+    cv_texts = {os.path.basename(path): text for path, text in sorted(cv_texts.items())}
+    scores, _, _, _ = MatchState(tmp_path_factory.mktemp("state")).rematch(cv_texts, jds, full=True)
+    return scores
+
+
+def test_sample_still_produces_invites(sample_scores):
+    # The invites the batch sends: each CV's top 3 JDs at or above the cut
+    threshold = invite_threshold(sample_scores)
+    best = top_k(sample_scores, 3)
+    invited = np.take_along_axis(sample_scores, best, axis=1) >= threshold
+    assert invited.sum() > 0
+    assert invited.any(axis=1).sum() >= 0.1 * len(sample_scores)
+
+
+def test_invite_threshold_is_relative(sample_scores):
+    threshold = invite_threshold(sample_scores)
+    share = (sample_scores >= threshold).mean() * 100
+    assert share == pytest.approx(INVITE_TOP_PERCENT, abs=0.5)
+    # Rescaling every score moves the cut with it
+    assert invite_threshold(sample_scores * 3) == pytest.approx(threshold * 3)
+
+
+def test_invite_threshold_without_scores():
+    assert invite_threshold(np.zeros((3, 4))) == float("inf")
+    assert invite_threshold([]) == float("inf")
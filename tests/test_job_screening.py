@@ -0,0 +1,136 @@
+import json
+from functools import partial
+
+import pytest
+
+from conftest import ROOT_DIR
+from cv_index import CVIndex
+from cv_ingest import extract_text
+from dedup import DedupIndex
+from demo_display import Reporter
+from extraction_cache import ExtractionCache
+from firestore_writer import NullWriter
+from incremental import MatchState
+import job_screening
+from outbox import FileTransport, Outbox
+from result_store import ResultStore
+
+SAMPLE_CVS = 20
+
+
+@pytest.fixture
+def batch(tmp_path, monkeypatch):
+    """``batch(*argv)`` runs job_screening.run on sample CVs with every store under ``tmp_path``."""
+    cv_dir = tmp_path / "cvs"
+    cv_dir.mkdir()
+    for pdf in sorted((ROOT_DIR / "data" / "CVs1").glob("*.pdf"))[:SAMPLE_CVS]:
+        (cv_dir / pdf.name).symlink_to(pdf)
+    with open(ROOT_DIR / "data" / "jd_summaries.json", encoding="utf-8") as f:
+        summaries = {jd_id: jd["summary"] for jd_id, jd in json.load(f).items()}
+
+    class Emails(FileTransport):
+        def __init__(self):
+            super().__init__(tmp_path / "emails")
+
+    # No Ollama here: the shipped summaries stand in for a summarization pass
+    monkeypatch.setattr(job_screening, "summarize_jds",
+                        lambda db, jobs, reporter, concurrency: {jd_id: summaries[jd_id] for jd_id, _, _ in jobs})
+    monkeypatch.setattr(job_screening, "Outbox", partial(Outbox, tmp_path / "outbox.db"))
+    monkeypatch.setattr(job_screening, "FileTransport", Emails)
+    monkeypatch.setattr(job_screening, "MatchState", partial(MatchState, tmp_path / "state"))
+    monkeypatch.setattr(job_screening, "CVIndex", partial(CVIndex, tmp_path / "index"))
+    monkeypatch.setattr(job_screening, "ResultStore", partial(ResultStore, tmp_path / "results"))
+    monkeypatch.setattr(job_screening, "DedupIndex", partial(DedupIndex, tmp_path / "dedup.db"))
+    monkeypatch.setattr(job_screening, "ExtractionCache", partial(ExtractionCache, tmp_path / "cache"))
+
+    def invoke(*argv):
+        args = job_screening.parse_args(["--cv-dir", str(cv_dir), "--no-firestore", "--workers", "2", *argv])
+        return (job_screening.run_stream if args.stream else job_screening.run)(args, Reporter())
+
+    invoke.cv_dir = cv_dir
+    invoke.tmp_path = tmp_path
+    return invoke
+
+
+def test_lower_threshold_invites_unchanged_pairs(batch):
+    results, summary = batch("--threshold", "20")
+    first = {(m["cv_id"], m["jd_id"]) for m in results if m["invited"]}
+    assert first and summary["interviews"] == len(first)
+
+    # Nothing changed, so no pair is rescored, but more of them now clear the cut
+    results, summary = batch("--threshold", "10")
+    assert summary["pairs_scored"] == 0
+    invited = {(m["cv_id"], m["jd_id"]) for m in results if m["invited"]}
+    already = {(m["cv_id"], m["jd_id"]) for m in results if m["already_invited"]}
+    assert invited and not invited & first
+    assert already == first
+    assert all(m["invited"] or m["already_invited"] for m in results if m["score"] >= 10)
+
+
+def test_index_follows_edited_and_deleted_cvs(batch):
+    batch()
+    cvs = sorted(batch.cv_dir.iterdir())
+    edited, deleted = cvs[0], cvs[1]
+    # Same file name, different CV
+    replacement = sorted((ROOT_DIR / "data" / "CVs1").glob("*.pdf"))[SAMPLE_CVS + 5]
+    edited.unlink()
+    edited.symlink_to(replacement)
+    deleted.unlink()
+
+    _, summary = batch()
+    assert summary["delta"]["cvs"]["modified"] == [edited.stem]
+    assert summary["delta"]["cvs"]["removed"] == [deleted.stem]
+    index = CVIndex(batch.tmp_path / "index")
+    assert deleted.name not in index and len(index) == SAMPLE_CVS - 1
+    text, _ = extract_text(str(replacement))
+    [(best, _)] = index.search(text, 1)
+    assert best == edited.name
+
+
+class CountingWriter(NullWriter):
+    """Keeps the counter increments and deletes a run queues."""
+
+    def __init__(self):
+        self.increments = []
+        self.deletes = []
+
+    def increment(self, collection, doc_id, fields):
+        self.increments.append((doc_id, fields))
+
+    def delete(self, collection, doc_id):
+        self.deletes.append((collection, doc_id))
+
+
+def test_stream_records_counters_per_chunk(batch, monkeypatch):
+    writer = CountingWriter()
+    monkeypatch.setattr(job_screening, "open_writer", lambda db: writer)
+    summary = batch("--stream", "--chunk-size", "8", "--threshold", "20")
+
+    totals = [fields for doc_id, fields in writer.increments if doc_id == "summary"]
+    per_jd = [fields for doc_id, fields in writer.increments if doc_id.startswith("jd_")]
+    assert len(totals) >= 3  # one per chunk of 8 for 20 CVs
+    assert sum(t.get("candidates", 0) for t in totals) == summary["cvs"] == SAMPLE_CVS
+    assert sum(t.get("interviews", 0) for t in totals) == summary["interviews"] > 0
+    matches = sum(t.get("matches", 0) for t in totals)
+    assert matches == sum(f["count"] for f in per_jd) > 0
+    assert sum(t.get("score_sum", 0) for t in totals) == pytest.approx(sum(f["score_sum"] for f in per_jd))
+
+
+def test_limit_leaves_the_other_cvs_alone(batch, monkeypatch):
+    batch()
+    dedup_entries = len(DedupIndex(batch.tmp_path / "dedup.db"))
+
+    writer = CountingWriter()
+    monkeypatch.setattr(job_screening, "open_writer", lambda db: writer)
+    results, summary = batch("--limit", "5")
+    assert summary["cvs"] == 5 and results
+    assert writer.deletes == []
+    # Invites are real, so only they are counted now; the next complete run counts the rest
+    assert all(set(fields) == {"interviews"} for _, fields in writer.increments)
+    assert len(CVIndex(batch.tmp_path / "index")) == SAMPLE_CVS
+    assert len(DedupIndex(batch.tmp_path / "dedup.db")) == dedup_entries
+
+    # The state still covers the whole folder
+    _, summary = batch()
+    assert summary["pairs_scored"] == 0
+    assert not any(summary["delta"]["cvs"].values())
@@ -0,0 +1,13 @@
+import json
+
+from conftest import ROOT_DIR
+from job_screening import load_jobs
+
+
+def test_batch_jd_ids_match_the_summaries():
+    # The app, bulk upload and the service key jobs by these ids
+    jobs = load_jobs(ROOT_DIR / "data" / "job_description.csv")
+    with open(ROOT_DIR / "data" / "jd_summaries.json", encoding="utf-8") as f:
+        summaries = json.load(f)
+    assert [jd_id for jd_id, _, _ in jobs] == list(summaries)
+    assert all(summaries[jd_id]["title"] == title for jd_id, title, _ in jobs)
@@ -0,0 +1,38 @@
+import threading
+import time
+
+import metrics
+
+
+def stage_sum(stage):
+    return metrics.STAGE_SECONDS._values[(stage,)][-1]
+
+
+def test_timed_decorator_across_threads():
+    metrics.reset()
+
+    @metrics.timed("test_threads")
+    def work(delay):
+        time.sleep(delay)
+
+    slow = threading.Thread(target=work, args=(0.3,))
+    slow.start()
+    time.sleep(0.2)
+    work(0.0)  # enters while the slow call is running
+    slow.join()
+    # With a shared start time the slow call was measured from the fast one's start
+    assert stage_sum("test_threads") >= 0.3
+
+
+def test_timed_decorator_nested():
+    metrics.reset()
+
+    @metrics.timed("test_nested")
+    def work(depth):
+        time.sleep(0.05)
+        if depth:
+            work(depth - 1)
+
+    work(1)
+    # Outer call ~0.1 s, inner ~0.05 s
+    assert stage_sum("test_nested") >= 0.14
@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+from outbox import Dispatcher, FileTransport, Outbox, SendGridTransport
+
+
+class Recorder:
+    def __init__(self, channel):
+        self.channel = channel
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message["idempotency_key"])
+
+
+def test_enqueue_needs_a_recipient(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.db")
+    with pytest.raises(ValueError):
+        outbox.enqueue("cvC1_jd1", "body", None)
+    assert outbox.counts() == {}
+
+
+def test_dispatchers_only_claim_their_channel(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.db")
+    outbox.enqueue("cvC1_jd1", "batch", "c1@example.com", channel=FileTransport.channel)
+    outbox.enqueue("cva@example.com_jd1", "app", "a@example.com", channel=SendGridTransport.channel)
+
+    files, emails = Recorder(FileTransport.channel), Recorder(SendGridTransport.channel)
+    while Dispatcher(outbox, files, rate=1000).run_once():
+        pass
+    assert files.sent == ["cvC1_jd1"]
+    assert outbox.counts(SendGridTransport.channel) == {"pending": 1}
+    Dispatcher(outbox, emails, rate=1000).run_once()
+    assert emails.sent == ["cva@example.com_jd1"]
+
+
+def test_old_outbox_rows_get_a_channel(tmp_path):
+    path = tmp_path / "outbox.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, idempotency_key TEXT NOT NULL UNIQUE, "
+                 "recipient TEXT, subject TEXT, body TEXT NOT NULL, content_type TEXT NOT NULL DEFAULT 'text/plain', "
+                 "status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+                 "next_attempt_at REAL NOT NULL, last_error TEXT, created_at REAL NOT NULL, sent_at REAL)")
+    conn.executemany("INSERT INTO outbox (idempotency_key, recipient, body, next_attempt_at, created_at) "
+                     "VALUES (?, ?, 'body', 0, 0)", [("cvC1_jd1", None), ("cva@example.com_jd1", "a@example.com")])
+    conn.commit()
+    conn.close()
+
+    outbox = Outbox(path)
+    assert [m["idempotency_key"] for m in outbox.claim(10, FileTransport.channel)] == ["cvC1_jd1"]
+    assert [m["idempotency_key"] for m in outbox.claim(10)] == ["cva@example.com_jd1"]
+
+
+def test_other_processes_leave_claimed_messages_alone(tmp_path):
+    path = tmp_path / "outbox.db"
+    app = Outbox(path)
+    app.enqueue("cva@example.com_jd1", "app", "a@example.com")
+    claimed = app.claim(10)
+    assert len(claimed) == 1
+
+    # A batch run or a status check opens the same database meanwhile
+    batch = Outbox(path)
+    Dispatcher(batch, Recorder(FileTransport.channel)).start().stop()
+    assert batch.counts() == {"sending": 1}
+    # Even a dispatcher of the same channel waits for the lease to run out
+    emails = Recorder(SendGridTransport.channel)
+    assert Dispatcher(batch, emails, rate=1000).recover() == 0
+    assert Dispatcher(batch, emails, rate=1000).run_once() == 0
+
+    # Until the claim goes stale, i.e. the app died mid-send
+    assert Dispatcher(batch, emails, rate=1000, lease=0).recover() == 1
+    Dispatcher(batch, emails, rate=1000).run_once()
+    assert emails.sent == ["cva@example.com_jd1"]
+    assert app.counts() == {"sent": 1}
@@ -0,0 +1,59 @@
+import csv
+import json
+import threading
+import time
+from functools import partial
+
+import jd_summarizer
+import precompute_summaries
+from benchmark import start_stub_ollama
+from summary_cache import SummaryCache
+
+DELAY = 0.2
+CONCURRENCY = 3
+
+
+def test_failed_jds_are_kept_and_output_replaced_only_at_the_end(tmp_path, monkeypatch):
+    titles = [f"Role {i}" for i in range(1, 9)]
+    (tmp_path / "scripts").mkdir()
+    (tmp_path / "data").mkdir()
+    with open(tmp_path / "data" / "job_description.csv", "w", newline="", encoding="ISO-8859-1") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Job Title", "Job Description"])
+        writer.writerows([title, f"{title} builds Python services."] for title in titles)
+    output = tmp_path / "data" / "jd_summaries.json"
+    previous = {"2": {"title": "Role 2", "description": "old", "summary": "Old summary", "structured": {}}}
+    output.write_text(json.dumps(previous), encoding="utf-8")
+
+    lock = threading.Lock()
+    finished, attempts, outputs_seen = [], {}, set()
+
+    def fail(prompt):
+        # Role 1 fails once, Roles 2 and 3 always fail
+        title = next(title for title in titles if f"Job Title: {title}\n" in prompt)
+        with lock:
+            finished.append(time.monotonic())
+            attempts[title] = attempts.get(title, 0) + 1
+            outputs_seen.add(output.read_text(encoding="utf-8"))
+        return title in ("Role 2", "Role 3") or (title == "Role 1" and attempts[title] == 1)
+
+    monkeypatch.setenv("OLLAMA_HOST", start_stub_ollama(DELAY, fail))
+    monkeypatch.setattr(precompute_summaries, "SummaryCache", partial(SummaryCache, tmp_path / "cache"))
+    monkeypatch.setattr(precompute_summaries, "summarize_all", partial(jd_summarizer.summarize_all, backoff=0.01))
+    monkeypatch.chdir(tmp_path / "scripts")
+
+    precompute_summaries.summarize_job_descriptions(concurrency=CONCURRENCY)
+
+    # Requests overlapped up to, and never beyond, the concurrency limit
+    # Request i was in flight over [finished[i] - DELAY, finished[i]]
+    peak = max(sum(other - DELAY <= end - DELAY / 2 <= other for other in finished) for end in finished)
+    assert peak == CONCURRENCY
+    assert attempts["Role 1"] == 2 and attempts["Role 3"] == 4
+    # The old file stayed in place for the whole run
+    assert outputs_seen == {json.dumps(previous)}
+    records = json.loads(output.read_text(encoding="utf-8"))
+    assert sorted(records, key=int) == [str(i) for i in range(1, 9)]
+    assert records["1"]["summary"].startswith("Key skills:")
+    assert records["2"] == previous["2"]
+    assert records["3"]["summary"] == "" and "error" in records["3"]
+    assert not (tmp_path / "data" / "jd_summaries.json.partial").exists()
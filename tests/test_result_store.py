@@ -0,0 +1,37 @@
+import os
+import time
+
+import numpy as np
+
+from result_store import ResultStore
+
+
+def test_prune_spares_runs_still_being_written(tmp_path):
+    store = ResultStore(tmp_path)
+    for _ in range(3):
+        store.save(["C1"], ["1", "2"], np.ones((1, 2)))
+    writer = store.new_run(["1", "2"], mode="stream")
+    writer.append(["C1"], np.ones((1, 2)))
+
+    # Another process prunes while the stream run is open
+    assert ResultStore(tmp_path).prune(keep=1) == 2
+    assert writer.run_dir.exists()
+    writer.append(["C2"], np.zeros((1, 2)))
+    run = writer.close()
+    assert run.cv_ids == ["C1", "C2"]
+    assert store.runs()[-1] == run.run_id
+
+
+def test_prune_removes_abandoned_runs(tmp_path):
+    store = ResultStore(tmp_path)
+    kept = store.save(["C1"], ["1"], np.ones((1, 1)))
+    abandoned = store.new_run(["1"])
+    abandoned.append(["C1"], np.ones((1, 1)))
+    abandoned._scores.close()
+    abandoned._cv_ids.close()
+    stale = time.time() - 7200
+    os.utime(abandoned.run_dir, (stale, stale))
+
+    assert store.prune(keep=5, grace=3600) == 1
+    assert not abandoned.run_dir.exists()
+    assert store.runs() == [kept.run_id]
@@ -0,0 +1,24 @@
+import io
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+pytest.importorskip("flask")
+
+from service import create_app
+
+
+class CrashingParser:
+    jd_ids = ["1"]
+
+    def parse(self, name, data):
+        raise BrokenProcessPool("a worker died")
+
+
+def test_parser_crash_is_a_503():
+    client = create_app(CrashingParser()).test_client()
+    response = client.post("/match", data={"file": (io.BytesIO(b"%PDF-1.4"), "cv.pdf")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert "parser crashed" in response.get_json()["error"]
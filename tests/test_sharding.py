@@ -0,0 +1,54 @@
+import json
+from functools import partial
+
+import numpy as np
+
+from conftest import ROOT_DIR
+from cv_ingest import extract_text
+from extraction_cache import ExtractionCache
+import job_screening
+from matching import top_k
+import sharding
+from sharding import ShardJob, ShardQueue
+
+SAMPLE_CVS = 20
+
+
+def test_stale_shard_on_its_last_attempt_fails(tmp_path):
+    queue = ShardQueue(tmp_path / "queue.db", lease=0, max_attempts=2)
+    queue.reset(1)
+    assert queue.claim("a") == 0
+    assert queue.claim("b") == 0  # a's lease ran out: second and last attempt
+
+    assert queue.claim("c") is None
+    [row] = queue.rows()
+    assert row["status"] == "failed" and row["attempts"] == 2
+
+
+def test_merged_shards_match_the_full_matrix(tmp_path, monkeypatch):
+    cv_dir = tmp_path / "cvs"
+    cv_dir.mkdir()
+    pdfs = sorted((ROOT_DIR / "data" / "CVs1").glob("*.pdf"))[:SAMPLE_CVS]
+    for pdf in pdfs:
+        (cv_dir / pdf.name).symlink_to(pdf)
+    with open(ROOT_DIR / "data" / "jd_summaries.json", encoding="utf-8") as f:
+        summaries = {jd_id: jd["summary"] for jd_id, jd in json.load(f).items()}
+    monkeypatch.setattr(job_screening, "summarize_jds",
+                        lambda db, jobs, reporter, concurrency: {jd_id: summaries[jd_id] for jd_id, _, _ in jobs})
+    monkeypatch.setattr(sharding, "ExtractionCache", partial(ExtractionCache, tmp_path / "cache"))
+    job_dir = tmp_path / "job"
+    k = 5
+
+    sharding.main(["--job-dir", str(job_dir), "plan", "--cv-dir", str(cv_dir), "--shards", "3", "--top-k", str(k)])
+    job = ShardJob(job_dir)
+    assert sum(bool(job.shard_file(shard).read_text()) for shard in range(3)) >= 2
+    assert sharding.work(job_dir, workers=2, chunk_size=4) == 3
+    rankings, summary = sharding.merge(job_dir)
+
+    plan_data = job.load_plan()
+    texts = [extract_text(str(pdf))[0] for pdf in pdfs]
+    scores = np.asarray(job.load_engine().score_texts(texts), dtype=np.float32)
+    assert summary["cvs"] == SAMPLE_CVS
+    for col, rows in enumerate(top_k(scores, k, axis=0).T):
+        expected = [(pdfs[row].stem, round(float(scores[row, col]), 2)) for row in rows if scores[row, col] > 0]
+        assert rankings[plan_data["jd_ids"][col]] == expected
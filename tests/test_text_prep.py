@@ -0,0 +1,87 @@
+import gc
+import json
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from conftest import ROOT_DIR
+import dedup
+from matching import MatchEngine
+import skills
+import text_prep
+
+CHUNKS = 40
+CHUNK_SIZE = 25
+NEW_TERMS_PER_CV = 200
+
+
+@pytest.fixture
+def small_vocab(monkeypatch):
+    monkeypatch.setattr(text_prep, "MAX_VOCAB_TERMS", 5000)
+    text_prep.tokens.cache_clear()
+    yield
+    text_prep.tokens.cache_clear()
+
+
+@pytest.fixture(scope="module")
+def jd_summaries():
+    with open(ROOT_DIR / "data" / "jd_summaries.json", encoding="utf-8") as f:
+        return [jd["summary"] for jd in json.load(f).values()]
+
+
+def chunk_texts(rng, chunk):
+    # Every CV brings terms no earlier CV used, as in a stream of real uploads
+    words = rng.integers(0, 2 ** 40, (CHUNK_SIZE, NEW_TERMS_PER_CV))
+    return [f"python developer with docker and aws cv{chunk}x{i} " + " ".join(f"w{w:x}" for w in row)
+            for i, row in enumerate(words)]
+
+
+def test_streaming_keeps_vocabulary_memory_bounded(small_vocab, jd_summaries):
+    engine = MatchEngine().fit(jd_summaries)
+    probe = "senior python developer with docker, kubernetes and aws experience"
+    expected = engine.score_texts([probe])
+    rng = np.random.default_rng(0)
+
+    tracemalloc.start()
+    try:
+        for chunk in range(CHUNKS):
+            texts = chunk_texts(rng, chunk)
+            engine.score_texts(texts)
+            skills.bitsets(texts)
+            for text in texts:
+                dedup.minhash(text)
+            if chunk == 4:
+                gc.collect()
+                warm, _ = tracemalloc.get_traced_memory()
+        gc.collect()
+        end, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    cap = text_prep.MAX_VOCAB_TERMS + NEW_TERMS_PER_CV + 10
+    assert len(text_prep.vocabulary()) <= cap
+    assert len(engine.terms._map) <= cap
+    assert len(dedup._term_hashes) <= 2 and len(skills._alias_tables) <= 2
+    # 200k distinct terms went through; an unbounded vocabulary grows by tens of MB
+    assert end - warm < 4 * 1024 * 1024
+    # Scores are unchanged after the vocabulary has been replaced many times
+    assert np.allclose(engine.score_texts([probe]), expected)
+    assert skills.find_skills(probe) == skills.find_skills(text_prep.tokens(probe))
+
+
+def test_arrays_from_a_replaced_vocabulary_still_work(small_vocab, jd_summaries):
+    engine = MatchEngine().fit(jd_summaries)
+    cv = "data engineer: spark, kafka, airflow and sql pipelines on aws"
+    old = text_prep.tokens(cv)
+    expected = engine.score_texts([cv])
+    for chunk in range(2):
+        text_prep.as_tokens(chunk_texts(np.random.default_rng(chunk), chunk) * 2)
+    assert text_prep.vocab_of(text_prep.tokens(cv)) is not text_prep.vocab_of(old)
+
+    mixed = text_prep.as_tokens([old, cv])
+    assert text_prep.vocab_of(mixed[0]) is text_prep.vocab_of(mixed[1])
+    assert np.array_equal(mixed[0], mixed[1])
+    assert np.allclose(engine.score_texts([old]), expected)
+    assert np.array_equal(dedup.minhash(old), dedup.minhash(cv))
+    assert skills.find_skills(old) == skills.find_skills(cv)